@@ -0,0 +1,67 @@
+"""Benchmark loading the configurations at interpreter start
+
+Compares fresh interpreters importing and accessing
+`biopipen.core.config.config` with a cold snapshot cache (TOML profiles
+parsed by simpleconf) and a warm one (snapshot loaded). Reported are the
+wall time of the interpreter, the time to import and load the config
+(measured inside the interpreter) and the modules imported by `python -X
+importtime` during that.
+
+    python benchmarks/bench_core_config.py [NRUNS]
+"""
+import os
+import re
+import sys
+import shutil
+import subprocess
+import tempfile
+import time
+from statistics import median
+
+CODE = """
+import time
+start = time.perf_counter()
+from biopipen.core.config import config
+config.exe.tabix
+print(time.perf_counter() - start)
+"""
+
+
+def run(cache_dir, cold):
+    if cold:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    env = os.environ.copy()
+    env["BIOPIPEN_CACHE_DIR"] = cache_dir
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CODE],
+        env=env,
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    elapsed = time.perf_counter() - start
+    # top-level modules imported since biopipen.core.config
+    imported = re.findall(
+        r"^import time:\s+\d+ \|\s+\d+ \| (\S+)$", proc.stderr, re.M
+    )
+    imported = imported[imported.index("biopipen.core.config"):]
+    return elapsed, float(proc.stdout), imported
+
+
+if __name__ == "__main__":
+    nruns = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    cache_dir = tempfile.mkdtemp(prefix="biopipen_bench_config_")
+    try:
+        for name, cold in (("cold", True), ("warm", False)):
+            results = [run(cache_dir, cold) for _ in range(nruns)]
+            print(
+                f"{name:>5} snapshot: "
+                f"wall {median(res[0] for res in results):.4f}s, "
+                f"config {median(res[1] for res in results):.4f}s "
+                f"(median of {nruns}), "
+                f"imported: {', '.join(results[-1][2])}"
+            )
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
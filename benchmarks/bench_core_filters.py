@@ -0,0 +1,51 @@
+"""Micro-benchmark for the `dict_to_cli_args` filter
+
+Compares the in-process (memoized) rendering with the previous
+`cmdy.echo` subprocess path, rendering the same `envs.args` once per job.
+
+    python benchmarks/bench_core_filters.py [NJOBS]
+"""
+import sys
+import time
+
+import cmdy
+from biopipen.core.filters import compose_cli_args, dict_to_cli_args
+
+ARGS = {
+    "RECOVER_SWAPPED_REF_ALT": True,
+    "WARN_ON_MISSING_CONTIG": True,
+    "MAX_RECORDS_IN_RAM": 500000,
+    "TAGS_TO_REVERSE": ["AF", "MAF"],
+    "write_original_position": False,
+}
+
+
+def timeit(func, njobs):
+    start = time.perf_counter()
+    for _ in range(njobs):
+        func(ARGS)
+    return time.perf_counter() - start
+
+
+def subprocess_path(dic):
+    return cmdy.echo(dic).stdout.strip()
+
+
+def uncached_path(dic):
+    return " ".join(compose_cli_args(dic))
+
+
+if __name__ == "__main__":
+    njobs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    assert subprocess_path(ARGS) == dict_to_cli_args(ARGS)
+
+    for name, func in (
+        ("cmdy.echo", subprocess_path),
+        ("in-process", uncached_path),
+        ("memoized", dict_to_cli_args),
+    ):
+        elapsed = timeit(func, njobs)
+        print(
+            f"{name:>12}: {elapsed:.4f}s for {njobs} jobs "
+            f"({elapsed / njobs * 1e6:.1f}us/job)"
+        )
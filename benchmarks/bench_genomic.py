@@ -0,0 +1,646 @@
+"""Offline benchmarks for the genomic namespaces with synthetic data
+
+Times the script logic of the processes and the utilities at several
+scales, with the data generated by `benchmarks/synthetic.py`:
+
+- `VcfFilter`: the rendered script, run with the python interpreter
+- `VcfFilter_batch`: the same filters evaluated by blocks (`envs.batch`)
+- `VcfFilter_expr`: the same filters as the expressions (compiled)
+- `VcfBatchAnnotate`: 10 VCF files annotated by one 10x larger VCF file
+- `BcftoolsFilter`: the rendered script, run with the python interpreter
+- `BedLiftOver`/`VcfLiftOver`: the rendered scripts lifting in python
+  (`tool="native"`), run twice: with the chain file parsed and cached,
+  then loaded from the cache
+- `tabix_index`: on a gzipped (not bgzipped) VCF file
+- `VcfBatchIndex`: 10 gzipped VCF files, indexed at once, then again with
+  only one of them changed
+- `TabixFile_fetch`: 1000 small regions from an indexed VCF file
+- `gene_name_conversion`: with a synthetic in-memory gene database instead of
+  MyGeneInfo, so that only the local logic is timed
+- `cnvpytor2other`: the functions from the rendered `CNVpytor.py`
+
+Cases whose tools (cyvcf2, bcftools, bgzip/tabix, datar) are not available
+are reported as skipped.
+
+    python benchmarks/bench_genomic.py [--scales small medium] \\
+        [--cases VcfFilter tabix_index] [--repeat 3] [--json results.json]
+"""
+import ast
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from statistics import median
+
+from diot import Diot
+from liquid import Liquid
+
+from biopipen.core.defaults import BIOPIPEN_DIR, SCRIPT_DIR
+from biopipen.core.filters import filtermanager
+
+sys.path.insert(0, str(Path(__file__).parent))
+import synthetic  # noqa: E402
+
+SCALES = {
+    "small": {"nvariants": 1_000, "ngenes": 1_000, "ncalls": 1_000},
+    "medium": {"nvariants": 10_000, "ngenes": 10_000, "ncalls": 10_000},
+    "large": {"nvariants": 100_000, "ngenes": 100_000, "ncalls": 100_000},
+}
+CASES = {}
+
+
+class Skip(Exception):
+    """When a case cannot run in the environment"""
+
+
+def case(func):
+    """Register a benchmark case"""
+    CASES[func.__name__] = func
+    return func
+
+
+def render_script(script, workdir, **data):
+    """Render a script template of a process as pipen does
+
+    Args:
+        script: The path of the script relative to `biopipen/scripts`
+        workdir: The directory used as the job outdir/metadir
+        **data: The `in`, `out` and `envs` data
+
+    Returns:
+        The path to the rendered script
+    """
+    filters = filtermanager.filters.copy()
+    try:
+        from pipen_filters.filters import FILTERS
+    except ImportError:  # pragma: no cover
+        pass
+    else:
+        filters = {**FILTERS, **filters}
+
+    source = SCRIPT_DIR.joinpath(script).read_text()
+    template = Liquid(
+        source,
+        from_file=False,
+        mode="wild",
+        filters=filters,
+        globals={"biopipen_dir": str(BIOPIPEN_DIR), **filters},
+    )
+    workdir = Path(workdir)
+    rendered = template.render(
+        {
+            "in": data.get("in", {}),
+            "in_": data.get("in", {}),
+            "out": data.get("out", {}),
+            "envs": data.get("envs", {}),
+            "job": {
+                "index": 0,
+                "outdir": str(workdir),
+                "metadir": str(workdir),
+            },
+            "proc": Diot(workdir=str(workdir)),
+        }
+    )
+    script_file = workdir / Path(script).name
+    script_file.write_text(rendered)
+    return script_file
+
+
+def load_functions(script_file):
+    """Load the imports and the functions from a rendered script, without
+    running the rest of it"""
+    tree = ast.parse(Path(script_file).read_text())
+    tree.body = [
+        node
+        for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef))
+    ]
+    namespace = {}
+    exec(compile(tree, str(script_file), "exec"), namespace)
+    return Diot(namespace)
+
+
+def require_exe(*exes):
+    """Skip if any of the executables is not available"""
+    for exe in exes:
+        if shutil.which(exe) is None:
+            raise Skip(f"{exe} not found")
+
+
+def require_module(module):
+    """Skip if the python module is not available"""
+    try:
+        __import__(module)
+    except ImportError:
+        raise Skip(f"{module} not installed") from None
+
+
+def run_script(script_file, env=None):
+    """Run a rendered python script and return the elapsed time"""
+    if env is not None:
+        env = {**os.environ, **env}
+    start = time.perf_counter()
+    subprocess.run([sys.executable, str(script_file)], check=True, env=env)
+    return time.perf_counter() - start
+
+
+@case
+def VcfFilter(scale, workdir):
+    require_module("cyvcf2")
+    invcf = synthetic.generate_vcf(
+        workdir / "in.vcf",
+        nvariants=SCALES[scale]["nvariants"],
+    )
+    script = render_script(
+        "vcf/VcfFilter.py",
+        workdir,
+        **{
+            "in": {"invcf": str(invcf)},
+            "out": {"outfile": str(workdir / "out.vcf")},
+            "envs": {
+                "filters": {
+                    "QUAL": 30,
+                    "SNPONLY": True,
+                    "DP": "lambda variant: variant.INFO.get('DP') > 10",
+                },
+                "keep": True,
+                "helper": "",
+                "filter_descs": {},
+                "ncores": 1,
+                "tabix": "tabix",
+                "regions": None,
+                "regions_file": None,
+                "batch": None,
+                "samples": None,
+            },
+        },
+    )
+    return run_script(script)
+
+
+@case
+def VcfFilter_batch(scale, workdir):
+    require_module("cyvcf2")
+    invcf = synthetic.generate_vcf(
+        workdir / "in.vcf",
+        nvariants=SCALES[scale]["nvariants"],
+    )
+    script = render_script(
+        "vcf/VcfFilter.py",
+        workdir,
+        **{
+            "in": {"invcf": str(invcf)},
+            "out": {"outfile": str(workdir / "out.vcf")},
+            "envs": {
+                "filters": {
+                    "QUAL": 30,
+                    "SNPONLY": True,
+                    "DP": "lambda block: block.INFO.get('DP') > 10",
+                },
+                "keep": True,
+                "helper": "",
+                "filter_descs": {},
+                "ncores": 1,
+                "tabix": "tabix",
+                "regions": None,
+                "regions_file": None,
+                "batch": 10_000,
+                "samples": None,
+            },
+        },
+    )
+    return run_script(script)
+
+
+@case
+def VcfFilter_expr(scale, workdir):
+    require_module("cyvcf2")
+    invcf = synthetic.generate_vcf(
+        workdir / "in.vcf",
+        nvariants=SCALES[scale]["nvariants"],
+    )
+    script = render_script(
+        "vcf/VcfFilter.py",
+        workdir,
+        **{
+            "in": {"invcf": str(invcf)},
+            "out": {"outfile": str(workdir / "out.vcf")},
+            "envs": {
+                "filters": {
+                    "Q30": "QUAL>=30",
+                    "SNP": 'TYPE=="snp"',
+                    "DP": "INFO/DP>10",
+                },
+                "keep": True,
+                "helper": "",
+                "filter_descs": {},
+                "ncores": 1,
+                "tabix": "tabix",
+                "regions": None,
+                "regions_file": None,
+                "batch": None,
+                "samples": None,
+            },
+        },
+    )
+    return run_script(script)
+
+
+@case
+def VcfFilter_cohort(scale, workdir):
+    require_module("cyvcf2")
+    invcf = synthetic.generate_vcf(
+        workdir / "in.vcf",
+        nvariants=SCALES[scale]["nvariants"] // 10,
+        nsamples=500,
+    )
+    script = render_script(
+        "vcf/VcfFilter.py",
+        workdir,
+        **{
+            "in": {"invcf": str(invcf)},
+            "out": {"outfile": str(workdir / "out.vcf")},
+            "envs": {
+                # site-level only, the genotypes not decoded
+                "filters": {"Q30": "QUAL>=30", "DP": "INFO/DP>10"},
+                "keep": True,
+                "helper": "",
+                "filter_descs": {},
+                "ncores": 1,
+                "tabix": "tabix",
+                "regions": None,
+                "regions_file": None,
+                "batch": None,
+                "samples": None,
+            },
+        },
+    )
+    return run_script(script)
+
+
+@case
+def VcfFilter_regions(scale, workdir):
+    require_module("cyvcf2")
+    require_exe("tabix")
+    invcf = synthetic.generate_vcf(
+        workdir / "in.vcf",
+        nvariants=SCALES[scale]["nvariants"],
+    )
+    # 1000 targets of 1kb, like the exons
+    bedfile = workdir / "targets.bed"
+    with bedfile.open("w") as fbed:
+        for name, length in synthetic.contigs(5):
+            for start in range(0, length, length // 200)[:200]:
+                fbed.write(f"{name}\t{start}\t{start + 1000}\n")
+    script = render_script(
+        "vcf/VcfFilter.py",
+        workdir,
+        **{
+            "in": {"invcf": str(invcf)},
+            "out": {"outfile": str(workdir / "out.vcf")},
+            "envs": {
+                "filters": {"Q30": "QUAL>=30", "DP": "INFO/DP>10"},
+                "keep": True,
+                "helper": "",
+                "filter_descs": {},
+                "ncores": 1,
+                "tabix": "tabix",
+                "regions": None,
+                "regions_file": str(bedfile),
+                "batch": None,
+                "samples": None,
+            },
+        },
+    )
+    return run_script(script)
+
+
+@case
+def VcfBatchAnnotate(scale, workdir):
+    nvariants = SCALES[scale]["nvariants"]
+    infiles = [
+        str(
+            synthetic.generate_vcf(
+                workdir / f"in{i}.vcf", nvariants=nvariants, seed=i
+            )
+        )
+        for i in range(10)
+    ]
+    # half of the sites of the inputs annotated
+    annfile = synthetic.generate_annotation(
+        workdir / "ann.vcf", infiles, nvariants=nvariants * 10
+    )
+    outdir = workdir / "out"
+    outdir.mkdir()
+    script = render_script(
+        "vcf/VcfBatchAnnotate.py",
+        workdir,
+        **{
+            "in": {"infiles": infiles, "annfile": str(annfile)},
+            "out": {"outdir": str(outdir)},
+            "envs": {
+                "annfile": "",
+                "cols": ["ID", "INFO/AF"],
+                "header": [],
+            },
+        },
+    )
+    return run_script(script)
+
+
+@case
+def BcftoolsFilter(scale, workdir):
+    require_exe("bcftools")
+    invcf = synthetic.generate_vcf(
+        workdir / "in.vcf",
+        nvariants=SCALES[scale]["nvariants"],
+    )
+    script = render_script(
+        "bcftools/BcftoolsFilter.py",
+        workdir,
+        **{
+            "in": {"infile": str(invcf)},
+            "out": {"outfile": str(workdir / "out.vcf")},
+            "envs": {
+                "bcftools": "bcftools",
+                "keep": True,
+                "ncores": 1,
+                "includes": {"Qual30": "QUAL>=30", "DP10": "INFO/DP>10"},
+                "excludes": {"LowAF": "INFO/AF<0.01"},
+                "args": {},
+                "scatter": None,
+                "tabix": "tabix",
+                "regions": None,
+                "regions_file": None,
+            },
+        },
+    )
+    return run_script(script)
+
+
+@case
+def BedLiftOver(scale, workdir):
+    inbed = synthetic.generate_bed(
+        workdir / "in.bed",
+        nregions=SCALES[scale]["nvariants"],
+    )
+    chain = synthetic.generate_chain(workdir / "test.chain")
+    script = render_script(
+        "bed/BedLiftOver.py",
+        workdir,
+        **{
+            "in": {"inbed": str(inbed)},
+            "out": {"outbed": str(workdir / "out.bed")},
+            "envs": {
+                "tool": "native",
+                "liftover": "liftOver",
+                "chain": str(chain),
+                "min_match": 0.95,
+            },
+        },
+    )
+    # the chain file parsed and cached in the first run
+    env = {"BIOPIPEN_CACHE_DIR": str(workdir / "cache")}
+    return run_script(script, env) + run_script(script, env)
+
+
+@case
+def VcfLiftOver(scale, workdir):
+    invcf = synthetic.generate_vcf(
+        workdir / "in.vcf",
+        nvariants=SCALES[scale]["nvariants"],
+    )
+    chain = synthetic.generate_chain(workdir / "test.chain")
+    script = render_script(
+        "vcf/VcfLiftOver.py",
+        workdir,
+        **{
+            "in": {"invcf": str(invcf)},
+            "out": {"outvcf": str(workdir / "out.vcf")},
+            "envs": {
+                "tool": "native",
+                "gatk": "gatk",
+                "chain": str(chain),
+                "tmpdir": str(workdir),
+                "reffa": "",
+                "args": {},
+            },
+        },
+    )
+    # the chain file parsed and cached in the first run
+    env = {"BIOPIPEN_CACHE_DIR": str(workdir / "cache")}
+    return run_script(script, env) + run_script(script, env)
+
+
+@case
+def tabix_index(scale, workdir):
+    require_exe("bgzip", "tabix")
+    require_module("cmdy")
+    from biopipen.utils.reference import tabix_index as _tabix_index
+
+    invcf = synthetic.generate_vcf(
+        workdir / "in.vcf.gz",
+        nvariants=SCALES[scale]["nvariants"],
+    )
+    outdir = workdir / "tabix"
+    outdir.mkdir()
+    start = time.perf_counter()
+    _tabix_index(invcf, "vcf", outdir, "tabix")
+    return time.perf_counter() - start
+
+
+@case
+def VcfBatchIndex(scale, workdir):
+    require_exe("tabix")
+    require_module("cmdy")
+    infiles = [
+        str(
+            synthetic.generate_vcf(
+                workdir / f"in{i}.vcf.gz",
+                nvariants=SCALES[scale]["nvariants"],
+                seed=i,
+            )
+        )
+        for i in range(10)
+    ]
+    script = render_script(
+        "vcf/VcfBatchIndex.py",
+        workdir,
+        **{
+            "in": {"infiles": infiles},
+            "out": {"outdir": str(workdir / "out")},
+            "envs": {"tabix": "tabix", "ncores": 2, "csi": "auto"},
+        },
+    )
+    elapsed = run_script(script)
+    Path(infiles[0]).touch()
+    return elapsed + run_script(script)
+
+
+@case
+def TabixFile_fetch(scale, workdir):
+    require_exe("tabix")
+    require_module("cmdy")
+    import random
+    from biopipen.utils.reference import TabixFile, tabix_index as _tabix_index
+
+    invcf = synthetic.generate_vcf(
+        workdir / "in.vcf",
+        nvariants=SCALES[scale]["nvariants"],
+    )
+    indexed = _tabix_index(invcf, "vcf", workdir)
+    rng = random.Random(8525)
+    regions = [
+        (contig, start, start + 1000)
+        for contig, length in synthetic.contigs()
+        for start in rng.sample(range(length - 1000), 200)
+    ]
+    start = time.perf_counter()
+    with TabixFile(indexed) as tbx:
+        for region in regions:
+            for _ in tbx.fetch(*region):
+                pass
+    return time.perf_counter() - start
+
+
+class SyntheticGeneInfo:
+    """An offline stand-in of `mygene.MyGeneInfo` for the benchmark, with
+    genes `GENE000001` to be converted to `SYMBOL000001`"""
+
+    def __init__(self, ngenes):
+        self.genes = set(synthetic.gene_ids(ngenes))
+
+    def querymany(self, genes, scopes, fields, species, **kwargs):
+        import pandas
+
+        rows = []
+        for gene in genes:
+            if gene in self.genes:
+                rows.append({
+                    "query": gene,
+                    "_id": gene[4:],
+                    "_score": 10.0,
+                    fields: gene.replace("GENE", "SYMBOL"),
+                })
+            else:
+                rows.append({"query": gene, "notfound": True})
+        return pandas.DataFrame(rows)
+
+
+@case
+def gene_name_conversion(scale, workdir):
+    require_module("datar")
+    from biopipen.utils import gene
+
+    ngenes = SCALES[scale]["ngenes"]
+    # 10% not found
+    genes = synthetic.gene_ids(ngenes + ngenes // 10)
+    get_mygene = gene.get_mygene
+    gene.get_mygene = lambda: SyntheticGeneInfo(ngenes)
+    try:
+        start = time.perf_counter()
+        gene.gene_name_conversion(
+            genes,
+            species="human",
+            infmt="symbol",
+            outfmt="symbol",
+            notfound="use-query",
+        )
+        return time.perf_counter() - start
+    finally:
+        gene.get_mygene = get_mygene
+
+
+@case
+def cnvpytor2other(scale, workdir):
+    funcs = load_functions(
+        render_script(
+            "bam/CNVpytor.py",
+            workdir,
+            **{
+                "in": {"bamfile": "sample.bam", "snpfile": None},
+                "out": {"outdir": str(workdir)},
+                "envs": {"cnvpytor": "cnvpytor", "cases": {}, "ncores": 1},
+            },
+        )
+    )
+    ncalls = SCALES[scale]["ncalls"]
+    calls = synthetic.generate_cnvpytor_calls(workdir / "calls.tsv", ncalls)
+    snpcalls = synthetic.generate_cnvpytor_calls(
+        workdir / "calls.combined.tsv",
+        ncalls,
+        snp=True,
+    )
+    start = time.perf_counter()
+    for out in ("gff", "bed"):
+        funcs.cnvpytor2other(calls, False, out)
+        funcs.cnvpytor2other(snpcalls, True, out)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scales",
+        nargs="+",
+        choices=list(SCALES),
+        default=["small", "medium"],
+        help="The scales to run",
+    )
+    parser.add_argument(
+        "--cases",
+        nargs="+",
+        choices=list(CASES),
+        default=list(CASES),
+        help="The cases to run",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Repeat each case"
+    )
+    parser.add_argument("--json", help="Save the results to the JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.cases:
+        for scale in args.scales:
+            result = {"case": name, "scale": scale, **SCALES[scale]}
+            runs = []
+            try:
+                for _ in range(args.repeat):
+                    with tempfile.TemporaryDirectory(
+                        prefix=f"biopipen_bench_{name}_"
+                    ) as workdir:
+                        runs.append(CASES[name](scale, Path(workdir)))
+            except Skip as skip:
+                result["skipped"] = str(skip)
+                print(f"{name:>22} {scale:>7}: skipped ({skip})")
+            else:
+                result["runs"] = runs
+                result["seconds"] = median(runs)
+                print(
+                    f"{name:>22} {scale:>7}: {result['seconds']:.4f}s "
+                    f"(median of {args.repeat})"
+                )
+            results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as fout:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "results": results,
+                },
+                fout,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
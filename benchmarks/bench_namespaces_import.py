@@ -0,0 +1,109 @@
+"""Startup benchmark for the namespaces
+
+Each namespace is imported in a fresh interpreter with `python -X importtime`
+after `pipen` is imported (it is required by `biopipen.core.proc` anyway),
+so that what is recorded is the extra cost of the namespace itself.
+
+The benchmark fails (exits with 1) when the cumulative import time of a
+namespace exceeds its budget, or when any heavy third-party module that
+should only be loaded when a process runs is imported.
+
+    python benchmarks/bench_namespaces_import.py [--budget MS] [--json FILE]
+"""
+import json
+import re
+import subprocess
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from statistics import median
+
+NAMESPACES = [
+    path.stem
+    for path in sorted(
+        (Path(__file__).parent.parent / "biopipen" / "namespaces").glob(
+            "[!_]*.py"
+        )
+    )
+]
+# Budgets in ms, falling back to --budget
+BUDGETS = {}
+# Modules that should only be loaded when a process actually executes
+HEAVY_MODULES = ("datar", "mygene", "cyvcf2", "pysam", "rtoml", "simpleconf")
+
+
+def import_namespace(namespace):
+    """Import a namespace in a fresh interpreter and return the cumulative
+    import time (ms) and the top-level packages it imported"""
+    module = f"biopipen.namespaces.{namespace}"
+    proc = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import pipen; import {module}",
+        ],
+        check=True,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    records = re.findall(
+        r"^import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)$", proc.stderr, re.M
+    )
+    names = [name for _, _, name in records]
+    start = names.index("pipen") + 1
+    cumulative = sum(
+        int(cum) for cum, indent, _ in records[start:] if not indent
+    )
+    packages = sorted(set(name.split(".")[0] for name in names[start:]))
+    return cumulative / 1000.0, packages
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=200.0,
+        help="The default budget (ms) for a namespace",
+    )
+    parser.add_argument(
+        "--nruns", type=int, default=3, help="Number of runs per namespace"
+    )
+    parser.add_argument("--json", help="Save the results to the JSON file")
+    parser.add_argument(
+        "namespaces", nargs="*", default=NAMESPACES, help="The namespaces"
+    )
+    args = parser.parse_args()
+
+    results = {}
+    failed = False
+    for namespace in args.namespaces:
+        runs = [import_namespace(namespace) for _ in range(args.nruns)]
+        elapsed = median(run[0] for run in runs)
+        budget = BUDGETS.get(namespace, args.budget)
+        heavy = [pkg for pkg in runs[-1][1] if pkg in HEAVY_MODULES]
+        passed = elapsed <= budget and not heavy
+        failed = failed or not passed
+        results[namespace] = {
+            "import_ms": elapsed,
+            "budget_ms": budget,
+            "heavy_modules": heavy,
+            "passed": passed,
+        }
+        print(
+            f"{'PASS' if passed else 'FAIL'} {namespace:>16}: "
+            f"{elapsed:8.2f}ms (budget {budget:.0f}ms)"
+            + (f", heavy modules imported: {', '.join(heavy)}" if heavy else "")
+        )
+
+    if args.json:
+        with open(args.json, "w") as fout:
+            json.dump(results, fout, indent=2)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""Benchmark the BGZF compression with different numbers of threads
+
+Compresses a synthetic VCF file with `biopipen.utils.bgzf.BgzfWriter`, and
+`bgzip` if available, reporting the throughput of the uncompressed data.
+
+    python benchmarks/bench_utils_bgzf.py [NVARIANTS]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from biopipen.utils.bgzf import BLOCK_SIZE, BgzfWriter
+
+sys.path.insert(0, str(Path(__file__).parent))
+import synthetic  # noqa: E402
+
+
+def compress(infile, outfile, threads):
+    start = time.perf_counter()
+    with open(infile, "rb") as fin, BgzfWriter(outfile, threads) as fout:
+        for chunk in iter(lambda: fin.read(BLOCK_SIZE * 16), b""):
+            fout.write(chunk)
+    return time.perf_counter() - start
+
+
+def compress_bgzip(infile, outfile):
+    start = time.perf_counter()
+    with open(outfile, "wb") as fout:
+        subprocess.run(["bgzip", "-c", str(infile)], stdout=fout, check=True)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    nvariants = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as tmpdir:
+        infile = synthetic.generate_vcf(
+            Path(tmpdir) / "in.vcf",
+            nvariants=nvariants,
+            nsamples=10,
+        )
+        size = infile.stat().st_size / 1e6
+        outfile = Path(tmpdir) / "out.vcf.gz"
+        print(f"Uncompressed: {size:.1f}MB")
+
+        cases = [
+            (
+                f"threads={threads}",
+                lambda t=threads: compress(infile, outfile, t),
+            )
+            for threads in (1, 2, 4, 8)
+            if threads <= (os.cpu_count() or 1)
+        ]
+        if shutil.which("bgzip"):
+            cases.append(("bgzip", lambda: compress_bgzip(infile, outfile)))
+
+        for name, func in cases:
+            elapsed = func()
+            print(
+                f"{name:>10}: {elapsed:.3f}s ({size / elapsed:.1f}MB/s, "
+                f"{outfile.stat().st_size / 1e6:.1f}MB compressed)"
+            )
@@ -0,0 +1,321 @@
+"""Deterministic generators of synthetic data for the benchmarks
+
+All generators take a `seed`, so that the same arguments always produce
+the same files.
+"""
+import gzip
+import random
+from pathlib import Path
+from typing import List, Tuple, Union
+
+BASES = "ACGT"
+
+
+def _open(path: Union[str, Path]):
+    """Open a file for writing, gzipped if it ends with `.gz`"""
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", compresslevel=1)
+    return open(path, "wt")
+
+
+def contigs(ncontigs: int = 5, length: int = 10_000_000) -> List[tuple]:
+    """The contigs and their lengths, with decreasing lengths"""
+    return [
+        (f"chr{i + 1}", length - i * (length // (ncontigs * 2)))
+        for i in range(ncontigs)
+    ]
+
+
+def gene_ids(ngenes: int, prefix: str = "GENE") -> List[str]:
+    """Gene IDs like `GENE000001`"""
+    return [f"{prefix}{i:06d}" for i in range(1, ngenes + 1)]
+
+
+def generate_vcf(
+    path: Union[str, Path],
+    nvariants: int = 10_000,
+    nsamples: int = 2,
+    ncontigs: int = 5,
+    seed: int = 8525,
+) -> Path:
+    """Generate a sorted VCF file with SNPs and indels
+
+    The sites have `QUAL`, `INFO/DP`, `INFO/AF` and the samples have
+    `GT:DP:GQ`. Gzipped if `path` ends with `.gz`.
+    """
+    rng = random.Random(seed)
+    ctgs = contigs(ncontigs)
+    total = sum(length for _, length in ctgs)
+    samples = [f"SAMPLE{i + 1}" for i in range(nsamples)]
+    gts = ["0/0", "0/1", "1/1", "./."]
+
+    with _open(path) as fout:
+        fout.write("##fileformat=VCFv4.2\n")
+        fout.write('##FILTER=<ID=PASS,Description="All filters passed">\n')
+        for name, length in ctgs:
+            fout.write(f"##contig=<ID={name},length={length}>\n")
+        fout.write(
+            '##INFO=<ID=DP,Number=1,Type=Integer,Description="Total Depth">\n'
+            '##INFO=<ID=AF,Number=A,Type=Float,Description="Allele Frequency">\n'
+            '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n'
+            '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read Depth">\n'
+            '##FORMAT=<ID=GQ,Number=1,Type=Integer,'
+            'Description="Genotype Quality">\n'
+        )
+        fout.write(
+            "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t"
+            + "\t".join(samples)
+            + "\n"
+        )
+        for name, length in ctgs:
+            nvars = max(1, nvariants * length // total)
+            positions = sorted(rng.sample(range(1, length), nvars))
+            for pos in positions:
+                ref = rng.choice(BASES)
+                kind = rng.random()
+                if kind < 0.8:
+                    alt = rng.choice(BASES.replace(ref, ""))
+                elif kind < 0.9:
+                    alt = ref + "".join(
+                        rng.choice(BASES) for _ in range(rng.randint(1, 5))
+                    )
+                else:
+                    ref, alt = ref + rng.choice(BASES), ref
+                qual = round(rng.uniform(1, 200), 1)
+                depth = rng.randint(5, 500)
+                info = f"DP={depth};AF={rng.random():.3f}"
+                calls = "\t".join(
+                    f"{rng.choice(gts)}:{rng.randint(0, 100)}:"
+                    f"{rng.randint(0, 99)}"
+                    for _ in samples
+                )
+                fout.write(
+                    f"{name}\t{pos}\t.\t{ref}\t{alt}\t{qual}\tPASS\t{info}\t"
+                    f"GT:DP:GQ\t{calls}\n"
+                )
+    return Path(path)
+
+
+def generate_annotation(
+    path: Union[str, Path],
+    vcfs: List[Union[str, Path]],
+    nvariants: int = 100_000,
+    fraction: float = 0.5,
+    ncontigs: int = 5,
+    seed: int = 8525,
+) -> Path:
+    """Generate a sorted sites-only annotation VCF file (like dbSNP), with
+    a fraction of the sites of the VCF files and the other random sites
+
+    The records have `ID` and `INFO/AF`, so that the sites sampled from the
+    VCF files are annotated by it.
+    """
+    rng = random.Random(seed)
+    ctgs = contigs(ncontigs)
+    total = sum(length for _, length in ctgs)
+    sites = set()
+    for vcf in vcfs:
+        with open(vcf) as fin:
+            for line in fin:
+                if line.startswith("#") or rng.random() >= fraction:
+                    continue
+                chrom, pos, _, ref, alt, _ = line.split("\t", 5)
+                sites.add((chrom, int(pos), ref, alt))
+    for name, length in ctgs:
+        nvars = max(1, (nvariants - len(sites)) * length // total)
+        for _ in range(nvars):
+            ref = rng.choice(BASES)
+            alt = rng.choice(BASES.replace(ref, ""))
+            sites.add((name, rng.randint(1, length - 1), ref, alt))
+
+    order = {name: i for i, (name, _) in enumerate(ctgs)}
+    with _open(path) as fout:
+        fout.write("##fileformat=VCFv4.2\n")
+        for name, length in ctgs:
+            fout.write(f"##contig=<ID={name},length={length}>\n")
+        fout.write(
+            '##INFO=<ID=AF,Number=A,Type=Float,'
+            'Description="Allele Frequency">\n'
+            "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+        )
+        for i, (chrom, pos, ref, alt) in enumerate(
+            sorted(sites, key=lambda site: (order[site[0]], *site[1:]))
+        ):
+            fout.write(
+                f"{chrom}\t{pos}\trs{i + 1}\t{ref}\t{alt}\t.\t.\t"
+                f"AF={rng.random():.3f}\n"
+            )
+    return Path(path)
+
+
+def generate_bed(
+    path: Union[str, Path],
+    nregions: int = 10_000,
+    ncontigs: int = 5,
+    seed: int = 8525,
+) -> Path:
+    """Generate a sorted 6-column BED file"""
+    rng = random.Random(seed)
+    ctgs = contigs(ncontigs)
+    total = sum(length for _, length in ctgs)
+    with _open(path) as fout:
+        idx = 0
+        for name, length in ctgs:
+            nregs = max(1, nregions * length // total)
+            for start in sorted(rng.sample(range(0, length - 1000), nregs)):
+                idx += 1
+                end = start + rng.randint(1, 1000)
+                strand = rng.choice("+-")
+                fout.write(
+                    f"{name}\t{start}\t{end}\tregion{idx}\t"
+                    f"{rng.randint(0, 1000)}\t{strand}\n"
+                )
+    return Path(path)
+
+
+def generate_chain(
+    path: Union[str, Path],
+    ncontigs: int = 5,
+    block_size: Tuple[int, int] = (100, 10_000),
+    seed: int = 8525,
+) -> Path:
+    """Generate a chain file to lift over the contigs of `contigs()`
+
+    Each contig is aligned to the contig of the same name by one chain of
+    blocks with random gaps, the ones of the even contigs on the negative
+    strands.
+    """
+    rng = random.Random(seed)
+    with _open(path) as fout:
+        for i, (name, length) in enumerate(contigs(ncontigs)):
+            blocks = []
+            tpos = qpos = 0
+            while True:
+                size = rng.randint(*block_size)
+                if tpos + size > length:
+                    break
+                gaps = (rng.randint(0, 100), rng.randint(0, 100))
+                blocks.append((size, *gaps))
+                tpos += size + gaps[0]
+                qpos += size + gaps[1]
+            # the gaps after the last block are not counted
+            tend = tpos - blocks[-1][1]
+            qend = qpos - blocks[-1][2]
+            strand = "-" if i % 2 else "+"
+            fout.write(
+                f"chain {tend} {name} {length} + 0 {tend} "
+                f"{name} {qend} {strand} 0 {qend} {i + 1}\n"
+            )
+            for size, dt, dq in blocks[:-1]:
+                fout.write(f"{size}\t{dt}\t{dq}\n")
+            fout.write(f"{blocks[-1][0]}\n\n")
+    return Path(path)
+
+
+def generate_gmt(
+    path: Union[str, Path],
+    npathways: int = 100,
+    ngenes: int = 20_000,
+    pathway_size: Tuple[int, int] = (10, 300),
+    seed: int = 8525,
+) -> Path:
+    """Generate a GMT file with pathways of random sizes"""
+    rng = random.Random(seed)
+    genes = gene_ids(ngenes)
+    with _open(path) as fout:
+        for i in range(npathways):
+            size = rng.randint(*pathway_size)
+            members = rng.sample(genes, min(size, ngenes))
+            fout.write(
+                f"PATHWAY_{i + 1}\thttp://example.com/{i + 1}\t"
+                + "\t".join(members)
+                + "\n"
+            )
+    return Path(path)
+
+
+def generate_expr_matrix(
+    path: Union[str, Path],
+    ngenes: int = 20_000,
+    nsamples: int = 10,
+    duplicate_rate: float = 0.0,
+    seed: int = 8525,
+) -> Path:
+    """Generate an expression matrix, genes as rows and samples as columns
+
+    The first column (`Gene`) has the gene IDs, which could be duplicated
+    with `duplicate_rate`.
+    """
+    rng = random.Random(seed)
+    genes = gene_ids(ngenes)
+    with _open(path) as fout:
+        fout.write(
+            "Gene\t"
+            + "\t".join(f"SAMPLE{i + 1}" for i in range(nsamples))
+            + "\n"
+        )
+        for i, gene in enumerate(genes):
+            if i > 0 and rng.random() < duplicate_rate:
+                gene = genes[rng.randrange(i)]
+            values = "\t".join(
+                f"{rng.expovariate(0.1):.3f}" for _ in range(nsamples)
+            )
+            fout.write(f"{gene}\t{values}\n")
+    return Path(path)
+
+
+def generate_cnvpytor_calls(
+    path: Union[str, Path],
+    ncalls: int = 1_000,
+    snp: bool = False,
+    ncontigs: int = 5,
+    seed: int = 8525,
+) -> Path:
+    """Generate a CNVpytor call table (`cnvpytor -call [combined]`)
+
+    11 columns without snp data, 27 columns with snp data
+    """
+    rng = random.Random(seed)
+    ctgs = contigs(ncontigs)
+    with _open(path) as fout:
+        for _ in range(ncalls):
+            chrom, length = rng.choice(ctgs)
+            start = rng.randrange(1, length - 100_000)
+            size = rng.randrange(1_000, 100_000)
+            cnvtype = rng.choice(["deletion", "duplication"])
+            level = rng.uniform(0.1, 3.0)
+            evals = [f"{rng.random() ** 8:.4e}" for _ in range(4)]
+            fields = [
+                cnvtype,
+                f"{chrom}:{start}-{start + size - 1}",
+                str(size),
+                f"{level:.4f}",
+                *evals,
+                f"{rng.random():.4f}",
+                f"{rng.random():.4f}",
+            ]
+            if snp:
+                fields.extend([
+                    f"{rng.random():.4f}",
+                    f"{rng.random():.4f}",
+                    str(rng.choice([10_000, 100_000])),
+                    str(rng.randint(1, 100)),
+                    f"{rng.uniform(0, 0.5):.4f}",
+                    evals[0],
+                    f"{rng.random():.4e}",
+                    str(rng.randint(0, 100)),
+                    str(rng.randint(0, 100)),
+                    str(rng.randint(0, 4)),
+                    rng.choice(["A", "AB", "AAB", "ABB"]),
+                    f"{rng.random():.4f}",
+                    f"{rng.random():.4f}",
+                    str(rng.randint(0, 4)),
+                    rng.choice(["A", "AB", "AAB", "ABB"]),
+                    f"{rng.random():.4f}",
+                    f"{rng.random():.4f}",
+                ])
+            else:
+                fields.append(str(rng.randint(0, 1_000_000)))
+            fout.write("\t".join(fields) + "\n")
+    return Path(path)
@@ -1,37 +1,157 @@
 """Provides the envs from configuration files"""
 
+import json
 import sys
-from typing import Any
+from hashlib import md5
+from os import getpid, replace
+from typing import Any, Callable, Iterator, List, Mapping, Union
 from pathlib import Path
 from tempfile import gettempdir
 
 from diot import Diot
-from simpleconf import Config
 
-from .defaults import BIOPIPEN_DIR
+from .defaults import BIOPIPEN_DIR, CACHE_DIR
 
 DEFAULT_CONFIG_FILE = BIOPIPEN_DIR / "core" / "config.toml"
 USER_CONFIG_FILE = Path("~").expanduser() / ".biopipen.toml"
 PROJ_CONFIG_FILE = Path(".") / ".biopipen.toml"
+CONFIG_CACHE_DIR = CACHE_DIR / "config"
 
 
 class ConfigItems(Diot):
     """Provides the envs from configuration files and defaults the
-    non-existing values to None."""
+    non-existing values to None.
 
+    It can be created lazily by `ConfigItems.lazy(loader)`, where the items
+    are loaded by the loader at the first time they are accessed.
+    """
+
+    @classmethod
+    def lazy(cls, loader: Callable[[], Mapping[str, Any]]) -> "ConfigItems":
+        """Create an empty object whose items are loaded on demand"""
+        out = cls()
+        out.__dict__["__loader__"] = loader
+        return out
+
+    def _load(self) -> None:
+        """Load the items if the object is lazy and has not been loaded"""
+        loader = self.__dict__.pop("__loader__", None)
+        if loader is not None:
+            self.update(loader())
 
     def __getattr__(self, name: str) -> Any:
+        self._load()
         try:
             return super().__getattr__(name)
         except (KeyError, AttributeError):
             return None
 
     def __getitem__(self, name: str) -> Any:
+        self._load()
         try:
             return super().__getitem__(name)
         except (KeyError, AttributeError):
             return None
 
+    def __contains__(self, name: Any) -> bool:
+        self._load()
+        return super().__contains__(name)
+
+    def __iter__(self) -> Iterator[str]:
+        self._load()
+        return super().__iter__()
+
+    def __len__(self) -> int:
+        self._load()
+        return super().__len__()
+
+    def __repr__(self) -> str:
+        self._load()
+        return super().__repr__()
+
+    def keys(self):
+        self._load()
+        return super().keys()
+
+    def values(self):
+        self._load()
+        return super().values()
+
+    def items(self):
+        self._load()
+        return super().items()
+
+    def get(self, name: str, value: Any = None) -> Any:
+        self._load()
+        return super().get(name, value)
+
+
+def _snapshot_key(profiles: List[Union[Mapping[str, Any], str, Path]]) -> str:
+    """Get the key of the snapshot of the profiles, by the resolved paths
+    and modification times of the files, and the content of the dicts"""
+    key = []
+    for profile in profiles:
+        if isinstance(profile, Mapping):
+            key.append(json.dumps(profile, sort_keys=True, default=str))
+            continue
+
+        path = Path(profile).expanduser().resolve()
+        try:
+            stat = path.stat()
+        except OSError:
+            key.append(f"{path}:-")
+        else:
+            key.append(f"{path}:{stat.st_mtime_ns}:{stat.st_size}")
+    return md5("\n".join(key).encode()).hexdigest()
+
+
+def load_config(
+    *profiles: Union[Mapping[str, Any], str, Path],
+    cache_dir: Union[str, Path] = CONFIG_CACHE_DIR,
+) -> Mapping[str, Any]:
+    """Load the configurations from the profiles
+
+    The compiled configurations are saved as a snapshot in `cache_dir`,
+    keyed by the profile paths and their modification times, so that
+    the TOML files don't need to be parsed again until any of them changes.
+
+    Args:
+        *profiles: The dicts or the configuration files in TOML
+        cache_dir: The directory to save the snapshots.
+            `None` to disable the snapshots
+
+    Returns:
+        The loaded configurations
+    """
+    if cache_dir is None:
+        snapshot = None
+    else:
+        snapshot = Path(cache_dir) / f"{_snapshot_key(profiles)}.json"
+        try:
+            with snapshot.open() as fsnap:
+                return json.load(fsnap)
+        except (OSError, ValueError):
+            pass
+
+    from simpleconf import Config
+
+    loaded = Config.load(*profiles, ignore_nonexist=True)
+    if snapshot is not None:
+        tmpfile = snapshot.with_suffix(f".{getpid()}.tmp")
+        try:
+            snapshot.parent.mkdir(parents=True, exist_ok=True)
+            with tmpfile.open("w") as fsnap:
+                json.dump(loaded, fsnap)
+            replace(tmpfile, snapshot)
+        except (OSError, TypeError, ValueError):
+            # read-only cache dir or values not JSON serializable
+            try:
+                tmpfile.unlink()
+            except OSError:
+                pass
+
+    return loaded
+
 
 config_profiles = [
     {"path": {"tmpdir": gettempdir()}},
@@ -44,4 +164,4 @@ if "+config" in sys.argv:
     cindex = sys.argv.index("+config")
     config_profiles.append(sys.argv[cindex + 1])
 
-config = ConfigItems(Config.load(*config_profiles, ignore_nonexist=True))
+config = ConfigItems.lazy(lambda: load_config(*config_profiles))
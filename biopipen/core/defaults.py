@@ -1,6 +1,14 @@
 """Provide default settgins"""
+import os
 from pathlib import Path
 
 BIOPIPEN_DIR = Path(__file__).parent.parent.resolve()
 REPORT_DIR = BIOPIPEN_DIR / "reports"
 SCRIPT_DIR = BIOPIPEN_DIR / "scripts"
+# Where to save the caches, i.e. the compiled configuration snapshots
+CACHE_DIR = Path(
+    os.environ.get(
+        "BIOPIPEN_CACHE_DIR",
+        Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")) / "biopipen",
+    )
+).expanduser()
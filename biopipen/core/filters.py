@@ -1,24 +1,193 @@
+from functools import lru_cache
+from hashlib import md5
+from os import getpid, replace
 from pathlib import Path
-from typing import Any, Mapping
+from typing import Any, List, Mapping, Optional, Tuple, Union
 
-import cmdy
 from liquid.filters.manager import FilterManager
 
 filtermanager = FilterManager()
 
+# Argument composing configs that can be passed with the dict, the same as
+# those allowed by cmdy in an argument segment
+CLI_ARGS_CONFIG = {
+    "prefix": "auto",
+    "sep": " ",
+    "dupkey": False,
+}
+# Vectors with R representation longer than this are saved to sidecar files
+# when `sidecar` is passed to the `r` filter
+R_SIDECAR_THRESHOLD = 65536
+# Max number of the rendered CLI arguments to keep
+CLI_ARGS_CACHE_SIZE = 1024
+
+
+def _split_cli_args_config(
+    dic: Mapping[str, Any],
+) -> Tuple[Mapping[str, Any], Mapping[str, Any]]:
+    """Separate the composing configs (`_prefix`, `cmdy_sep`, etc) from
+    the arguments"""
+    config = {}
+    arguments = {}
+    for key, val in dic.items():
+        if key.startswith("cmdy_") and key[5:] in CLI_ARGS_CONFIG:
+            config[key[5:]] = val
+        elif key.startswith("_") and key[1:] in CLI_ARGS_CONFIG:
+            config.setdefault(key[1:], val)
+        else:
+            arguments[key] = val
+    return arguments, {**CLI_ARGS_CONFIG, **config}
+
+
+def compose_cli_args(dic: Mapping[str, Any]) -> List[str]:
+    """Compose a list of CLI arguments from a dict, in the same way that
+    cmdy composes an argument segment
+
+    Examples:
+        >>> compose_cli_args({"a": 1, "ab": 2})
+        >>> # ["-a", "1", "--ab", "2"]
+        >>> compose_cli_args({"a": True, "b": False, "_": "x"})
+        >>> # ["-a", "x"]
+        >>> compose_cli_args({"a": [1, 2], "_dupkey": True})
+        >>> # ["-a", "1", "-a", "2"]
+        >>> compose_cli_args({"ab": 1, "_sep": "="})
+        >>> # ["--ab=1"]
+
+    Args:
+        dic: The arguments, with optional composing configs
+            `_prefix`, `_sep` and `_dupkey` (or with `cmdy_` prefix).
+            Underscores in the keys are replaced with dashes.
+
+    Returns:
+        The composed arguments
+    """
+    arguments, config = _split_cli_args_config(dic)
+    leadings = arguments.pop("", [])
+    positionals = arguments.pop("_", [])
+
+    ret = list(leadings) if isinstance(leadings, (tuple, list)) else [leadings]
+    for key, value in arguments.items():
+        key = key.replace("_", "-")
+        if config["prefix"] != "auto":
+            prefix = config["prefix"]
+        else:
+            prefix = "-" if len(key) == 1 else "--"
+        if config["sep"] != "auto":
+            sep = config["sep"]
+        else:
+            sep = " " if len(key) == 1 else "="
+
+        if not isinstance(value, list):
+            value = [value]
+
+        for i, val in enumerate(value):
+            if val is False:
+                continue
+            if i == 0 or config["dupkey"]:
+                if sep == " ":
+                    ret.append(f"{prefix}{key}")
+                else:
+                    ret.append(
+                        f"{prefix}{key}"
+                        + ("" if val is True else f"{sep}{val}")
+                    )
+                    continue
+            if val is not True:
+                ret.append(val)
+
+    ret.extend(
+        positionals if isinstance(positionals, (tuple, list)) else [positionals]
+    )
+    return [str(item) for item in ret]
+
+
+class _ReprKey:
+    """A dict hashed and compared by its repr, which keeps the order and
+    the types of the items (True vs 1), to be cached by `lru_cache`"""
+
+    __slots__ = ("dic", "key")
+
+    def __init__(self, dic: Mapping[str, Any]):
+        self.dic = dic
+        self.key = repr(dic)
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, _ReprKey) and self.key == other.key
+
+
+@lru_cache(maxsize=CLI_ARGS_CACHE_SIZE)
+def _dict_to_cli_args(dic: _ReprKey) -> str:
+    """Compose the CLI arguments of a dict, the least recently used ones
+    evicted from the cache"""
+    return " ".join(compose_cli_args(dic.dic))
+
+
 @filtermanager.register
 def dict_to_cli_args(dic: Mapping[str, Any]) -> str:
     """Convert a python dict to a string of CLI arguments
 
+    The arguments are composed in-process, the same way as `cmdy` does,
+    and the results are memoized, so that the identical `envs.args` are
+    only rendered once for all the jobs of a process.
+
     Examples:
         >>> {"a": 1, "ab": 2}
         >>> "-a 1 --ab 2"
     """
-    return cmdy.echo(dic).stdout.strip()
+    return _dict_to_cli_args(_ReprKey(dic))
+
+
+def _r_sidecar(obj: Any, sidecar: Union[str, Path]) -> Optional[str]:
+    """Save a vector to a content-addressed file and return the R code to
+    load it
+
+    Only vectors with numbers or plain strings (those `r()` would simply
+    quote and without line breaks) are saved. Otherwise `None` is returned.
+    """
+    if all(
+        isinstance(item, (int, float)) and not isinstance(item, bool)
+        for item in obj
+    ):
+        what = "numeric()"
+    elif all(
+        isinstance(item, (str, Path))
+        and r(item) == repr(str(item))
+        and "\n" not in str(item)
+        and "\r" not in str(item)
+        for item in obj
+    ):
+        what = "character()"
+    else:
+        return None
+
+    content = "".join(f"{item}\n" for item in obj)
+    digest = md5(f"{what}\n{content}".encode()).hexdigest()
+    sidecar = Path(sidecar)
+    sidecar_file = sidecar / f"r_sidecar_{digest}.txt"
+    if not sidecar_file.is_file():
+        # identical payloads from other jobs are reused
+        sidecar.mkdir(parents=True, exist_ok=True)
+        tmpfile = sidecar_file.with_suffix(f".{getpid()}.tmp")
+        tmpfile.write_text(content, encoding="utf-8")
+        replace(tmpfile, sidecar_file)
+
+    return (
+        f"scan({repr(str(sidecar_file))}, what={what}, sep='\\n', "
+        "quote='', na.strings=character(), blank.lines.skip=FALSE, "
+        "quiet=TRUE, encoding='UTF-8')"
+    )
 
 
 @filtermanager.register
-def r(obj: Any, ignoreintkey: bool = True) -> str:
+def r(
+    obj: Any,
+    ignoreintkey: bool = True,
+    sidecar: Union[str, Path] = None,
+    threshold: int = R_SIDECAR_THRESHOLD,
+) -> str:
     """Convert a python object into R repr
 
     Examples:
@@ -32,6 +201,13 @@ def r(obj: Any, ignoreintkey: bool = True) -> str:
             ignore them. For example, when `True`, `{1: 1, 2: 2}` will be
             translated into `"list(1, 2)"`, but `"list(`1` = 1, `2` = 2)"`
             when `False`
+        sidecar: A directory to save large vectors (i.e. gene lists, barcode
+            whitelists). If given, vectors with R representation longer
+            than `threshold` are written to content-addressed files in this
+            directory and loaded by `scan()` in the script. Using the
+            process workdir (`proc.workdir`) lets the jobs share them.
+        threshold: The length of the R representation of a vector to save
+            it to a sidecar file
 
     Returns:
         Then converted string representation of the object
@@ -59,14 +235,24 @@ def r(obj: Any, ignoreintkey: bool = True) -> str:
     if isinstance(obj, Path):
         return repr(str(obj))
     if isinstance(obj, (list, tuple, set)):
-        return 'c({})'.format(','.join([r(i) for i in obj]))
+        out = 'c({})'.format(','.join([
+            r(i, sidecar=sidecar, threshold=threshold) for i in obj
+        ]))
+        if sidecar is not None and len(out) > threshold:
+            return _r_sidecar(obj, sidecar) or out
+        return out
     if isinstance(obj, dict):
         # list allow repeated names
         return 'list({})'.format(','.join([
             '`{0}`={1}'.format(
                 k,
-                r(v)) if isinstance(k, int) and not ignoreintkey else \
-                r(v) if isinstance(k, int) and ignoreintkey else \
-                '`{0}`={1}'.format(str(k).split('#')[0], r(v))
+                r(v, sidecar=sidecar, threshold=threshold)
+            ) if isinstance(k, int) and not ignoreintkey else \
+                r(v, sidecar=sidecar, threshold=threshold)
+                if isinstance(k, int) and ignoreintkey else \
+                '`{0}`={1}'.format(
+                    str(k).split('#')[0],
+                    r(v, sidecar=sidecar, threshold=threshold),
+                )
             for k, v in sorted(obj.items())]))
     return repr(obj)
@@ -1,14 +1,42 @@
 """Provides a base class for the processes to subclass"""
+import json
+import os
 
 from liquid.defaults import SEARCH_PATHS
 from pipen import Proc as PipenProc
 
+from .config import config
 from .filters import filtermanager
-from .defaults import BIOPIPEN_DIR, REPORT_DIR
+from .defaults import BIOPIPEN_DIR, CACHE_DIR, REPORT_DIR
+from .template import TemplateLiquidCached
+
+INSTRUMENT_MODULE = "biopipen.utils.instrument"
+RESULT_CACHE_MODULE = "biopipen.utils.result_cache"
+RESULT_CACHE_MANIFEST = "job.result_cache.json"
 
 
 class Proc(PipenProc):
-    """Base class for all processes in biopipen to subclass"""
+    """Base class for all processes in biopipen to subclass
+
+    Attributes:
+        instrument: Whether to record the resource usage of each job
+            (wall time, CPU time, peak RSS, I/O and child processes) to
+            `job.resources.json` in the job's metadir.
+            Defaults to `config.misc.instrument`.
+            Summarize them by
+            `python -m biopipen.utils.instrument summary <workdir>`
+        result_cache: Whether the outputs of the jobs are determined only by
+            the input files and the envs, so that they can be reused across
+            pipeline runs (even in different workdirs) from the result
+            cache, when `config.result_cache.enabled`.
+            It could also be the name of an env, so that the jobs are only
+            cached when the env is set, i.e. `"genestore"` for the processes
+            querying an online database without an offline one given.
+            See `biopipen.utils.result_cache`
+    """
+    template = TemplateLiquidCached
+    instrument = None
+    result_cache = False
     template_opts = {
         "globals": {
             "biopipen_dir": str(BIOPIPEN_DIR),
@@ -16,3 +44,94 @@ class Proc(PipenProc):
         "filters": filtermanager.filters.copy(),
         "search_paths": SEARCH_PATHS + [str(REPORT_DIR)]
     }
+
+    def _compute_script(self):
+        """Wrap the job scripts to record the resource usage if needed"""
+        script = super()._compute_script()
+        instrument = (
+            config.misc.instrument
+            if self.instrument is None
+            else self.instrument
+        )
+        lang = self.lang or self.pipeline.config.lang
+        if script is not None and instrument and INSTRUMENT_MODULE not in lang:
+            self.lang = (
+                f"{config.lang.python} -m {INSTRUMENT_MODULE} run -- {lang}"
+            )
+        return script
+
+    async def _init_job(self, worker_id: int) -> None:
+        """Wrap the jobs to reuse the outputs from the result cache"""
+        await super()._init_job(worker_id)
+        if not self.result_cache or not config.result_cache.enabled:
+            return
+        if isinstance(self.result_cache, str) and not self.envs.get(
+            self.result_cache
+        ):
+            return
+
+        for job in self.jobs:
+            if job.index % self.submission_batch != worker_id or not job.cmd:
+                continue
+            self._write_result_cache_manifest(job)
+            job.cmd = [
+                *config.lang.python.split(),
+                "-m",
+                RESULT_CACHE_MODULE,
+                "run",
+                "--",
+                *job.cmd,
+            ]
+
+    def _write_result_cache_manifest(self, job) -> None:
+        """Write the manifest for the result cache to compute the key of
+        the job, with the job's paths stripped from the script"""
+        outdir = str(job.outdir.resolve())
+        # the input files are hashed by content
+        paths = []
+        for name, value in job.input.items():
+            intype = self.input.type[name]
+            if intype in ("file", "dir") and value is not None:
+                paths.append((value, f"<in.{name}>"))
+            elif intype in ("files", "dirs") and value is not None:
+                paths.extend(
+                    (path, f"<in.{name}[{i}]>") for i, path in enumerate(value)
+                )
+        # longer paths first in case some are prefixes of others
+        paths.sort(key=lambda item: len(item[0]), reverse=True)
+        paths.extend([
+            (outdir, "<outdir>"),
+            (str(job.outdir), "<outdir>"),
+            (str(job.metadir), "<metadir>"),
+            (str(self.workdir), "<workdir>"),
+        ])
+
+        script = job.script_file.read_text()
+        for path, placeholder in paths:
+            script = script.replace(path, placeholder)
+
+        output = {}
+        for name, value in job.output.items():
+            outtype = job._output_types[name]
+            if outtype != "var":
+                value = os.path.relpath(value, outdir)
+            output[name] = [outtype, value]
+
+        manifest = {
+            "proc": self.name,
+            "script": script,
+            "envs": self.envs,
+            "input": {
+                name: [self.input.type[name], value]
+                for name, value in job.input.items()
+            },
+            "output": output,
+            "outdir": outdir,
+            "cache_dir": str(
+                config.result_cache.dir or CACHE_DIR / "results"
+            ),
+            "max_size": config.result_cache.max_size or "50G",
+        }
+        job.metadir.joinpath(RESULT_CACHE_MANIFEST).write_text(
+            json.dumps(manifest, indent=2, sort_keys=True, default=str)
+        )
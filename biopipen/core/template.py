@@ -0,0 +1,67 @@
+"""Provides a template engine that shares the compiled templates"""
+from collections import namedtuple
+from typing import Any, Hashable, Mapping
+
+from pipen.template import TemplateLiquid
+
+TemplateCacheInfo = namedtuple(
+    "TemplateCacheInfo",
+    ["hits", "misses", "currsize"],
+)
+
+
+def _freeze(obj: Any) -> Hashable:
+    """Turn the template options into a hashable key"""
+    if isinstance(obj, Mapping):
+        return tuple(
+            (key, _freeze(val))
+            for key, val in sorted(obj.items(), key=lambda item: item[0])
+        )
+    if isinstance(obj, (list, tuple, set)):
+        return tuple(_freeze(val) for val in obj)
+    hash(obj)
+    return obj
+
+
+class TemplateLiquidCached(TemplateLiquid):
+    """Liquid template engine that compiles each template only once in
+    the whole python process
+
+    The compiled templates are cached by the source and the template
+    options (filters, globals, search paths, etc), so that the processes
+    sharing the same script (e.g. created by `Proc.from_proc()`) or the same
+    output template don't compile them again.
+    """
+
+    _cache = {}
+    _hits = 0
+    _misses = 0
+
+    def __init__(self, source: Any, **kwargs: Any):
+        try:
+            key = (source, _freeze(kwargs))
+        except TypeError:
+            # unhashable options, compile without caching
+            super().__init__(source, **kwargs)
+            return
+
+        cls = self.__class__
+        engine = cls._cache.get(key)
+        if engine is None:
+            cls._misses += 1
+            super().__init__(source, **kwargs)
+            cls._cache[key] = self.engine
+        else:
+            cls._hits += 1
+            self.engine = engine
+
+    @classmethod
+    def cache_info(cls) -> TemplateCacheInfo:
+        """Get the hits, misses and size of the cache"""
+        return TemplateCacheInfo(cls._hits, cls._misses, len(cls._cache))
+
+    @classmethod
+    def cache_clear(cls) -> None:
+        """Clear the cache and the counters"""
+        cls._cache.clear()
+        cls._hits = cls._misses = 0
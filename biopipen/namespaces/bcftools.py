@@ -6,6 +6,10 @@ from ..core.config import config
 class BcftoolsAnnotate(Proc):
     """Add or remove annotations from VCF files
 
+    To annotate many VCF files by the same annotation file, see
+    `biopipen.namespaces.vcf.VcfBatchAnnotate`, which reads the annotation
+    file only once for all of them.
+
     Input:
         infile: The input VCF file
         annfile: The annotation file
@@ -22,6 +26,29 @@ class BcftoolsAnnotate(Proc):
         cols: Overwrite `-c/--columns`
         header: Headers to be added
         args: Other arguments for `bcftools annotate`
+        scatter: Annotate the regions of the input file in parallel
+            (`ncores` at a time), and concatenate the outputs by
+            `bcftools concat` (`--naive` for compressed outputs, without
+            recompression). `"contig"` for one region by contig, or an
+            integer for the number of regions of similar sizes (contigs
+            split by the lengths in the `##contig` lines of the header).
+            The records are the same as annotating the whole file, and the
+            header is added the `bcftools concat` command instead of the
+            `bcftools annotate` one.
+            Not used with `envs.args.regions`/`envs.args.regions-file`.
+            With `envs.regions`, only the targets in each region are
+            annotated.
+        regions: Only annotate the records in these regions (1-based,
+            inclusive), a list or a comma-separated string, i.e.
+            `chr1,chr2:1001-2000`. The overlapping regions are merged, and
+            passed to bcftools by a regions file (`-R`, read by the index),
+            with `--regions-overlap 0`, so that a record is included once,
+            if its POS is in the regions. The output has only the records
+            in the regions. Overrides `envs.args.regions`/
+            `envs.args.regions-file`.
+        regions_file: A file of the regions, merged with `regions`.
+            A BED file (`.bed`/`.bed.gz`) or a tab-delimited file with the
+            contig, start and end (1-based, inclusive)
     """
     input = "infile:file, annfile:file"
     output = "outfile:file:{{in.infile | basename}}"
@@ -34,6 +61,9 @@ class BcftoolsAnnotate(Proc):
         "header": [],
         "args": {},
         "ncores": config.misc.ncores,
+        "scatter": None,
+        "regions": None,
+        "regions_file": None,
     }
     script = "file://../scripts/bcftools/BcftoolsAnnotate.py"
 
@@ -52,10 +82,8 @@ class BcftoolsFilter(Proc):
         bcftools: Path to bcftools
         ncores: Number of cores (`--nthread`) to use
         keep: Whether we should keep the filtered variants or not.
-        args: Other arguments for `bcftools annotate`
+        args: Other arguments for `bcftools filter`
         ncores: `nthread`
-        tmpdir: Path to save the intermediate files
-            Since the filters need to be applied one by one by bcftools
         includes: and
         excludes: include/exclude only sites for which EXPRESSION is true.
             - See: https://samtools.github.io/bcftools/bcftools.html#expressions
@@ -63,6 +91,27 @@ class BcftoolsFilter(Proc):
             - If `str`/`list` used, The filter names will be `Filter%d`
             - A dict is used when keys are filter names and values are
               expressions
+            - Since bcftools applies one filter at a time, the filters are
+              chained by pipes, with uncompressed BCF in between. Only the
+              last one writes the output file, no intermediate files.
+        scatter: Filter the regions of the input file in parallel (`ncores`
+            at a time), and concatenate the outputs by `bcftools concat`
+            (`--naive` for compressed outputs, without recompression).
+            `"contig"` for one region by contig, or an integer for the
+            number of regions of similar sizes (contigs split by the lengths
+            in the `##contig` lines of the header). The input file is
+            bgzipped and indexed if not yet. The records are the same as
+            filtering the whole file, and the header is added the
+            `bcftools concat` command instead of the `bcftools filter` ones.
+            Not used with `envs.args.regions`/`envs.args.regions-file`.
+            With `envs.regions`, only the targets in each region are
+            filtered.
+        tabix: Path to tabix, used to index the input file for `scatter`
+            or the regions
+        regions: Only keep the records in these regions, read by the index
+            (see `BcftoolsAnnotate`). Also applied without any filters.
+        regions_file: A file of the regions (BED or tab-delimited, see
+            `BcftoolsAnnotate`)
     """
     input = "infile:file"
     output = "outfile:file:{{in.infile | basename}}"
@@ -73,7 +122,10 @@ class BcftoolsFilter(Proc):
         "ncores": config.misc.ncores,
         "includes": None,
         "excludes": None,
-        "tmpdir": config.path.tmpdir,
         "args": {},
+        "scatter": None,
+        "tabix": config.exe.tabix,
+        "regions": None,
+        "regions_file": None,
     }
     script = "file://../scripts/bcftools/BcftoolsFilter.py"
@@ -3,7 +3,12 @@ from ..core.proc import Proc
 from ..core.config import config
 
 class BedLiftOver(Proc):
-    """Liftover a BED file using liftOver
+    """Liftover a BED file
+
+    By default, the coordinates are lifted by `biopipen.utils.liftover`,
+    with the chain file parsed once and cached, instead of running UCSC
+    `liftOver`. The records not lifted are saved in `rejected.bed` in the
+    job output directory, the same as `liftOver` does.
 
     Input:
         inbed: The input BED file
@@ -12,14 +17,20 @@ class BedLiftOver(Proc):
         outbed: The output BED file
 
     Envs:
+        tool: `native` to lift the coordinates in python, or `liftover` to
+            use UCSC `liftOver`
         liftover: The path to liftOver
         chain: The map chain file for liftover
+        min_match: The minimum ratio of bases that must remap
     """
     input = "inbed:file"
     output = "outbed:file:{{in.inbed | basename}}"
     envs = {
+        "tool": "native",
         "liftover": config.exe.liftover,
         "chain": config.path.liftover_chain,
+        "min_match": 0.95,
     }
-    lang = config.lang.bash
-    script = "file://../scripts/bed/BedLiftOver.sh"
+    lang = config.lang.python
+    script = "file://../scripts/bed/BedLiftOver.py"
+    result_cache = True
@@ -36,6 +36,17 @@ class GeneNameConversion(Proc):
         species: Limit gene query to certain species.
             Supported: human, mouse, rat, fruitfly, nematode, zebrafish,
             thale-cress, frog and pig
+        genestore: The offline gene ID store to query the genes instead of
+            MyGeneInfo. See `biopipen.utils.gene_store`.
+            The results are only reused from the result cache (see
+            `biopipen.core.proc.Proc`) with the gene store, as the ones
+            from MyGeneInfo could change over time
+        chunksize: Convert the table by chunks of rows, so that large
+            tables can be converted with bounded memory. The unique genes
+            are collected and converted once, and then the table is
+            rewritten chunk by chunk. Rows of duplicated genes are kept
+            as they are, instead of being joined with each other.
+            None to read and convert the whole table at once
     """
     input = "infile:file"
     output = "outfile:file:{{in.infile | basename}}"
@@ -49,5 +60,8 @@ class GeneNameConversion(Proc):
         "infmt": ["symbol", "alias"],
         "outfmt": "symbol",
         "species": "human",
+        "genestore": config.ref.genestore,
+        "chunksize": None,
     }
     script = "file://../scripts/gene/GeneNameConversion.py"
+    result_cache = "genestore"
@@ -1,6 +1,5 @@
 """Plotting data"""
 
-from email import header
 from ..core.proc import Proc
 from ..core.config import config
 
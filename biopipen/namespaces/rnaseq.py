@@ -18,3 +18,4 @@ class UnitConversion(Proc):
         "outlog2p": False,
     }
     script = "file://../scripts/rnaseq/UnitConversion.R"
+    result_cache = True
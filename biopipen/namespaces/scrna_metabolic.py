@@ -20,7 +20,6 @@ Start Process:
 from pathlib import Path
 from typing import Any, Mapping
 
-from datar.all import tibble, if_else
 from pipen import Pipen
 from ..core.config import config
 from ..core.proc import Proc
@@ -29,6 +28,26 @@ OPTIONS = {
     "clustered": config.pipeline.scrna_metabolic.clustered
 }
 
+
+def _cell_subsets_input_data(srtobj, inputs):
+    """Input data for MetabolicCellSubsets, using the subset files or the
+    config files if subset files are not provided"""
+    # only load datar when the pipeline runs
+    from datar.all import tibble, if_else
+
+    return tibble(
+        srtobj=srtobj,
+        filterfile=if_else(
+            [
+                ssfile is None or Path(ssfile).name == "None"
+                for ssfile in inputs.subsetfile
+            ],
+            inputs.configfile,
+            inputs.subsetfile,
+        ),
+    )
+
+
 def build_processes(options: Mapping[str, Any] = None):
     """Build processes for metabolic landscape analysis pipeline"""
     from .scrna import SeuratPreparing, SeuratFilter, SeuratClustering, SCImpute
@@ -124,29 +143,11 @@ def build_processes(options: Mapping[str, Any] = None):
     class MetabolicCellSubsets(SeuratFilter):
         if options["clustered"]:
             requires = MetabolicInputs
-            input_data = lambda ch: tibble(
-                srtobj=ch.metafile,
-                filterfile=if_else(
-                    [
-                        ssfile is None or Path(ssfile).name == "None"
-                        for ssfile in ch.subsetfile
-                    ],
-                    ch.configfile,
-                    ch.subsetfile,
-                ),
-            )
+            input_data = lambda ch: _cell_subsets_input_data(ch.metafile, ch)
         else:
             requires = MetabolicSeuratClustering, MetabolicInputs
-            input_data = lambda ch1, ch2: tibble(
-                srtobj=ch1.rdsfile,
-                filterfile=if_else(
-                    [
-                        ssfile is None or Path(ssfile).name == "None"
-                        for ssfile in ch2.subsetfile
-                    ],
-                    ch2.configfile,
-                    ch2.subsetfile,
-                ),
+            input_data = lambda ch1, ch2: _cell_subsets_input_data(
+                ch1.rdsfile, ch2
             )
 
 
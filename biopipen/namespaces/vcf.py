@@ -4,7 +4,16 @@ from ..core.config import config
 
 
 class VcfLiftOver(Proc):
-    """Liftover a VCF file using GATK
+    """Liftover a VCF file
+
+    By default, the variants are lifted by `biopipen.utils.liftover`, with
+    the chain file parsed once and cached, instead of running
+    `gatk LiftoverVcf` in a JVM. The records not lifted are saved in
+    `rejected.vcf` in the job output directory, with the same FILTERs as
+    `gatk LiftoverVcf` (`NoTarget`, `MismatchedRefAllele`,
+    `IndelStraddlesMultipleIntevals` and `ReverseComplementedIndel`).
+    The indels lifted to the negative strands are rejected, instead of
+    being realigned to the reference.
 
     Input:
         invcf: The input VCF file
@@ -13,23 +22,32 @@ class VcfLiftOver(Proc):
         outvcf: The output VCF file
 
     Envs:
+        tool: `native` to lift the variants in python, or `gatk` to use
+            `gatk LiftoverVcf`
         gatk: The path to gatk4, which should be installed via conda
         chain: The map chain file for liftover
         tmpdir: Directory for temporary storage of working files
+        reffa: The reference genome of the target build. Required by
+            `gatk`, with the sequence dictionary (`.dict`). Optional for
+            `native`, to check the REF alleles, and the contigs of the
+            output are taken from its index (`.fai`, built in memory if
+            not exists), otherwise from the chain file.
         args: Other CLI arguments for `gatk LiftoverVcf`
     """
 
     input = "invcf:file"
     output = "outvcf:file:{{in.invcf | basename}}"
     envs = {
+        "tool": "native",
         "gatk": config.exe.gatk4,
         "chain": config.path.liftover_chain,
         "tmpdir": config.path.tmpdir,
         "reffa": config.ref.reffa,
         "args": {},
     }
-    lang = config.lang.bash
-    script = "file://../scripts/vcf/VcfLiftOver.sh"
+    lang = config.lang.python
+    script = "file://../scripts/vcf/VcfLiftOver.py"
+    result_cache = True
 
 
 class VcfFilter(Proc):
@@ -56,10 +74,59 @@ class VcfFilter(Proc):
             `SNPONLY`: keeps only SNPs (`{"SNPONLY": False}` to filter SNPs out)
             `QUAL`: keeps variants with QUAL>=param (`{"QUAL": (30, False)}`)
             to keep only variants with QUAL<30
+            6. The filters not starting with `lambda` are the bcftools-like
+            expressions (see `biopipen.utils.vcf_expr`), i.e.
+            >>> {"Q30": "QUAL>=30 && INFO/DP>10", "SNP": 'TYPE=="snp"'}
+            All the filters are compiled into one function. The number of
+            variants passing and failing, and the time spent by each filter
+            are saved in `filter_stats.json` in the job output directory,
+            so that the filters can be ordered by their selectivity.
         filter_descs: Descriptions for the filters. Will be saved to the header
             of the output vcf file
         helper: Some helper code for the filters
         keep: Keep the variants not passing the filters?
+        ncores: Number of processes to filter the variants. If greater than
+            1, the input file is bgzipped and indexed (if not yet), and
+            split into regions by contigs (and by positions if the lengths
+            are in the `##contig` lines of the header). The regions are
+            filtered in parallel, and the outputs are concatenated in order
+            (bgzipped blocks are not recompressed). With only one region
+            (i.e. one contig without the length), the variants are filtered
+            in one process, and the cores are used to bgzip the output.
+        tabix: Path to tabix, used to index the input file for `ncores`
+            or the regions
+        regions: Only filter the variants in these regions (1-based,
+            inclusive), a list or a comma-separated string, i.e.
+            `chr1,chr2:1001-2000`. The input file is bgzipped and indexed
+            (if not yet), and only the blocks of the regions are read by
+            the index. The overlapping regions are merged first, and a
+            variant is included if its POS is in the regions (like
+            `--regions-overlap 0` of bcftools), so it is never repeated.
+        regions_file: A file of the regions, merged with `regions`.
+            A BED file (`.bed`/`.bed.gz`) or a tab-delimited file with the
+            contig, start and end (1-based, inclusive), like `-R` of
+            bcftools
+        batch: Evaluate the filters by blocks of this number of variants,
+            instead of variant by variant. The filters then take a
+            `VariantBlock` (see `biopipen.utils.vcf_batch`) and return
+            boolean arrays, i.e.
+            >>> lambda block: block.INFO.get("DP", 0) > 10
+            >>> lambda block: (block.format("GQ") >= 20).all(axis=1)
+            >>> lambda block: (block.gt_types == HOM_ALT).any(axis=1)
+            `numpy` is available as `np`. The builtin filters and the
+            expressions work the same.
+            The records failing no filters are written as they are.
+            If not given (None), the filters are evaluated by blocks of
+            10000 variants when none of them uses the FORMAT fields (the
+            builtin filters and the expressions without `FMT/`), so that
+            the genotypes are never decoded. `False` to always evaluate
+            them variant by variant.
+        samples: Only keep these samples, a list or a comma-separated
+            string, prefixed by `^` to exclude them instead (like `-s` of
+            bcftools), i.e. `"^NA12878,NA12891"`. The other samples are
+            not decoded by cyvcf2, or not split from the records filtered
+            by blocks, and the filters only see the kept samples.
+            Without any samples kept, the output has no FORMAT column.
     """
 
     input = "invcf:file"
@@ -70,6 +137,12 @@ class VcfFilter(Proc):
         "keep": True,
         "helper": "",
         "filter_descs": {},
+        "ncores": config.misc.ncores,
+        "tabix": config.exe.tabix,
+        "regions": None,
+        "regions_file": None,
+        "batch": None,
+        "samples": None,
     }
     script = "file://../scripts/vcf/VcfFilter.py"
 
@@ -77,6 +150,8 @@ class VcfFilter(Proc):
 class VcfIndex(Proc):
     """Index VCF files. If they are already index, use the index files
 
+    See `VcfBatchIndex` to index many VCF files in one job.
+
     Input:
         infile: The input VCF file
 
@@ -101,24 +176,130 @@ class VcfIndex(Proc):
         "tabix": config.exe.tabix,
     }
     script = "file://../scripts/vcf/VcfIndex.py"
+    result_cache = True
+
+
+class VcfBatchIndex(Proc):
+    """Index multiple VCF files at once, in parallel
+
+    Unlike `VcfIndex` running a job for each VCF file, the files are indexed
+    in one job by a pool of `envs.ncores` workers (see
+    `biopipen.utils.reference.index_files`). The files that are indexed
+    already are linked to the output directory, and the ones indexed in the
+    output directory by a previous run are skipped if they are not changed.
+
+    Input:
+        infiles: The input VCF files, or directories with the VCF files
+            (`*.vcf` and `*.vcf.gz`) in them
+
+    Output:
+        outdir: The directory of the bgzipped VCF files and their indexes
+
+    Envs:
+        tabix: Path to tabix
+        ncores: Number of files to index at the same time
+        csi: Whether to generate CSI indexes instead of tbi ones. `"auto"`
+            to generate them only for the files with contigs longer than
+            2^29 in the header, which tbi indexes do not support.
+    """
+    input = "infiles:files"
+    output = "outdir:dir:{{in.infiles[0] | stem0}}.indexed"
+    lang = config.lang.python
+    envs = {
+        "tabix": config.exe.tabix,
+        "ncores": config.misc.ncores,
+        "csi": "auto",
+    }
+    script = "file://../scripts/vcf/VcfBatchIndex.py"
 
 
 class VcfDownSample(Proc):
     """Down-sample VCF files to keep only a subset of variants in there
 
+    The input file is read once, and the variants are kept in their
+    original order (see `biopipen.utils.downsample`).
+
     Input:
         infile: The input VCF file
 
     Output:
         outfile: The output VCF file with subet variants
-            Gzipped if `in.infile` is gzipped
+            Bgzipped if `in.infile` is gzipped
 
     Envs:
         n: Fraction/Number of variants to keep
             If `n > 1`, it is the number.
             If `n <= 1`, it is the fraction.
+            If the input file is bgzipped and indexed (tabix/CSI, by
+            htslib), the number of variants is taken from the index, and
+            the variants are selected as they are read. Otherwise, the
+            number of variants are sampled by a reservoir (holding only
+            the sampled ones in memory), and the fraction of them is
+            sampled by keeping each one by the probability of `n`, so the
+            number is approximate.
+        seed: The seed for the random sampling
+        ncores: Number of threads to bgzip the output file
+        regions: Only sample the variants in these regions, read by the
+            index (see `VcfFilter`). The number of the variants in the
+            regions is not known from the index, so they are sampled as
+            if the input file is not indexed.
+        regions_file: A file of the regions (BED or tab-delimited, see
+            `VcfFilter`)
+        tabix: Path to tabix, used to index the input file for the regions
+        samples: Only keep these samples (see `VcfFilter`). Only the
+            sampled variants are subset.
     """
     input = "infile:file"
     output = "outfile:file:{{in.infile | basename}}"
-    envs = {"n": 0}
-    script = "file://../scripts/vcf/VcfDownSample.sh"
+    lang = config.lang.python
+    envs = {
+        "n": 0,
+        "seed": None,
+        "ncores": config.misc.ncores,
+        "regions": None,
+        "regions_file": None,
+        "tabix": config.exe.tabix,
+        "samples": None,
+    }
+    script = "file://../scripts/vcf/VcfDownSample.py"
+
+
+class VcfBatchAnnotate(Proc):
+    """Annotate multiple VCF files by one annotation VCF file
+
+    Unlike `BcftoolsAnnotate` running for each VCF file, the annotation file
+    is read only once for all the VCF files, joined with them by a sorted
+    merge (see `biopipen.utils.vcf_annotate`). So the I/O is about the size
+    of the annotation file plus the VCF files, instead of the size of the
+    annotation file times the number of the VCF files.
+
+    The records are matched by CHROM, POS, REF and ALT. All the files should
+    be sorted in the same order of contigs.
+
+    Input:
+        infiles: The input VCF files, could be gzipped
+        annfile: The annotation VCF file, could be gzipped
+
+    Output:
+        outdir: The directory of the annotated VCF files, with the same
+            names of the input files (bgzipped if gzipped)
+
+    Envs:
+        annfile: The annotation file. If `in.annfile` is provided,
+            this is ignored
+        cols: The columns to transfer, like `-c/--columns` of
+            `bcftools annotate`: `ID`, `QUAL`, `FILTER` and
+            `INFO/<TAG>` (or `<TAG>`), prefixed by `+` to only fill the
+            missing values. A list or a comma-separated string.
+        header: Headers to be added. The `##INFO`/`##FILTER` lines of the
+            transferred columns are added from the annotation file.
+    """
+    input = "infiles:files, annfile:file"
+    output = "outdir:dir:{{in.infiles[0] | stem0}}.annotated"
+    lang = config.lang.python
+    envs = {
+        "annfile": "",
+        "cols": [],
+        "header": [],
+    }
+    script = "file://../scripts/vcf/VcfBatchAnnotate.py"
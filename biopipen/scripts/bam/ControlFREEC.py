@@ -3,6 +3,7 @@ import glob
 import rtoml
 import cmdy
 from diot import Diot
+from biopipen.utils.reference import TabixFile
 
 bamfile = {{ in.bamfile | repr }}
 snpfile = {{ in.snpfile | repr }}
@@ -24,7 +25,8 @@ if snpfile:
     chrLenFile2 = f"{outdir}/chrLenFile.fai.txt"
     # Filter chrs in chrLenFile based on snps
     # get seqs from snpfile
-    seqs = cmdy.tabix(snpfile, _exe=tabix, l=True).stdout.strip().splitlines()
+    with TabixFile(snpfile) as tbx:
+        seqs = tbx.contigs
     kept_seqs = []
     with open(chrLenFile, "r") as fin, open(chrLenFile2, "w") as fout:
         for line in fin:
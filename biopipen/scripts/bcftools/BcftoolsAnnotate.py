@@ -1,7 +1,21 @@
+import os
 from os import path
 
-import cmdy
-from biopipen.utils.reference import tabix_index
+from biopipen.utils.command import (
+    bcftools_scatter,
+    command_args,
+    run_pipeline,
+    strcmd,
+)
+from biopipen.utils.reference import (
+    TabixFile,
+    order_regions,
+    parse_regions,
+    scatter_regions,
+    scatter_targets,
+    tabix_index,
+    write_regions,
+)
 
 infile = {{in.infile | repr}}
 annfile = {{(in.annfile or envs.annfile) | repr}}
@@ -13,9 +27,14 @@ ncores = {{envs.ncores | repr}}
 cols = {{envs.cols | repr}}
 header = {{envs.header | repr}}
 args = {{envs.args | repr}}
+scatter = {{envs.scatter | repr}}
+targets = parse_regions(
+    {{envs.regions | repr}},
+    {{envs.regions_file | repr}},
+)
 
 args["_exe"] = bcftools
-args["_"] = tabix_index(infile, "vcf")
+args["_"] = tabix_index(infile, "vcf", tabix=tabix, ncores=ncores)
 args["o"] = outfile
 args["threads"] = ncores
 
@@ -24,7 +43,7 @@ if annfile:
     ext = path.splitext(
         abname[:-3] if abname.endswith('.gz') else abname
     )[-1][1:]
-    args["a"] = tabix_index(annfile, ext, tabix)
+    args["a"] = tabix_index(annfile, ext, tabix=tabix, ncores=ncores)
 
 if cols and isinstance(cols, list):
     args["c"] = ",".join(cols)
@@ -39,8 +58,76 @@ if header:
             fh.write(f"{head}\n")
     args["h"] = headerfile
 
-cmd = cmdy.bcftools.annotate(**args).h()
-print("Running:")
-print("-------")
-print(cmd.strcmd)
-cmd.fg().run()
+
+
+def annotate_cmds(region, output, output_type):
+    """The command to annotate a region"""
+    arguments = args.copy()
+    arguments.pop("output-type", None)
+    arguments.update(
+        {
+            # or the regions file of the targets
+            ("R" if targets is not None else "r"): region,
+            # not the records spanning from the previous region
+            "regions-overlap": 0,
+            # the version is added to the header by bcftools concat
+            "no-version": True,
+            "o": output,
+            "O": output_type,
+        }
+    )
+    return [command_args(arguments, "annotate")]
+
+
+regions = None
+if targets is not None:
+    # the regions are read by the index
+    for key in ("r", "regions", "R", "regions-file"):
+        args.pop(key, None)
+    with TabixFile(args["_"]) as tbx:
+        ordered = order_regions(targets, tbx.contigs)
+    if scatter and ordered:
+        # the targets of the scattered regions, by regions files
+        regdir = path.join(joboutdir, "regions")
+        os.makedirs(regdir, exist_ok=True)
+        regions = [
+            write_regions(group, path.join(regdir, f"part{i}.txt"))
+            for i, group in enumerate(
+                scatter_targets(args["_"], scatter, ordered)
+            )
+        ]
+    else:
+        # bcftools fails with an empty regions file, the targets not in the
+        # file lead to an empty output
+        args["R"] = write_regions(
+            ordered or targets,
+            path.join(joboutdir, "regions.txt"),
+        )
+        args["regions-overlap"] = 0
+elif scatter and not any(
+    key in args for key in ("r", "regions", "R", "regions-file")
+):
+    regions = scatter_regions(args["_"], scatter)
+
+if regions:
+    # annotate the regions in parallel
+    args["threads"] = 1
+    print("Running by regions:", len(regions))
+    print("-------")
+    print(strcmd(annotate_cmds("<region>", "<part>", "<type>")[0]))
+    bcftools_scatter(
+        annotate_cmds,
+        regions,
+        outfile,
+        # the default of bcftools
+        output_type=args.get("O", args.get("output-type", "v")),
+        bcftools=bcftools,
+        ncores=ncores,
+        no_version=args.get("no-version", False),
+    )
+else:
+    cmd = command_args(args, "annotate")
+    print("Running:")
+    print("-------")
+    print(strcmd(cmd))
+    run_pipeline([cmd])
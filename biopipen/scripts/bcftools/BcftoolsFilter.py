@@ -1,58 +1,49 @@
-import tempfile
+import shutil
 from pathlib import Path
-from hashlib import md5
-import cmdy
+
+from biopipen.utils.command import (
+    bcftools_scatter,
+    command_args,
+    run_pipeline,
+    strcmd,
+)
+from biopipen.utils.reference import (
+    TabixFile,
+    order_regions,
+    parse_regions,
+    scatter_regions,
+    scatter_targets,
+    tabix_index,
+    write_regions,
+)
 
 infile = {{in.infile | repr}}
 outfile = {{out.outfile | repr}}
+joboutdir = {{job.outdir | repr}}
 bcftools = {{envs.bcftools | repr}}
 keep = {{envs.keep | repr}}
 args = {{envs.args | repr}}
 ncores = {{envs.ncores | repr}}
-tmpdir = {{envs.tmpdir | repr}}
 includes = {{envs.includes | repr}}
 excludes = {{envs.excludes | repr}}
+scatter = {{envs.scatter | repr}}
+tabix = {{envs.tabix | repr}}
+targets = parse_regions(
+    {{envs.regions | repr}},
+    {{envs.regions_file | repr}},
+)
 
 args["_exe"] = bcftools
-args["_"] = infile
-args["o"] = outfile
 args["threads"] = ncores
+for key in ("o", "output", "include", "i", "exclude", "e"):
+    args.pop(key, None)
 if "O" not in args and "output-type" not in args:
     args["O"] = "z" if infile.endswith(".gz") else "v"
 if "m" not in args and "mode" not in args:
     args["m"] = "+"
 
-tmpdir = (
-    Path(tmpdir) / f"biopipen-bcftoolsfilter-{md5(infile.encode()).hexdigest()}"
-)
-tmpdir.mkdir(parents=True, exist_ok=True)
-# a.vcf.gz -> a
-# a.vcf -> a
-stem = Path(infile).stem
-if stem.endswith(".vcf"):
-    stem = stem[:-4]
-# .vcf.gz
-# .gz
-ext = Path(infile).name[len(stem):]
-
 FILTER_INDEX = [1]
 
-def handle_filter(vcf, fname, filt, flag):
-    print("- Handling filter ", fname, ": ", filt, " ...")
-
-    arguments = args.copy()
-    arguments[flag] = filt
-    arguments["_"] = vcf
-    arguments["o"] = tmpdir / f"{stem}.{fname}{ext}"
-    if keep:
-        arguments["s"] = fname
-
-    cmd = cmdy.bcftools.filter(**arguments).hold()
-    print("  running:")
-    print("  ", cmd.strcmd)
-    cmd.run(wait=True)
-    return arguments["o"]
-
 
 def normalize_expr(expr, flag):
     out = {}
@@ -74,8 +65,116 @@ includes = normalize_expr(includes, "include")
 excludes = normalize_expr(excludes, "exclude")
 includes.update(excludes)
 
-# bcftools can be only done once at one filter
+
+
+def filter_cmds(region=None, output=outfile, output_type=None):
+    """The commands of the filters, chained by pipes
+
+    bcftools can be only done once at one filter, so the filters are
+    chained with uncompressed BCF in between, and only the last one writes
+    (and compresses) the output file
+    """
+    cmds = []
+    for i, (fname, (filt, flag)) in enumerate(includes.items()):
+        arguments = args.copy()
+        arguments[flag] = filt
+        arguments["_"] = infile if i == 0 else "-"
+        if i == 0 and region:
+            # or the regions file of the targets
+            arguments["R" if targets is not None else "r"] = region
+            # not the records spanning from the previous region
+            arguments["regions-overlap"] = 0
+        if i < len(includes) - 1 or output != outfile:
+            # the versions are added to the header of the final output
+            arguments["no-version"] = True
+        if i < len(includes) - 1:
+            arguments.pop("output-type", None)
+            arguments["O"] = "u"
+        else:
+            arguments["o"] = output
+            if output_type:
+                arguments.pop("output-type", None)
+                arguments["O"] = output_type
+        if keep:
+            arguments["s"] = fname
+        cmds.append(command_args(arguments, "filter"))
+    return cmds
+
+
 for fname, (filt, flag) in includes.items():
-    infile = handle_filter(infile, fname, filt, flag)
+    print("- Handling filter ", fname, ": ", filt, " ...")
+
+regions_file = None
+regions = None
+if targets is not None:
+    # the regions are read by the index
+    for key in ("r", "regions", "R", "regions-file"):
+        args.pop(key, None)
+    infile = str(tabix_index(infile, "vcf", tabix=tabix, ncores=ncores))
+    with TabixFile(infile) as tbx:
+        ordered = order_regions(targets, tbx.contigs)
+    if includes and scatter and ordered:
+        # the targets of the scattered regions, by regions files
+        regdir = Path(joboutdir) / "regions"
+        regdir.mkdir(exist_ok=True)
+        regions = [
+            write_regions(group, regdir / f"part{i}.txt")
+            for i, group in enumerate(
+                scatter_targets(infile, scatter, ordered)
+            )
+        ]
+    else:
+        # bcftools fails with an empty regions file, the targets not in the
+        # file lead to an empty output
+        regions_file = write_regions(
+            ordered or targets,
+            Path(joboutdir) / "regions.txt",
+        )
+elif includes and scatter and not any(
+    key in args for key in ("r", "regions", "R", "regions-file")
+):
+    indexed = str(tabix_index(infile, "vcf", tabix=tabix, ncores=ncores))
+    infile = indexed
+    regions = scatter_regions(indexed, scatter)
 
-cmdy.cp(infile, outfile)
+if regions:
+    # filter the regions in parallel
+    args["threads"] = 1
+    print("Running by regions:", len(regions))
+    print("-------")
+    print(" | \\\n  ".join(strcmd(cmd) for cmd in filter_cmds("<region>")))
+    bcftools_scatter(
+        filter_cmds,
+        regions,
+        outfile,
+        output_type=args.get("O", args.get("output-type")),
+        bcftools=bcftools,
+        ncores=ncores,
+        no_version=args.get("no-version", False),
+    )
+elif includes:
+    cmds = filter_cmds(regions_file)
+    print("Running:")
+    print("-------")
+    print(" | \\\n  ".join(strcmd(cmd) for cmd in cmds))
+    run_pipeline(cmds)
+elif regions_file:
+    # no filters, only the records in the regions
+    cmd = command_args(
+        {
+            "_exe": bcftools,
+            "R": regions_file,
+            "regions-overlap": 0,
+            "O": args.get("O", args.get("output-type")),
+            "o": outfile,
+            "threads": ncores,
+            "_": infile,
+        },
+        "view",
+    )
+    print("Running:")
+    print("-------")
+    print(strcmd(cmd))
+    run_pipeline([cmd])
+else:
+    shutil.copyfile(infile, outfile)
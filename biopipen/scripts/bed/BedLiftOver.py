@@ -0,0 +1,23 @@
+from biopipen.utils.command import run_pipeline, strcmd
+from biopipen.utils.liftover import liftover_bed
+
+inbed = {{in.inbed | repr}}
+outbed = {{out.outbed | repr}}
+rejfile = {{job.outdir | joinpaths: "rejected.bed" | repr}}
+tool = {{envs.tool | repr}}
+liftover = {{envs.liftover | repr}}
+chain = {{envs.chain | repr}}
+min_match = {{envs.min_match | repr}}
+
+if not chain:
+    raise ValueError("No chain file (`envs.chain`) provided.")
+
+if tool == "liftover":
+    cmd = [liftover, f"-minMatch={min_match}", inbed, chain, outbed, rejfile]
+    print("Running:")
+    print("-------")
+    print(strcmd(cmd))
+    run_pipeline([cmd])
+else:
+    nlifted, nrejected = liftover_bed(inbed, outbed, rejfile, chain, min_match)
+    print(f"Lifted: {nlifted}, rejected: {nrejected}")
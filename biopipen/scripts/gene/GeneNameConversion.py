@@ -1,6 +1,5 @@
 import pandas
-from datar.all import c, right_join, select, relocate
-from biopipen.utils.gene import gene_name_conversion
+from biopipen.utils.gene import apply_gene_conversion, gene_name_conversion
 
 infile = {{in.infile | quote}}
 outfile = {{out.outfile | quote}}
@@ -12,55 +11,93 @@ output = {{envs.output | repr}}
 infmt = {{envs.infmt | repr}}
 outfmt = {{envs.outfmt | repr}}
 species = {{envs.species | quote}}
+genestore = {{envs.genestore | repr}}
+chunksize = {{envs.chunksize | repr}}
 
-df = pandas.read_csv(infile, **inopts)
+if chunksize:
+    # streaming: collect the unique genes, convert them once, and then
+    # rewrite the table chunk by chunk
+    genes = {}
+    for chunk in pandas.read_csv(infile, chunksize=chunksize, **inopts):
+        col = (
+            chunk.iloc[:, genecol]
+            if isinstance(genecol, int)
+            else chunk[genecol]
+        )
+        genes.update(dict.fromkeys(col.astype(str).tolist()))
 
-if isinstance(genecol, int):
-    genes = df.iloc[:, genecol]
-else:
-    genes = df.loc[:, genecol]
+    converted = gene_name_conversion(
+        genes=list(genes),
+        species=species,
+        infmt=infmt,
+        outfmt=outfmt,
+        notfound=notfound,
+        store=genestore,
+    ).set_index("query")
 
-colname = genes.name
-genes = genes.tolist()
+    header = outopts.pop("header", True)
+    mode = outopts.pop("mode", "w")
+    for chunk in pandas.read_csv(infile, chunksize=chunksize, **inopts):
+        apply_gene_conversion(chunk, genecol, converted, output).to_csv(
+            outfile, header=header, mode=mode, **outopts
+        )
+        header = False
+        mode = "a"
 
-#        query  `outfmt`
-#     <object> <object>
-# 0  1255_g_at   GUCA1A
-# 1    1316_at     THRA
-# 2    1320_at   PTPN21
-# 3    1294_at  MIR5193
-converted = gene_name_conversion(
-    genes=genes,
-    species=species,
-    infmt=infmt,
-    outfmt=outfmt,
-    notfound=notfound,
-)
-converted.columns = [colname] + converted.columns[1:].tolist()
+else:
+    from datar.all import c, right_join, select, relocate
 
-if output == "only":
-    out = converted
+    df = pandas.read_csv(infile, **inopts)
 
-elif output == "keep":
-    out = df >> right_join(converted, by=colname, suffix=["", "_converted"])
+    if isinstance(genecol, int):
+        genes = df.iloc[:, genecol]
+    else:
+        genes = df.loc[:, genecol]
 
-elif output == "drop":
-    out = df >> right_join(
-        converted,
-        by=colname, suffix=["", "_converted"]
-    ) >> select(~c(colname))
+    colname = genes.name
+    genes = genes.tolist()
 
-elif output == "replace":
-    out = df >> right_join(
-        converted, by=colname, suffix=["", "_converted"]
+    #        query  `outfmt`
+    #     <object> <object>
+    # 0  1255_g_at   GUCA1A
+    # 1    1316_at     THRA
+    # 2    1320_at   PTPN21
+    # 3    1294_at  MIR5193
+    converted = gene_name_conversion(
+        genes=genes,
+        species=species,
+        infmt=infmt,
+        outfmt=outfmt,
+        notfound=notfound,
+        store=genestore,
     )
-    converted_cols = out.columns[-len(converted.columns)+1:].tolist()
-    pos = df.columns.get_indexer([colname])[0]
-    out = out >> relocate(
-        converted_cols, _after=pos+1
-    ) >> select(~c(colname))
+    converted.columns = [colname] + converted.columns[1:].tolist()
 
-else:
-    raise ValueError(f"Unknown output mode: {output}.")
+    if output == "only":
+        out = converted
+
+    elif output == "keep":
+        out = df >> right_join(
+            converted, by=colname, suffix=["", "_converted"]
+        )
+
+    elif output == "drop":
+        out = df >> right_join(
+            converted,
+            by=colname, suffix=["", "_converted"]
+        ) >> select(~c(colname))
+
+    elif output == "replace":
+        out = df >> right_join(
+            converted, by=colname, suffix=["", "_converted"]
+        )
+        converted_cols = out.columns[-len(converted.columns)+1:].tolist()
+        pos = df.columns.get_indexer([colname])[0]
+        out = out >> relocate(
+            converted_cols, _after=pos+1
+        ) >> select(~c(colname))
+
+    else:
+        raise ValueError(f"Unknown output mode: {output}.")
 
-out.to_csv(outfile, **outopts)
+    out.to_csv(outfile, **outopts)
@@ -0,0 +1,24 @@
+from os import path
+
+from biopipen.utils.vcf_annotate import annotate_vcfs
+
+infiles = {{in.infiles | repr}}
+annfile = {{(in.annfile or envs.annfile) | repr}}
+outdir = {{out.outdir | repr}}
+cols = {{envs.cols | repr}}
+header = {{envs.header | repr}}
+
+if not annfile:
+    raise ValueError("No annotation file provided.")
+if not cols:
+    raise ValueError("No columns (`envs.cols`) to transfer.")
+if not isinstance(header, list):
+    header = [header]
+
+outfiles = [path.join(outdir, path.basename(infile)) for infile in infiles]
+if len(set(outfiles)) < len(outfiles):
+    raise ValueError("Input files with the same names.")
+
+nannotated = annotate_vcfs(infiles, annfile, outfiles, cols, header)
+for infile, nann in zip(infiles, nannotated):
+    print(f"- {path.basename(infile)}: {nann} records annotated")
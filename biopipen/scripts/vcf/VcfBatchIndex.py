@@ -0,0 +1,27 @@
+from os import path
+from glob import glob
+
+from biopipen.utils.reference import index_files
+
+infiles = {{in.infiles | repr}}
+outdir = {{out.outdir | repr}}
+tabix = {{envs.tabix | repr}}
+ncores = {{envs.ncores | repr}}
+csi = {{envs.csi | repr}}
+
+vcfs = []
+for infile in infiles:
+    if path.isdir(infile):
+        vcfs.extend(
+            sorted(
+                glob(path.join(infile, "*.vcf"))
+                + glob(path.join(infile, "*.vcf.gz"))
+            )
+        )
+    else:
+        vcfs.append(infile)
+if not vcfs:
+    raise ValueError("No VCF files to index.")
+
+for outfile, status in index_files(vcfs, outdir, "vcf", tabix, ncores, csi):
+    print(f"- {path.basename(outfile)}: {status}")
@@ -0,0 +1,81 @@
+import gzip
+import io
+from itertools import chain
+
+from biopipen.utils.bgzf import BgzfWriter
+from biopipen.utils.downsample import downsample
+from biopipen.utils.reference import (
+    TabixFile,
+    fetch_regions,
+    order_regions,
+    parse_regions,
+    tabix_index,
+)
+from biopipen.utils.vcf_batch import sample_indexes, samples_subsetter
+
+infile = {{in.infile | repr}}
+outfile = {{out.outfile | repr}}
+n = {{envs.n | repr}}
+seed = {{envs.seed | repr}}
+ncores = {{envs.ncores | repr}}
+tabix = {{envs.tabix | repr}}
+samples = {{envs.samples | repr}}
+targets = parse_regions(
+    {{envs.regions | repr}},
+    {{envs.regions_file | repr}},
+)
+
+# the number of records from the index, if any, so that they can be
+# selected as they are read, without holding them in memory
+total = None
+if infile.endswith(".gz") and targets is None:
+    try:
+        with TabixFile(infile) as tbx:
+            total = tbx.nrecords
+    except (FileNotFoundError, ValueError):
+        pass
+
+if infile.endswith(".gz"):
+    fout = BgzfWriter(outfile, threads=ncores)
+else:
+    fout = open(outfile, "wb")
+
+if targets is not None:
+    # only the blocks of the regions are read, by the index
+    fin = TabixFile(tabix_index(infile, "vcf", tabix=tabix))
+    targets = order_regions(targets, fin.contigs)
+    header = [f"{line}\n".encode() for line in fin.header]
+    records = (f"{line}\n".encode() for line in fetch_regions(fin, targets))
+else:
+    if infile.endswith(".gz"):
+        # the lines are faster to iterate from a buffered reader
+        fin = io.BufferedReader(gzip.open(infile, "rb"), 1 << 20)
+    else:
+        fin = open(infile, "rb")
+
+    header = []
+    first = b""
+    for line in fin:
+        if not line.startswith(b"#"):
+            first = line
+            break
+        header.append(line)
+
+    records = chain([first], fin) if first else iter(())
+
+subset = None
+if samples is not None:
+    # only the sampled records are subset
+    allsamples = header[-1].decode().rstrip("\r\n").split("\t")[9:]
+    subset = samples_subsetter(
+        sample_indexes(allsamples, samples),
+        len(allsamples),
+    )
+    header[-1] = subset(header[-1])
+
+fout.write(b"".join(header))
+for record in downsample(records, n, total=total, seed=seed):
+    fout.write(record if subset is None else subset(record))
+
+fin.close()
+fout.close()
@@ -1,13 +1,36 @@
+import json
+import os
+import shutil
+
 from cyvcf2 import VCF, Writer, Variant
+from biopipen.utils.bgzf import BgzfWriter
+from biopipen.utils.reference import (
+    TabixFile,
+    fetch_regions,
+    order_regions,
+    parse_regions,
+    tabix_index,
+)
+from biopipen.utils.vcf_batch import sample_indexes, samples_subsetter
+from biopipen.utils.vcf_expr import FilterSet, merge_summaries, uses_samples
 
 infile = {{in.invcf | repr}}
 outfile = {{out.outfile | repr}}
+statsfile = {{job.outdir | joinpaths: "filter_stats.json" | repr}}
 
 {{envs.helper}}
 
 keep = {{envs.keep | repr}}
 filters = {{envs.filters | repr}}
 filter_descs = {{envs.filter_descs | repr}}
+ncores = {{envs.ncores | repr}}
+batch = {{envs.batch | repr}}
+tabix = {{envs.tabix | repr}}
+samples = {{envs.samples | repr}}
+targets = parse_regions(
+    {{envs.regions | repr}},
+    {{envs.regions_file | repr}},
+)
 
 # builtin filters
 BUILTIN_FILTERS = {}
@@ -23,47 +46,235 @@ def SNPONLY(variant: Variant, nonrev: bool = True):
         len(variant.REF) == 1 and
         all(len(alt) == 1 for alt in variant.ALT)
     )
-    return nonrev and ret
+    return ret if nonrev else not ret
 
 @builtin_filters
 def QUAL(variant: Variant, cutoff, nonrev: bool = True):
     """Filter variants with QUAL above or below cutoff"""
     ret = variant.QUAL >= cutoff
-    return nonrev and ret
+    return ret if nonrev else not ret
+
+if batch is None and all(
+    name in BUILTIN_FILTERS
+    or (not filt.lstrip().startswith("lambda") and not uses_samples(filt))
+    for name, filt in filters.items()
+):
+    # the filters only use the site-level fields, the records are filtered
+    # as text, without decoding the genotypes
+    batch = 10_000
+
+if batch:
+    # the vectorized versions, evaluated by blocks of variants
+    import numpy as np
+    from biopipen.utils.vcf_batch import (
+        BUILTIN_FILTERS,
+        HOM_REF,
+        HET,
+        UNKNOWN,
+        HOM_ALT,
+        filter_records,
+        iter_records,
+    )
 
 for name, filt in filters.items():
     if name in BUILTIN_FILTERS:
         if not isinstance(filt, tuple):
             filt = (filt, )
-        filters[name] = lambda variant: BUILTIN_FILTERS[name](variant, *filt)
+        filters[name] = (
+            lambda variant, name=name, filt=filt:
+            BUILTIN_FILTERS[name](variant, *filt)
+        )
         filters[name].__doc__ = BUILTIN_FILTERS[name].__doc__
-    else:
+    elif filt.lstrip().startswith("lambda"):
         filters[name] = eval(filt)
         filters[name].__doc__ = filter_descs.get(name, filt)
+    # otherwise an expression, like `QUAL>=30 && INFO/DP>10`
 
+# all the filters compiled into one function
+# the others are not evaluated once a variant fails one, if it is dropped
+filterset = FilterSet(filters, block=bool(batch), stop_on_fail=not keep)
 
-invcf = VCF(infile)
-for name, filt in filters.items():
-    invcf.add_filter_to_header({
-        'ID': name,
-        'Description': filt.__doc__,
-    })
 
-if outfile.endswith(".gz"):
-    outvcf = Writer(outfile, invcf, "wz")
+def open_vcf(path):
+    """Open the VCF file, with the filters added to the header, and only
+    the selected samples decoded"""
+    vcf = VCF(path, samples=selected)
+    for name, filt in filters.items():
+        desc = (
+            filter_descs.get(name, filt)
+            if isinstance(filt, str)
+            else filt.__doc__
+        )
+        vcf.add_filter_to_header({
+            'ID': name,
+            # i.e. TYPE=="snp", not allowed in the header
+            'Description': desc.replace('"', "'"),
+        })
+    return vcf
+
+
+def select_samples(records):
+    """Keep only the selected samples of the records read as text"""
+    return records if subset is None else map(subset, records)
+
+
+def apply_filters(variant):
+    """Set the FILTER of the variant and tell if it should be written"""
+    failed = filterset(variant)
+    if failed:
+        if variant.FILTER:
+            failed.insert(0, variant.FILTER)
+        variant.FILTER = ";".join(failed)
+    return keep or not variant.FILTER
+
+
+def fetch_variants(vcf, regions):
+    """Fetch the variants starting in the regions, by the index"""
+    for contig, start, end in regions:
+        if end is None:
+            variants = vcf(f"{contig}:{start + 1}")
+        else:
+            variants = vcf(f"{contig}:{start + 1}-{end}")
+        for variant in variants:
+            # not the ones overlapping from the previous region
+            if variant.start >= start:
+                yield variant
+
+
+def filter_regions(item):
+    """Filter the variants starting in the regions to a part of the output
+    """
+    index, regions = item
+    # only the stats of this region, the workers filter multiple regions
+    filterset.reset()
+    partfile = f"{outfile}.part{index}"
+    if outfile.endswith(".gz"):
+        fout = BgzfWriter(partfile, eof=False)
+    else:
+        fout = open(partfile, "w")
+
+    if batch:
+        with TabixFile(indexed) as tbx:
+            filter_records(
+                select_samples(fetch_regions(tbx, regions)),
+                filterset,
+                fout.write,
+                samples=samples,
+                keep=keep,
+                block_size=batch,
+            )
+    else:
+        vcf = open_vcf(indexed)
+        for variant in fetch_variants(vcf, regions):
+            if apply_filters(variant):
+                fout.write(str(variant))
+        vcf.close()
+
+    fout.close()
+    return partfile, filterset.summary()
+
+
+# the samples are selected by the reader, the others are not decoded
+selected = subset = None
+if samples is not None:
+    allsamples = VCF(infile).samples
+    indexes = sample_indexes(allsamples, samples)
+    selected = [allsamples[i] for i in indexes]
+    subset = samples_subsetter(indexes, len(allsamples))
+
+indexed = infile
+if ncores > 1 or targets is not None:
+    # the regions are read by the index
+    indexed = str(tabix_index(infile, "vcf", tabix=tabix))
+    with TabixFile(indexed) as tbx:
+        contigs = tbx.contigs
+    if targets is not None:
+        targets = order_regions(targets, contigs)
+
+invcf = open_vcf(indexed)
+samples = invcf.samples
+
+groups = []
+if ncores > 1:
+    from biopipen.utils.reference import (
+        contig_lengths,
+        intersect_regions,
+        split_regions,
+    )
+
+    lengths = contig_lengths(invcf.raw_header)
+    # more regions than cores to balance the loads
+    tiles = split_regions(contigs, lengths, ncores * 4)
+    if targets is not None:
+        groups = intersect_regions(targets, tiles)
+    else:
+        groups = [[tile] for tile in tiles]
+
+if len(groups) > 1:
+    # filter the regions of the indexed file in parallel
+    from multiprocessing import get_context
+    from biopipen.utils.bgzf import concat
+
+    # forked, so that the filters are available in the workers
+    with get_context("fork").Pool(ncores) as pool:
+        parts, summaries = zip(*pool.map(filter_regions, enumerate(groups)))
+    summary = merge_summaries(summaries)
+
+    # the parts are concatenated in order, without recompression
+    if outfile.endswith(".gz"):
+        concat(outfile, parts, invcf.raw_header)
+    else:
+        with open(outfile, "w") as fout:
+            fout.write(invcf.raw_header)
+            for part in parts:
+                with open(part) as fpart:
+                    shutil.copyfileobj(fpart, fout)
+    for part in parts:
+        os.remove(part)
+
 else:
-    outvcf = Writer(outfile, invcf)
+    if outfile.endswith(".gz"):
+        # the cores used to compress the output instead
+        outvcf = BgzfWriter(outfile, threads=ncores)
+        outvcf.write(invcf.raw_header)
+        outvcf.write_record = lambda variant: outvcf.write(str(variant))
+    elif batch:
+        outvcf = open(outfile, "w")
+        outvcf.write(invcf.raw_header)
+    else:
+        outvcf = Writer(outfile, invcf)
 
-for variant in invcf:
-    for name, filt in filters.items():
-        if not filt(variant):
-            if not variant.FILTER:
-                variant.FILTER = name
-            else:
-                variant.FILTER = f"{variant.FILTER};{name}"
-    if variant.FILTER and not keep:
-        continue
-    outvcf.write_record(variant)
+    if batch:
+        # the records are read as text, the header is only taken from cyvcf2
+        # so that it is the same as the variant-by-variant way
+        if targets is None:
+            records = select_samples(iter_records(infile))
+        else:
+            tbx = TabixFile(indexed)
+            records = select_samples(fetch_regions(tbx, targets))
+        filter_records(
+            records,
+            filterset,
+            outvcf.write,
+            samples=invcf.samples,
+            keep=keep,
+            block_size=batch,
+        )
+        if targets is not None:
+            tbx.close()
+    else:
+        variants = (
+            invcf if targets is None else fetch_variants(invcf, targets)
+        )
+        for variant in variants:
+            if apply_filters(variant):
+                outvcf.write_record(variant)
+
+    outvcf.close()
+    summary = filterset.summary()
 
 invcf.close()
-outvcf.close()
+
+# the numbers of the variants passing/failing and the time spent by filter
+with open(statsfile, "w") as fstats:
+    json.dump(summary, fstats, indent=2)
@@ -9,7 +9,7 @@ outidx = {{out.outidx | repr}}
 tabix = {{envs.tabix | repr}}
 ncores = {{envs.ncores | repr}}
 
-outfile_with_index = tabix_index(infile, "vcf", outfile.parent, tabix)
+outfile_with_index = tabix_index(infile, "vcf", path.dirname(outfile), tabix)
 if path.samefile(infile, outfile_with_index):
     cmdy.ln(s=infile, _=outfile)
     cmdy.ln(s=infile + ".tbi", _=outidx)
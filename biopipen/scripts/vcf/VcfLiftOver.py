@@ -0,0 +1,50 @@
+from os import path
+
+from biopipen.utils.command import command_args, run_pipeline, strcmd
+from biopipen.utils.liftover import liftover_vcf
+
+invcf = {{in.invcf | repr}}
+outvcf = {{out.outvcf | repr}}
+rejfile = {{job.outdir | joinpaths: "rejected.vcf" | repr}}
+tool = {{envs.tool | repr}}
+gatk = {{envs.gatk | repr}}
+chain = {{envs.chain | repr}}
+tmpdir = {{envs.tmpdir | repr}}
+reffa = {{envs.reffa | repr}}
+args = {{envs.args | repr}}
+
+if not chain:
+    raise ValueError("No chain file (`envs.chain`) provided.")
+
+if tool == "gatk":
+    refdict = path.splitext(reffa)[0] + ".dict"
+    if not path.exists(refdict):
+        raise FileNotFoundError(
+            f"Sequence dictionary does not exist: {refdict}"
+        )
+
+    # the options of gatk keep the underscores
+    cmd = [
+        *command_args({**args, "_exe": gatk}, "LiftoverVcf"),
+        "--INPUT",
+        invcf,
+        "--OUTPUT",
+        outvcf,
+        "--REJECT",
+        rejfile,
+        "--REFERENCE_SEQUENCE",
+        reffa,
+        "--CHAIN",
+        chain,
+        "--TMP_DIR",
+        tmpdir,
+    ]
+    print("Running:")
+    print("-------")
+    print(strcmd(cmd))
+    run_pipeline([cmd])
+else:
+    nlifted, nrejected = liftover_vcf(
+        invcf, outvcf, rejfile, chain, reffa or None
+    )
+    print(f"Lifted: {nlifted}, rejected: {nrejected}")
@@ -0,0 +1,351 @@
+"""Block gzip (BGZF) compression with multiple threads, and random access
+
+A BGZF file is a series of gzip members (blocks) of at most 64KB of data,
+which are compressed independently. So the blocks are compressed on a
+thread pool (zlib releases the GIL) and written in order.
+
+    with BgzfWriter("out.vcf.gz", threads=4) as fout:
+        fout.write(...)
+
+Or as a drop-in of `bgzip -c` to compress from a pipe:
+
+    ... | python -m biopipen.utils.bgzf -@ 4 > out.vcf.gz
+
+The data is located by virtual offsets (`coffset << 16 | uoffset`, the offset
+of the block in the file and the offset of the data in the block), which are
+used by the tabix/CSI indexes. See `BgzfReader`.
+"""
+import os
+import struct
+import sys
+import zlib
+from argparse import ArgumentParser
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from os import PathLike
+from typing import BinaryIO, Iterable, Iterator, List, Tuple, Union
+
+# The max size of the data in a block, the same as htslib, so that the
+# compressed data always fits in a block
+BLOCK_SIZE = 0xFF00
+# The empty block marking the end of the file
+EOF_BLOCK = bytes.fromhex(
+    "1f8b08040000000000ff0600424302001b0003000000000000000000"
+)
+# ID1 ID2 CM FLG MTIME XFL OS XLEN SI1 SI2 SLEN BSIZE
+_HEADER = struct.Struct("<4BI2BH2BHH")
+_FOOTER = struct.Struct("<II")
+
+
+def compress_block(data: bytes, level: int = 6) -> bytes:
+    """Compress the data into a BGZF block
+
+    Args:
+        data: The data, at most `BLOCK_SIZE` bytes
+        level: The compression level
+
+    Returns:
+        The block
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    header = _HEADER.pack(
+        31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2,
+        # BSIZE: the total block size - 1
+        len(cdata) + _HEADER.size + _FOOTER.size - 1,
+    )
+    return header + cdata + _FOOTER.pack(zlib.crc32(data), len(data))
+
+
+class BgzfWriter:
+    """Write BGZF files with the blocks compressed on a thread pool
+
+    Args:
+        file: The path or the binary file object to write to
+        threads: The number of threads to compress the blocks
+        level: The compression level
+        eof: Whether to write the EOF block when closed. False for the
+            parts to be concatenated (see `concat()`)
+    """
+
+    def __init__(
+        self,
+        file: Union[str, PathLike, BinaryIO],
+        threads: int = 1,
+        level: int = 6,
+        eof: bool = True,
+    ):
+        if isinstance(file, (str, PathLike)):
+            self._handle = open(file, "wb")
+            self._own_handle = True
+        else:
+            self._handle = file
+            self._own_handle = False
+        self.level = level
+        self.eof = eof
+        self._buffer = bytearray()
+        self._pool = ThreadPoolExecutor(threads) if threads > 1 else None
+        self._pending = deque()
+        # bound the memory used by the blocks waiting to be written
+        self._max_pending = threads * 4
+        self.closed = False
+
+    def __enter__(self) -> "BgzfWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _submit(self, block: bytes) -> None:
+        """Compress the block and write it, or queue it to the pool"""
+        if self._pool is None:
+            self._handle.write(compress_block(block, self.level))
+            return
+
+        self._pending.append(
+            self._pool.submit(compress_block, block, self.level)
+        )
+        while len(self._pending) > self._max_pending:
+            self._handle.write(self._pending.popleft().result())
+
+    def write(self, data: Union[bytes, str]) -> int:
+        """Write the data, str encoded by utf-8
+
+        Returns:
+            The length of the data
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        self._buffer += data
+        if len(self._buffer) >= BLOCK_SIZE:
+            buffer = bytes(self._buffer)
+            nfull = len(buffer) // BLOCK_SIZE * BLOCK_SIZE
+            for start in range(0, nfull, BLOCK_SIZE):
+                self._submit(buffer[start:start + BLOCK_SIZE])
+            self._buffer = bytearray(buffer[nfull:])
+        return len(data)
+
+    def writelines(self, lines) -> None:
+        """Write the lines"""
+        for line in lines:
+            self.write(line)
+
+    def flush(self) -> None:
+        """Compress and write all the data written so far"""
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer = bytearray()
+        while self._pending:
+            self._handle.write(self._pending.popleft().result())
+        self._handle.flush()
+
+    def close(self) -> None:
+        """Flush the data and write the EOF block"""
+        if self.closed:
+            return
+        self.flush()
+        if self.eof:
+            self._handle.write(EOF_BLOCK)
+            self._handle.flush()
+        if self._pool is not None:
+            self._pool.shutdown()
+        if self._own_handle:
+            self._handle.close()
+        self.closed = True
+
+
+class BgzfReader:
+    """Read BGZF files by virtual offsets, with an LRU cache of the
+    decompressed blocks
+
+    Args:
+        file: The path to the BGZF file
+        cache_size: The max number of decompressed blocks to cache
+    """
+
+    def __init__(self, file: Union[str, PathLike], cache_size: int = 128):
+        self._handle = open(file, "rb")
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self) -> "BgzfReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the file"""
+        self._handle.close()
+        self._cache.clear()
+
+    def read_block(self, coffset: int) -> Tuple[bytes, int]:
+        """Read and decompress the block at the offset of the file
+
+        Args:
+            coffset: The offset of the block in the file
+
+        Returns:
+            The decompressed data and the offset of the next block.
+            `(b"", coffset)` at the end of the file.
+        """
+        cached = self._cache.get(coffset)
+        if cached is not None:
+            self.hits += 1
+            self._cache.move_to_end(coffset)
+            return cached
+
+        self.misses += 1
+        self._handle.seek(coffset)
+        # ID1 ID2 CM FLG MTIME XFL OS XLEN
+        header = self._handle.read(12)
+        if len(header) < 12:
+            return b"", coffset
+        if header[:2] != b"\x1f\x8b" or not header[3] & 4:
+            raise ValueError(f"Not a BGZF block at offset {coffset}")
+
+        xlen = struct.unpack("<H", header[10:12])[0]
+        extra = self._handle.read(xlen)
+        bsize = None
+        pos = 0
+        # look for the BC subfield
+        while pos + 4 <= xlen:
+            slen = struct.unpack("<H", extra[pos + 2:pos + 4])[0]
+            if extra[pos:pos + 2] == b"BC":
+                bsize = struct.unpack("<H", extra[pos + 4:pos + 6])[0] + 1
+                break
+            pos += 4 + slen
+        if bsize is None:
+            raise ValueError(f"Not a BGZF block at offset {coffset}")
+
+        rest = self._handle.read(bsize - 12 - xlen)
+        out = (zlib.decompress(rest[:-_FOOTER.size], -15), coffset + bsize)
+        self._cache[coffset] = out
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return out
+
+    def iter_lines(self, voffset: int = 0) -> Iterator[Tuple[int, bytes]]:
+        """Iterate over the lines from the virtual offset
+
+        Args:
+            voffset: The virtual offset to start at, which should be the
+                start of a line
+
+        Yields:
+            The virtual offsets of the start of the lines and the lines
+            without the line breaks
+        """
+        coffset, uoffset = voffset >> 16, voffset & 0xFFFF
+        pending = []
+        line_voffset = None
+        while True:
+            data, next_coffset = self.read_block(coffset)
+            if next_coffset == coffset:
+                break
+
+            size = len(data)
+            while uoffset < size:
+                if line_voffset is None:
+                    line_voffset = coffset << 16 | uoffset
+                end = data.find(b"\n", uoffset)
+                if end == -1:
+                    pending.append(data[uoffset:])
+                    break
+                if pending:
+                    pending.append(data[uoffset:end])
+                    yield line_voffset, b"".join(pending)
+                    pending = []
+                else:
+                    yield line_voffset, data[uoffset:end]
+                line_voffset = None
+                uoffset = end + 1
+
+            coffset, uoffset = next_coffset, 0
+
+        if pending:
+            yield line_voffset, b"".join(pending)
+
+
+def concat(
+    outfile: Union[str, PathLike],
+    infiles: Iterable[Union[str, PathLike]],
+    header: Union[bytes, str] = None,
+) -> None:
+    """Concatenate BGZF files without recompressing the blocks
+
+    Args:
+        outfile: The output file
+        infiles: The BGZF files, with or without the EOF blocks
+        header: The data to compress and write before the files
+    """
+    with open(outfile, "wb") as fout:
+        if header:
+            with BgzfWriter(fout, eof=False) as writer:
+                writer.write(header)
+        for infile in infiles:
+            size = os.path.getsize(infile)
+            with open(infile, "rb") as fin:
+                if size >= len(EOF_BLOCK):
+                    fin.seek(size - len(EOF_BLOCK))
+                    if fin.read() == EOF_BLOCK:
+                        size -= len(EOF_BLOCK)
+                    fin.seek(0)
+                while size > 0:
+                    chunk = fin.read(min(size, BLOCK_SIZE * 16))
+                    if not chunk:
+                        break
+                    fout.write(chunk)
+                    size -= len(chunk)
+        fout.write(EOF_BLOCK)
+
+
+def main(argv: List[str] = None) -> int:
+    """Compress a file or stdin to stdout, like `bgzip -c`"""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "infile",
+        nargs="?",
+        help="The file to compress. Default: stdin",
+    )
+    parser.add_argument(
+        "-c",
+        "--stdout",
+        action="store_true",
+        help="Write to stdout (the default, for compatibility with bgzip)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Write to the file instead of stdout",
+    )
+    parser.add_argument(
+        "-@",
+        "--threads",
+        type=int,
+        default=1,
+        help="Number of threads to compress the blocks",
+    )
+    parser.add_argument(
+        "-l",
+        "--compress-level",
+        type=int,
+        default=6,
+        help="The compression level",
+    )
+    args = parser.parse_args(argv)
+
+    fin = open(args.infile, "rb") if args.infile else sys.stdin.buffer
+    fout = args.output or sys.stdout.buffer
+    with BgzfWriter(fout, args.threads, args.compress_level) as writer:
+        for chunk in iter(lambda: fin.read(BLOCK_SIZE * 16), b""):
+            writer.write(chunk)
+    if args.infile:
+        fin.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
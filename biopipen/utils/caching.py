@@ -0,0 +1,133 @@
+"""Helpers for the caches shared by the jobs, across processes and runs"""
+import fcntl
+import hashlib
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Union
+
+CHUNK_SIZE = 1 << 20
+SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def parse_size(size: Union[int, str]) -> int:
+    """Parse the size with units, i.e. `512M`, `50G`, into bytes"""
+    if isinstance(size, int):
+        return size
+    size = str(size).strip().upper().rstrip("B")
+    unit = size[-1:] if size[-1:] in SIZE_UNITS else ""
+    return int(float(size[: len(size) - len(unit)]) * SIZE_UNITS[unit])
+
+
+def atomic_write(path: Path, content: str) -> None:
+    """Write the content to a file atomically"""
+    tmpfile = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmpfile.write_text(content)
+    os.replace(tmpfile, path)
+
+
+def iter_files(path: Path) -> Iterator[Path]:
+    """Iterate over the files in a directory recursively, in order"""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for fname in sorted(files):
+            yield Path(root) / fname
+
+
+@contextmanager
+def file_lock(lockfile: Path, blocking: bool = True) -> Iterator[bool]:
+    """Hold an exclusive lock of the file
+
+    Yields:
+        Whether the lock is acquired, always True when blocking
+    """
+    lockfile.parent.mkdir(parents=True, exist_ok=True)
+    with open(lockfile, "a") as flock:
+        try:
+            fcntl.flock(
+                flock,
+                fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB,
+            )
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(flock, fcntl.LOCK_UN)
+
+
+def file_digest(path: Union[str, Path], memo_dir: Path = None) -> str:
+    """The digest of the content of a file or a directory
+
+    Args:
+        path: The path to the file or the directory
+        memo_dir: The directory to save the digests of the files, keyed by
+            the path, the size and the mtime of the files, so that they are
+            not computed again until the files change
+
+    Returns:
+        The sha256 digest
+    """
+    path = Path(path).resolve()
+    if path.is_dir():
+        digest = hashlib.sha256()
+        for fpath in iter_files(path):
+            digest.update(str(fpath.relative_to(path)).encode())
+            digest.update(file_digest(fpath, memo_dir).encode())
+        return digest.hexdigest()
+
+    memo = None
+    if memo_dir is not None:
+        stat = path.stat()
+        memo = Path(memo_dir) / hashlib.md5(
+            f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+        ).hexdigest()
+        try:
+            return memo.read_text()
+        except OSError:
+            pass
+
+    digest = hashlib.sha256()
+    with path.open("rb") as fin:
+        for chunk in iter(lambda: fin.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    out = digest.hexdigest()
+    if memo is not None:
+        memo.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(memo, out)
+    return out
+
+
+def remove_stale(
+    pattern: str,
+    parent: Path,
+    max_age: float = 86400,
+) -> List[Path]:
+    """Remove the files or directories that are not modified for a while,
+    i.e. left by the jobs that were killed
+
+    Args:
+        pattern: The glob pattern of the files or directories
+        parent: The directory where they are
+        max_age: The age (seconds) to consider them stale
+
+    Returns:
+        The removed paths
+    """
+    removed = []
+    now = time.time()
+    for path in Path(parent).glob(pattern):
+        try:
+            if now - path.lstat().st_mtime < max_age:
+                continue
+            if path.is_dir() and not path.is_symlink():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+        except OSError:
+            continue
+        removed.append(path)
+    return removed
@@ -0,0 +1,159 @@
+"""Build the command lines and run them in pipelines
+
+The arguments are given the same way as to `cmdy` in the scripts:
+
+    >>> args = {"_exe": "bcftools", "_": "in.vcf", "O": "u", "threads": 2}
+    >>> command_args(args, "filter")
+    ['bcftools', 'filter', '-O', 'u', '--threads', '2', 'in.vcf']
+
+So that multiple commands can be chained by pipes, without writing the
+intermediate files:
+
+    >>> run_pipeline([cmd1, cmd2, cmd3])
+
+Or run by regions in parallel, with the outputs concatenated by
+`bcftools concat` (see `bcftools_scatter`).
+"""
+import shlex
+import shutil
+import signal
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, List, Mapping, Sequence
+
+from ..core.filters import compose_cli_args
+
+
+def command_args(args: Mapping[str, Any], *subcommands: str) -> List[str]:
+    """Convert the arguments to a command line, the same way as `cmdy`
+
+    Args:
+        args: The arguments. `_exe` is the executable, and the others are
+            composed by `biopipen.core.filters.compose_cli_args()`, i.e.
+            `_` for the positional argument(s), underscores in the keys
+            replaced with dashes, lists as multiple values of an option
+            (unless `_dupkey` is True), `True` values as flags, and `False`
+            ones ignored.
+        *subcommands: The subcommands after the executable
+
+    Returns:
+        The command line as a list
+    """
+    arguments = dict(args)
+    exe = arguments.pop("_exe")
+    return [str(exe), *subcommands, *compose_cli_args(arguments)]
+
+
+def strcmd(cmd: Sequence[str]) -> str:
+    """The command line as a string, quoted for the shell"""
+    return " ".join(shlex.quote(str(arg)) for arg in cmd)
+
+
+def run_pipeline(cmds: Sequence[Sequence[str]], stdout: Any = None) -> None:
+    """Run the commands with the stdout of each piped to the next one
+
+    Args:
+        cmds: The commands, as lists
+        stdout: The stdout of the last command (a file object). Defaults to
+            the stdout of the current process.
+
+    Raises:
+        subprocess.CalledProcessError: When any of the commands fails.
+            The one failing first in the pipeline is reported, not the
+            ones upstream killed by the broken pipe.
+    """
+    procs = []
+    stdin = None
+    for i, cmd in enumerate(cmds):
+        proc = subprocess.Popen(
+            cmd,
+            stdin=stdin,
+            stdout=stdout if i == len(cmds) - 1 else subprocess.PIPE,
+        )
+        if stdin is not None:
+            # owned by the next command now, so that the previous one gets
+            # SIGPIPE if it exits early
+            stdin.close()
+        stdin = proc.stdout
+        procs.append(proc)
+
+    for proc in procs:
+        proc.wait()
+
+    failed = [
+        (proc, cmd) for proc, cmd in zip(procs, cmds) if proc.returncode != 0
+    ]
+    if failed:
+        # prefer the one not killed by the broken pipe
+        proc, cmd = next(
+            (
+                (proc, cmd)
+                for proc, cmd in failed
+                if proc.returncode != -signal.SIGPIPE
+            ),
+            failed[0],
+        )
+        raise subprocess.CalledProcessError(proc.returncode, strcmd(cmd))
+
+
+def bcftools_scatter(
+    region_cmds: Callable[[str, str, str], Sequence[Sequence[str]]],
+    regions: Sequence[str],
+    outfile: str,
+    output_type: str = "z",
+    bcftools: str = "bcftools",
+    ncores: int = 1,
+    no_version: bool = False,
+) -> None:
+    """Run the bcftools commands by regions in parallel, and concatenate
+    the outputs in order
+
+    The outputs of the regions are in the same compressed format as the
+    output file, so that they are concatenated by `bcftools concat --naive`
+    without recompression. For uncompressed output, they are uncompressed
+    BCF and converted by `bcftools concat`.
+
+    Args:
+        region_cmds: A function taking the region, the output file and the
+            output type (`-O`) for the region, and returning the commands
+            (chained by pipes) to write the output of the region.
+            The records should be included only if their POS is in the
+            region (`--regions-overlap 0`), so that the records spanning
+            the regions are not duplicated.
+        regions: The regions in bcftools format, in the order of the file
+        outfile: The output file
+        output_type: The output type (`-O`) of the output file
+        bcftools: Path to bcftools
+        ncores: Number of regions to run at the same time
+        no_version: Do not add the `bcftools_concat` command to the header
+    """
+    output_type = str(output_type)
+    naive = output_type[0] in "bz"
+    part_type = output_type if naive else "u"
+    ext = ".vcf.gz" if part_type[0] == "z" else ".bcf"
+    partdir = tempfile.mkdtemp(
+        prefix=f".{Path(outfile).name}.parts.",
+        dir=Path(outfile).parent,
+    )
+
+    def run_region(item):
+        index, region = item
+        partfile = str(Path(partdir) / f"part{index}{ext}")
+        run_pipeline(region_cmds(region, partfile, part_type))
+        return partfile
+
+    try:
+        with ThreadPoolExecutor(ncores) as pool:
+            parts = list(pool.map(run_region, enumerate(regions)))
+
+        cmd = [bcftools, "concat", "-o", str(outfile)]
+        cmd.extend(["--naive"] if naive else ["-O", output_type])
+        if no_version:
+            cmd.append("--no-version")
+        cmd.extend(parts)
+        print("Concatenating:", strcmd(cmd[:-len(parts)]), "<parts>")
+        subprocess.run(cmd, check=True)
+    finally:
+        shutil.rmtree(partdir, ignore_errors=True)
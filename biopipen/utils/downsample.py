@@ -0,0 +1,157 @@
+"""Down-sample the records of a file in one pass, keeping their order
+
+- With the number of the records known (i.e. from the index of a VCF
+  file), the indexes of the records to select are drawn first, and the
+  records in between are skipped without being held in memory.
+- Otherwise, a number of records is sampled by a reservoir (Li's algorithm
+  L), which holds only the sampled records, and a fraction of them is
+  sampled by the geometric skips between the kept records (so the number
+  is approximate).
+
+The records are skipped by `itertools.islice`, without looking at them
+in python.
+"""
+import math
+import random
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+
+def _uniform(rng: random.Random) -> float:
+    """A random number in (0, 1), so that its log is defined"""
+    while True:
+        value = rng.random()
+        if value > 0:
+            return value
+
+
+def _skip(records: Iterator[T], n: int) -> T:
+    """Skip n records and return the next one (None if exhausted)"""
+    return next(islice(records, n, None), None)
+
+
+def selection_sample(
+    records: Iterable[T],
+    k: int,
+    total: int,
+    rng: random.Random,
+) -> Iterator[T]:
+    """Select k of the total records, in order
+
+    Args:
+        records: The records
+        k: The number of records to select
+        total: The number of the records
+        rng: The random number generator
+
+    Yields:
+        The selected records
+    """
+    records = iter(records)
+    last = -1
+    for index in sorted(rng.sample(range(total), min(k, total))):
+        record = _skip(records, index - last - 1)
+        if record is None:
+            return
+        yield record
+        last = index
+
+
+def reservoir_sample(
+    records: Iterable[T],
+    k: int,
+    rng: random.Random,
+) -> List[T]:
+    """Sample k records by a reservoir
+
+    Args:
+        records: The records
+        k: The number of records to sample
+        rng: The random number generator
+
+    Returns:
+        The sampled records, in their original order
+    """
+    if k <= 0:
+        return []
+    records = iter(records)
+    # the indexes, so that the records are put back in order
+    reservoir = list(enumerate(islice(records, k)))
+    if len(reservoir) < k:
+        return [record for _, record in reservoir]
+
+    index = k - 1
+    weight = math.exp(math.log(_uniform(rng)) / k)
+    while True:
+        skip = int(math.log(_uniform(rng)) / math.log(1.0 - weight))
+        record = _skip(records, skip)
+        if record is None:
+            break
+        index += skip + 1
+        reservoir[rng.randrange(k)] = (index, record)
+        weight *= math.exp(math.log(_uniform(rng)) / k)
+
+    reservoir.sort(key=lambda item: item[0])
+    return [record for _, record in reservoir]
+
+
+def bernoulli_sample(
+    records: Iterable[T],
+    fraction: float,
+    rng: random.Random,
+) -> Iterator[T]:
+    """Keep each record with the probability of the fraction
+
+    Args:
+        records: The records
+        fraction: The probability to keep a record
+        rng: The random number generator
+
+    Yields:
+        The kept records
+    """
+    if fraction <= 0:
+        return
+    records = iter(records)
+    if fraction >= 1:
+        yield from records
+        return
+
+    log_q = math.log(1.0 - fraction)
+    while True:
+        # the number of records skipped before the next kept one
+        record = _skip(records, int(math.log(_uniform(rng)) / log_q))
+        if record is None:
+            return
+        yield record
+
+
+def downsample(
+    records: Iterable[T],
+    n: float,
+    total: int = None,
+    seed: int = None,
+) -> Iterable[T]:
+    """Down-sample the records, keeping their order
+
+    Args:
+        records: The records
+        n: The number of records (`n > 1`) or the fraction (`n <= 1`)
+            to keep
+        total: The number of the records if known
+        seed: The seed for the random number generator
+
+    Returns:
+        The sampled records
+    """
+    rng = random.Random(seed)
+    if n > 1:
+        if total is not None:
+            return selection_sample(records, int(n), total, rng)
+        return reservoir_sample(records, int(n), rng)
+
+    if total is not None:
+        return selection_sample(records, round(total * n), total, rng)
+    return bernoulli_sample(records, n, rng)
@@ -1,24 +1,62 @@
 """Do gene name conversion"""
-from mygene import MyGeneInfo
-from datar.all import (
-    c,
-    f,
-    group_by,
-    desc,
-    arrange,
-    slice_head,
-    tibble,
-    left_join,
-    mutate,
-    is_na,
-    across,
-    if_else,
-    filter,
-    pull,
-    select,
-)
-
-mygene = MyGeneInfo()
+from functools import lru_cache
+
+
+@lru_cache()
+def get_mygene():
+    """Get the MyGeneInfo client, mygene is only loaded when needed"""
+    from mygene import MyGeneInfo
+
+    return MyGeneInfo()
+
+
+def __getattr__(name):
+    """Keep `mygene` of the module, the client created when accessed"""
+    if name == "mygene":
+        return get_mygene()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_gene_client(store=None):
+    """Get the client to query the genes
+
+    Args:
+        store: The offline gene store (see `biopipen.utils.gene_store`).
+            If not given, use MyGeneInfo
+
+    Returns:
+        The gene store or the MyGeneInfo client
+    """
+    if store:
+        from .gene_store import get_gene_store
+
+        return get_gene_store(store)
+    return get_mygene()
+
+
+def get_gene_cache(cache=None):
+    """Get the persistent cache of the gene queries to MyGeneInfo
+
+    Args:
+        cache: The directory of the cache, or False to disable it.
+            If not given, use `config.gene_cache`
+
+    Returns:
+        The cache, or None if disabled
+    """
+    from ..core.config import config
+    from ..core.defaults import CACHE_DIR
+    from .gene_cache import GeneQueryCache
+
+    if cache is False or (cache is None and not config.gene_cache.enabled):
+        return None
+
+    cache = cache or config.gene_cache.dir or CACHE_DIR / "genes"
+    return GeneQueryCache(
+        cache,
+        ttl=config.gene_cache.ttl or 30,
+        max_size=config.gene_cache.max_size or "1G",
+    )
 
 
 class QueryGenesNotFound(Exception):
@@ -31,8 +69,10 @@ def gene_name_conversion(
     infmt,
     outfmt,
     notfound,
+    store=None,
+    cache=None,
 ):
-    """Convert gene names using MyGeneInfo
+    """Convert gene names using MyGeneInfo or an offline gene store
 
     Args:
         genes: A sequence of genes
@@ -48,12 +88,36 @@ def gene_name_conversion(
             use-query: Ignore the conversion and use the original name
             skip: Ignore the conversion and skip the entire row in input file
             error: Report error
+        store: The offline gene store built by
+            `python -m biopipen.utils.gene_store build`.
+            If not given, query MyGeneInfo
+        cache: The directory of the persistent cache of the queries to
+            MyGeneInfo, or False to disable it. Default: `config.gene_cache`
 
     Returns:
         A dataframe with two columns, query and `outfmt`.
     """
-    out = (
-        mygene.querymany(
+    from datar.all import (
+        c,
+        f,
+        group_by,
+        desc,
+        arrange,
+        slice_head,
+        tibble,
+        left_join,
+        mutate,
+        is_na,
+        across,
+        if_else,
+        filter,
+        pull,
+        select,
+    )
+
+    if store:
+        # the gene store is local, no need to cache
+        hits = get_gene_client(store).querymany(
             genes,
             scopes=infmt,
             fields=outfmt,
@@ -61,6 +125,20 @@ def gene_name_conversion(
             df_index=False,
             species=species,
         )
+    else:
+        from .gene_cache import cached_querymany
+
+        hits = cached_querymany(
+            get_mygene(),
+            genes,
+            scopes=infmt,
+            fields=outfmt,
+            species=species,
+            cache=get_gene_cache(cache),
+        )
+
+    out = (
+        hits
         >> group_by(f.query)
         >> arrange(desc(f._score))
         >> slice_head(1)
@@ -84,3 +162,53 @@ def gene_name_conversion(
         out = out >> filter(~is_na(f[outfmt[0]]))
 
     return out
+
+
+def apply_gene_conversion(df, genecol, converted, output):
+    """Add the converted gene names to a data frame by a vectorized map,
+    so that a large table can be converted chunk by chunk
+
+    Args:
+        df: The data frame (or a chunk of it)
+        genecol: The index (0-based) or name of the column of the genes
+        converted: The converted names indexed by the unique queries,
+            i.e. the result of `gene_name_conversion()` with the query column
+            set as index. The rows with genes not in the index are dropped.
+        output: How to output, keep, drop, replace or only.
+            See `GeneNameConversion` of `biopipen.namespaces.gene`
+
+    Returns:
+        The data frame with the converted names
+    """
+    import pandas
+
+    genes = df.iloc[:, genecol] if isinstance(genecol, int) else df[genecol]
+    colname = genes.name
+    queries = genes.astype(str)
+    kept = queries.isin(converted.index).to_numpy()
+    if not kept.all():
+        df = df.loc[kept]
+        genes = genes[kept]
+        queries = queries[kept]
+
+    names = converted.reindex(queries.to_numpy())
+    names.index = df.index
+    if output == "only":
+        return pandas.concat([genes.to_frame(), names], axis=1)
+
+    names.columns = [
+        f"{col}_converted" if col in df.columns else col
+        for col in names.columns
+    ]
+    if output == "keep":
+        return pandas.concat([df, names], axis=1)
+    if output == "drop":
+        return pandas.concat([df.drop(columns=colname), names], axis=1)
+    if output == "replace":
+        pos = df.columns.get_loc(colname)
+        return pandas.concat(
+            [df.iloc[:, :pos], names, df.iloc[:, pos + 1:]],
+            axis=1,
+        )
+
+    raise ValueError(f"Unknown output mode: {output}.")
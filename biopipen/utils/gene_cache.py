@@ -0,0 +1,268 @@
+"""Persistent cache of the gene queries to MyGeneInfo
+
+The hits of each query are saved in a SQLite database in the cache directory
+(`config.gene_cache.dir`, defaults to `<BIOPIPEN_CACHE_DIR>/genes`), keyed
+by the species, the scopes and the fields of the query, so that the same
+genes converted by different jobs or runs are only queried once.
+
+The entries expire after `config.gene_cache.ttl` days, and the least
+recently used ones are removed once the cache exceeds
+`config.gene_cache.max_size`.
+
+    cache = GeneQueryCache("~/.cache/biopipen/genes")
+    out = cached_querymany(get_mygene(), genes, "symbol", "entrezgene",
+                           species="human", cache=cache)
+"""
+import hashlib
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Iterable, List, Mapping, Union
+
+from .caching import parse_size
+
+DB_FILE = "queries.db"
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hits (
+    key TEXT NOT NULL,
+    query TEXT NOT NULL,
+    hits TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    atime REAL NOT NULL,
+    PRIMARY KEY (key, query)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS hits_atime ON hits (atime);
+"""
+# The max number of variables in a SQLite statement is 999 before 3.32
+SQL_CHUNK_SIZE = 900
+
+
+def _split(value: Union[str, Iterable[str]]) -> List[str]:
+    """Split the comma-separated scopes or fields"""
+    if isinstance(value, str):
+        value = value.split(",")
+    return [val.strip() for val in value if val.strip()]
+
+
+def query_key(
+    species: Any,
+    scopes: Union[str, List[str]],
+    fields: Union[str, List[str]],
+) -> str:
+    """The key of the queries with the species, scopes and fields"""
+    if isinstance(species, (list, tuple)):
+        species = sorted(str(sp) for sp in species)
+    key = [species, sorted(_split(scopes)), sorted(_split(fields))]
+    return hashlib.md5(json.dumps(key, default=str).encode()).hexdigest()
+
+
+class GeneQueryCache:
+    """The persistent cache of the hits of gene queries
+
+    Args:
+        cache_dir: The directory of the cache
+        ttl: The days for the entries to expire
+        max_size: The max size of the cache, in bytes or with units
+    """
+
+    def __init__(
+        self,
+        cache_dir: Union[str, Path],
+        ttl: float = 30,
+        max_size: Union[int, str] = "1G",
+    ):
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = float(ttl) * 86400
+        self.max_size = parse_size(max_size)
+        # wait for the other jobs writing the cache
+        self.con = sqlite3.connect(
+            self.cache_dir / DB_FILE,
+            timeout=60,
+            check_same_thread=False,
+        )
+        self.con.executescript(SCHEMA)
+
+    def get(self, key: str, queries: List[str]) -> Mapping[str, List[dict]]:
+        """Get the cached hits of the queries
+
+        Args:
+            key: The key of the queries, see `query_key()`
+            queries: The queries
+
+        Returns:
+            The hits of the queries found and not expired
+        """
+        now = time.time()
+        out = {}
+        for start in range(0, len(queries), SQL_CHUNK_SIZE):
+            chunk = queries[start:start + SQL_CHUNK_SIZE]
+            rows = self.con.execute(
+                "SELECT query, hits FROM hits WHERE key = ? AND mtime > ? "
+                f"AND query IN ({', '.join('?' * len(chunk))})",
+                [key, now - self.ttl, *chunk],
+            )
+            for query, hits in rows:
+                out[query] = json.loads(hits)
+
+        if out:
+            with self.con:
+                self.con.executemany(
+                    "UPDATE hits SET atime = ? WHERE key = ? AND query = ?",
+                    ((now, key, query) for query in out),
+                )
+        return out
+
+    def put(self, key: str, hits: Mapping[str, List[dict]]) -> None:
+        """Save the hits of the queries and evict the cache
+
+        Args:
+            key: The key of the queries, see `query_key()`
+            hits: The hits of the queries
+        """
+        now = time.time()
+        rows = []
+        for query, query_hits in hits.items():
+            dumped = json.dumps(query_hits)
+            rows.append((key, query, dumped, len(dumped), now, now))
+        with self.con:
+            self.con.executemany(
+                "INSERT OR REPLACE INTO hits VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        self.evict()
+
+    def evict(self) -> int:
+        """Remove the expired entries and the least recently used ones
+        when the cache exceeds the max size
+
+        Returns:
+            The number of entries removed
+        """
+        with self.con:
+            removed = self.con.execute(
+                "DELETE FROM hits WHERE mtime <= ?",
+                (time.time() - self.ttl,),
+            ).rowcount
+            total = self.con.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM hits"
+            ).fetchone()[0]
+            if total <= self.max_size:
+                return removed
+
+            # remove down to 90% of the max size, so that it is not evicted
+            # every time a query is added
+            excess = total - self.max_size * 0.9
+            nrows = 0
+            for (size,) in self.con.execute(
+                "SELECT size FROM hits ORDER BY atime"
+            ):
+                excess -= size
+                nrows += 1
+                if excess <= 0:
+                    break
+            removed += self.con.execute(
+                "DELETE FROM hits WHERE (key, query) IN ("
+                "SELECT key, query FROM hits ORDER BY atime LIMIT ?)",
+                (nrows,),
+            ).rowcount
+        return removed
+
+    def close(self) -> None:
+        """Close the database"""
+        self.con.close()
+
+
+def cached_querymany(
+    client: Any,
+    genes: Iterable[Any],
+    scopes: Union[str, List[str]],
+    fields: Union[str, List[str]],
+    species: Any = None,
+    cache: GeneQueryCache = None,
+    chunk_size: int = 1000,
+    nthreads: int = 4,
+    as_dataframe: bool = True,
+    df_index: bool = False,
+):
+    """Query the genes like `MyGeneInfo.querymany()`, but with the unique
+    genes only, the cached hits reused, and the others queried by chunks
+    concurrently
+
+    Args:
+        client: The client to query the genes, i.e. `MyGeneInfo()`
+        genes: The genes to query
+        scopes: The fields to match the genes
+        fields: The fields to return
+        species: The species to limit the query
+        cache: The cache of the queries. `None` to not cache the queries
+        chunk_size: The number of genes to query in one request
+        nthreads: The max number of concurrent requests
+        as_dataframe: Return a pandas DataFrame, otherwise a list of dicts
+        df_index: Use the queries as the index of the data frame
+
+    Returns:
+        The hits, the same as `MyGeneInfo.querymany()`
+    """
+    queries = list(dict.fromkeys(str(gene) for gene in genes))
+    key = query_key(species, scopes, fields)
+    hits = {}
+    if cache is not None:
+        try:
+            hits = cache.get(key, queries)
+        except sqlite3.Error:
+            # the cache is only an optimization
+            pass
+    missing = [query for query in queries if query not in hits]
+
+    def _query(chunk: List[str]) -> List[dict]:
+        return client.querymany(
+            chunk,
+            scopes=scopes,
+            fields=fields,
+            species=species,
+            as_dataframe=False,
+            verbose=False,
+        )
+
+    chunks = [
+        missing[start:start + chunk_size]
+        for start in range(0, len(missing), chunk_size)
+    ]
+    queried = {}
+    if len(chunks) > 1 and nthreads > 1:
+        with ThreadPoolExecutor(min(nthreads, len(chunks))) as pool:
+            results = list(pool.map(_query, chunks))
+    else:
+        results = [_query(chunk) for chunk in chunks]
+    for result in results:
+        for hit in result:
+            queried.setdefault(str(hit["query"]), []).append(hit)
+    for query in missing:
+        queried.setdefault(query, [{"query": query, "notfound": True}])
+
+    if cache is not None and queried:
+        try:
+            cache.put(key, queried)
+        except sqlite3.Error:
+            pass
+    hits.update(queried)
+
+    out = [hit for query in queries for hit in hits[query]]
+    if not as_dataframe:
+        return out
+
+    from pandas import json_normalize
+
+    df = json_normalize(out)
+    # the columns used by gene_name_conversion(), even when all genes
+    # are (not) found
+    for col in ("_id", "_score", "notfound", *_split(fields)):
+        if col not in df.columns:
+            df[col] = float("nan") if col == "notfound" else None
+    if df_index:
+        df = df.set_index("query")
+    return df
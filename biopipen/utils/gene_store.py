@@ -0,0 +1,493 @@
+"""An offline, indexed gene ID store to convert gene names without MyGeneInfo
+
+The store is a SQLite database built once from NCBI `gene_info`, GTF and/or
+alias files:
+
+    python -m biopipen.utils.gene_store build genes.db \\
+        --gene-info Homo_sapiens.gene_info.gz \\
+        --gtf gencode.v38.annotation.gtf.gz --taxid 9606 \\
+        --alias aliases.txt
+
+and then used by `gene_name_conversion(..., store="genes.db")` (or
+`envs.genestore` of `GeneNameConversion`, defaults to `config.ref.genestore`)
+instead of querying MyGeneInfo over the network.
+
+The fields follow MyGeneInfo: `symbol`, `entrezgene`, `ensembl.gene`, `alias`,
+`name` and the database cross references of `gene_info`
+(i.e. `HGNC`, `MIM`). The values are matched case-insensitively. When a query
+matches multiple genes, the matches are scored like `_score` of MyGeneInfo:
+by the field matched, protein-coding genes and exact-case matches first.
+"""
+import gzip
+import os
+import sqlite3
+import sys
+import threading
+from argparse import ArgumentParser
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Mapping, Tuple, Union
+
+# The species supported by MyGeneInfo
+SPECIES_TAXIDS = {
+    "human": 9606,
+    "mouse": 10090,
+    "rat": 10116,
+    "fruitfly": 7227,
+    "nematode": 6239,
+    "zebrafish": 7955,
+    "thale-cress": 3702,
+    "frog": 8364,
+    "pig": 9823,
+}
+# The scores of the matches by the fields
+FIELD_SCORES = {
+    "symbol": 10.0,
+    "entrezgene": 10.0,
+    "ensembl.gene": 10.0,
+    "alias": 5.0,
+    "name": 2.0,
+}
+DEFAULT_FIELD_SCORE = 5.0
+# The gids of the genes only in GTF files, after the NCBI gene IDs
+GTF_GID_START = 10_000_000_000
+
+SCHEMA = """
+CREATE TABLE genes (
+    gid INTEGER PRIMARY KEY,
+    taxid INTEGER NOT NULL,
+    type TEXT
+);
+CREATE TABLE ids (
+    gid INTEGER NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL COLLATE NOCASE,
+    rank INTEGER NOT NULL
+);
+"""
+INDEXES = """
+CREATE INDEX ids_value ON ids (value, field);
+CREATE INDEX ids_gid ON ids (gid, field, rank);
+"""
+
+
+def _open(path: Union[str, Path]):
+    """Open a text file, gzipped or not"""
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt")
+    return open(path)
+
+
+def _split(value: Union[str, Iterable[str]]) -> List[str]:
+    """Split the comma-separated fields"""
+    if isinstance(value, str):
+        value = value.split(",")
+    return [val.strip() for val in value if val.strip()]
+
+
+def _taxid(species: Union[str, int]) -> int:
+    """Get the taxonomy id of the species"""
+    if isinstance(species, int) or str(species).isdigit():
+        return int(species)
+    try:
+        return SPECIES_TAXIDS[species]
+    except KeyError:
+        raise ValueError(
+            f"Unknown species: {species}, "
+            f"expecting a taxonomy ID or one of {list(SPECIES_TAXIDS)}"
+        ) from None
+
+
+def parse_gene_info(
+    path: Union[str, Path],
+) -> Iterator[Tuple[int, int, str, Mapping[str, List[str]]]]:
+    """Parse the NCBI gene_info file
+
+    Yields:
+        The gene ID, taxonomy ID, type of gene and the IDs of the gene
+        (field => values)
+    """
+    with _open(path) as fin:
+        for line in fin:
+            if line.startswith("#"):
+                continue
+            items = line.rstrip("\n").split("\t")
+            taxid, geneid, symbol, _, synonyms, xrefs = items[:6]
+            ids = {
+                "entrezgene": [geneid],
+                "symbol": [symbol],
+                "alias": [] if synonyms == "-" else synonyms.split("|"),
+                "name": [] if items[8] == "-" else [items[8]],
+            }
+            if len(items) > 10 and items[10] not in ("-", symbol):
+                ids["symbol"].append(items[10])
+            if xrefs != "-":
+                for xref in xrefs.split("|"):
+                    db, _, value = xref.partition(":")
+                    field = "ensembl.gene" if db == "Ensembl" else db
+                    ids.setdefault(field, []).append(value)
+            yield int(geneid), int(taxid), items[9], ids
+
+
+def parse_gtf(
+    path: Union[str, Path],
+) -> Iterator[Tuple[str, str, Mapping[str, List[str]]]]:
+    """Parse the genes in a GTF file
+
+    Yields:
+        The Ensembl gene ID (without version), type of gene and the IDs
+        of the gene (field => values)
+    """
+    with _open(path) as fin:
+        for line in fin:
+            if line.startswith("#"):
+                continue
+            items = line.rstrip("\n").split("\t")
+            if len(items) < 9 or items[2] != "gene":
+                continue
+            attrs = {}
+            for attr in items[8].split(";"):
+                key, _, value = attr.strip().partition(" ")
+                if key and key not in attrs:
+                    attrs[key] = value.strip('"')
+            gene_id = attrs.get("gene_id", "").split(".")[0]
+            if not gene_id:
+                continue
+            ids = {"ensembl.gene": [gene_id]}
+            if attrs.get("gene_name"):
+                ids["symbol"] = [attrs["gene_name"]]
+            gene_type = attrs.get("gene_type", attrs.get("gene_biotype"))
+            yield gene_id, gene_type, ids
+
+
+def build(
+    dbfile: Union[str, Path],
+    gene_info: Iterable[Union[str, Path]] = (),
+    gtf: Iterable[Union[str, Path]] = (),
+    taxid: Union[str, int] = None,
+    alias: Iterable[Union[str, Path]] = (),
+) -> Path:
+    """Build the gene store
+
+    Args:
+        dbfile: The path to the database file
+        gene_info: The NCBI gene_info files, with the genes of any species
+        gtf: The GTF files, the genes are merged to those from gene_info
+            by Ensembl gene IDs
+        taxid: The taxonomy ID or species of the genes in the GTF and
+            alias files
+        alias: Two-column files (tab-delimited) with genes (by symbol,
+            entrezgene or ensembl.gene) and their aliases
+
+    Returns:
+        The path to the database file
+    """
+    dbfile = Path(dbfile)
+    tmpfile = dbfile.with_name(f"{dbfile.name}.{os.getpid()}.tmp")
+    if tmpfile.exists():
+        tmpfile.unlink()
+    if (gtf or alias) and taxid is None:
+        raise ValueError("`taxid` is required for GTF and alias files.")
+
+    con = sqlite3.connect(tmpfile)
+    con.executescript(SCHEMA)
+    con.execute("PRAGMA journal_mode = OFF")
+    con.execute("PRAGMA synchronous = OFF")
+
+    # Ensembl gene ID => gid, to merge the genes from the GTF files
+    ensembl_gids = {}
+    for infile in gene_info:
+        for gid, tid, gene_type, ids in parse_gene_info(infile):
+            con.execute(
+                "INSERT INTO genes VALUES (?, ?, ?)",
+                (gid, tid, gene_type),
+            )
+            _insert_ids(con, gid, ids)
+            for ens in ids.get("ensembl.gene", ()):
+                ensembl_gids.setdefault(ens, gid)
+
+    if gtf or alias:
+        taxid = _taxid(taxid)
+    next_gid = GTF_GID_START
+    for infile in gtf:
+        for gene_id, gene_type, ids in parse_gtf(infile):
+            gid = ensembl_gids.get(gene_id)
+            if gid is None:
+                gid = ensembl_gids[gene_id] = next_gid
+                next_gid += 1
+                con.execute(
+                    "INSERT INTO genes VALUES (?, ?, ?)",
+                    (gid, taxid, gene_type),
+                )
+                _insert_ids(con, gid, ids)
+            else:
+                # only the symbols not from gene_info
+                _insert_ids(con, gid, {"alias": ids.get("symbol", [])})
+
+    # the aliases are matched to the genes by the index
+    con.executescript(INDEXES)
+    for infile in alias:
+        with _open(infile) as fin:
+            for line in fin:
+                gene, _, gene_alias = line.rstrip("\n").partition("\t")
+                if not gene_alias or line.startswith("#"):
+                    continue
+                for (gid,) in con.execute(
+                    "SELECT DISTINCT i.gid FROM ids i "
+                    "JOIN genes g ON g.gid = i.gid "
+                    "WHERE i.value = ? AND g.taxid = ? "
+                    "AND i.field IN ('symbol', 'entrezgene', 'ensembl.gene')",
+                    (gene, taxid),
+                ).fetchall():
+                    _insert_ids(con, gid, {"alias": [gene_alias]})
+
+    con.commit()
+    con.execute("VACUUM")
+    con.close()
+    os.replace(tmpfile, dbfile)
+    return dbfile
+
+
+def _insert_ids(
+    con: sqlite3.Connection,
+    gid: int,
+    ids: Mapping[str, List[str]],
+) -> None:
+    """Insert the IDs of a gene"""
+    con.executemany(
+        "INSERT INTO ids VALUES (?, ?, ?, ?)",
+        (
+            (gid, field, value, rank)
+            for field, values in ids.items()
+            for rank, value in enumerate(values)
+        ),
+    )
+
+
+class GeneStore:
+    """Query the gene store, with the same interface as `querymany` of
+    `mygene.MyGeneInfo`, so that it can be used in place of it
+
+    The store could be shared by threads (see `get_gene_store()`), the
+    queries on the connection are serialized, as they use the same temporary
+    tables.
+
+    Args:
+        dbfile: The path to the database file built by `build()`
+    """
+
+    def __init__(self, dbfile: Union[str, Path]):
+        dbfile = Path(dbfile).expanduser().resolve()
+        if not dbfile.is_file():
+            raise FileNotFoundError(f"Gene store not found: {dbfile}")
+        self.con = sqlite3.connect(
+            f"{dbfile.as_uri()}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+        )
+        self.con.execute("PRAGMA temp_store = MEMORY")
+        self._lock = threading.Lock()
+
+    def _query(
+        self,
+        genes: List[str],
+        scopes: List[str],
+        species: Union[str, int, List[Union[str, int]]],
+    ) -> List[Tuple[str, int, str, str, str]]:
+        """Get the matched genes by the queries
+
+        Returns:
+            The queries, gids, fields, values and types of the matched genes
+        """
+        sql = (
+            "SELECT q.value, i.gid, i.field, i.value, g.type "
+            "FROM temp.queries q "
+            "JOIN ids i ON i.value = q.value "
+            f"AND i.field IN ({', '.join('?' * len(scopes))}) "
+            "JOIN genes g ON g.gid = i.gid"
+        )
+        params = list(scopes)
+        if species:
+            if isinstance(species, (str, int)):
+                species = _split(str(species))
+            taxids = [_taxid(sp) for sp in species]
+            sql += f" WHERE g.taxid IN ({', '.join('?' * len(taxids))})"
+            params.extend(taxids)
+
+        con = self.con
+        with self._lock:
+            con.execute("DROP TABLE IF EXISTS temp.queries")
+            con.execute("CREATE TEMP TABLE queries (value TEXT COLLATE NOCASE)")
+            con.executemany(
+                "INSERT INTO temp.queries VALUES (?)",
+                ((gene,) for gene in genes),
+            )
+            return con.execute(sql, params).fetchall()
+
+    def _fields(
+        self,
+        gids: Iterable[int],
+        fields: List[str],
+    ) -> Mapping[int, Mapping[str, str]]:
+        """Get the fields (first values) of the genes"""
+        con = self.con
+        with self._lock:
+            con.execute("DROP TABLE IF EXISTS temp.gids")
+            con.execute("CREATE TEMP TABLE gids (gid INTEGER PRIMARY KEY)")
+            con.executemany(
+                "INSERT INTO temp.gids VALUES (?)",
+                ((gid,) for gid in gids),
+            )
+            out = {}
+            for gid, field, value in con.execute(
+                "SELECT i.gid, i.field, i.value FROM temp.gids m "
+                "JOIN ids i ON i.gid = m.gid "
+                f"AND i.field IN ({', '.join('?' * len(fields))}) "
+                "ORDER BY i.rank DESC",
+                fields,
+            ):
+                # the first value (rank 0) overrides the others
+                out.setdefault(gid, {})[field] = value
+        return out
+
+    def querymany(
+        self,
+        genes: Iterable[Any],
+        scopes: Union[str, List[str]],
+        fields: Union[str, List[str]],
+        species: Union[str, int, List[Union[str, int]]] = None,
+        as_dataframe: bool = True,
+        df_index: bool = False,
+        **kwargs: Any,
+    ):
+        """Query the genes like `MyGeneInfo.querymany()`
+
+        Args:
+            genes: The genes to query
+            scopes: The fields to match the genes
+            fields: The fields to return
+            species: The species to limit the query
+            as_dataframe: Return a pandas DataFrame, otherwise a list of dicts
+            df_index: Use the queries as the index of the data frame
+            **kwargs: Other arguments of `MyGeneInfo.querymany()`, ignored
+
+        Returns:
+            The matches, with `query`, `_id`, `_score` and the `fields`.
+            The queries without matches are with `notfound` True.
+        """
+        queries = list(dict.fromkeys(str(gene) for gene in genes))
+        scopes = _split(scopes)
+        fields = _split(fields)
+        matches = {}
+        for query, gid, field, value, gene_type in self._query(
+            queries, scopes, species
+        ):
+            score = FIELD_SCORES.get(field, DEFAULT_FIELD_SCORE)
+            if gene_type == "protein-coding" or gene_type == "protein_coding":
+                score += 1.0
+            if value == query:
+                score += 0.5
+            key = (query, gid)
+            matches[key] = max(matches.get(key, 0.0), score)
+
+        gene_fields = self._fields(
+            {gid for _, gid in matches},
+            list(dict.fromkeys(["entrezgene", "ensembl.gene", *fields])),
+        )
+        hits = {}
+        for (query, gid), score in matches.items():
+            values = gene_fields.get(gid, {})
+            hit = {
+                "query": query,
+                "_id": values.get("entrezgene") or values.get("ensembl.gene"),
+                "_score": score,
+            }
+            for field in fields:
+                hit[field] = values.get(field)
+            hits.setdefault(query, []).append(hit)
+
+        out = []
+        for query in queries:
+            query_hits = hits.get(query)
+            if query_hits:
+                out.extend(sorted(query_hits, key=lambda h: -h["_score"]))
+            else:
+                out.append({"query": query, "notfound": True})
+
+        if not as_dataframe:
+            return out
+
+        import pandas
+
+        df = pandas.DataFrame(out)
+        if "notfound" not in df.columns:
+            df["notfound"] = float("nan")
+        for col in ("_id", "_score", *fields):
+            if col not in df.columns:
+                df[col] = None
+        if df_index:
+            df = df.set_index("query")
+        return df
+
+
+@lru_cache()
+def get_gene_store(dbfile: Union[str, Path]) -> GeneStore:
+    """Get the gene store, opened once for each database file"""
+    return GeneStore(dbfile)
+
+
+def main(argv: List[str] = None) -> int:
+    """The command line entry"""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build the gene store")
+    build_parser.add_argument("dbfile", help="The database file to build")
+    build_parser.add_argument(
+        "--gene-info",
+        nargs="+",
+        default=[],
+        help="The NCBI gene_info files",
+    )
+    build_parser.add_argument(
+        "--gtf",
+        nargs="+",
+        default=[],
+        help="The GTF files",
+    )
+    build_parser.add_argument(
+        "--alias",
+        nargs="+",
+        default=[],
+        help="Two-column files with genes and their aliases",
+    )
+    build_parser.add_argument(
+        "--taxid",
+        help="The taxonomy ID or species of the genes in the GTF/alias files",
+    )
+
+    query_parser = subparsers.add_parser("query", help="Query the genes")
+    query_parser.add_argument("dbfile", help="The database file")
+    query_parser.add_argument("genes", nargs="+", help="The genes to query")
+    query_parser.add_argument("--scopes", default="symbol,alias")
+    query_parser.add_argument("--fields", default="symbol")
+    query_parser.add_argument("--species", default="human")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        build(args.dbfile, args.gene_info, args.gtf, args.taxid, args.alias)
+        return 0
+
+    out = GeneStore(args.dbfile).querymany(
+        args.genes,
+        scopes=args.scopes,
+        fields=args.fields,
+        species=args.species,
+    )
+    print(out.to_csv(sep="\t", index=False), end="")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+"""Record and summarize the resource usage of the jobs
+
+The jobs are wrapped by (see `biopipen.core.proc.Proc.instrument`):
+
+    python -m biopipen.utils.instrument run -- <lang> <script>
+
+which runs the script and saves the resource usage to
+`job.resources.json` in the job's metadir (next to `job.script`).
+
+The records of a pipeline can be rolled up per process by:
+
+    python -m biopipen.utils.instrument summary <pipeline workdir>
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Any, List, Mapping, Set, Union
+
+RESOURCES_FILE = "job.resources.json"
+PROC_FS = Path("/proc")
+
+
+def _read_proc_io(pid: Union[int, str] = "self") -> Mapping[str, int]:
+    """Read the I/O counters from `/proc/<pid>/io`
+
+    The counters of `self` include those of the children that have been
+    waited for.
+    """
+    try:
+        with open(PROC_FS / str(pid) / "io") as fio:
+            return {
+                key: int(value)
+                for key, value in (line.split(": ", 1) for line in fio)
+            }
+    except (OSError, ValueError):
+        return {}
+
+
+def _descendants(pid: int) -> Mapping[int, int]:
+    """Get the descendants of a process and their RSS (KB)
+
+    Returns:
+        A dict with pids as keys and RSS as values, including the process
+        itself.
+    """
+    pagesize = os.sysconf("SC_PAGE_SIZE") // 1024
+    children = {}
+    rss = {}
+    for stat_file in PROC_FS.glob("[0-9]*/stat"):
+        try:
+            stat = stat_file.read_text()
+        except OSError:
+            continue
+        # pid (comm) state ppid ... the comm could have spaces
+        fields = stat[stat.rindex(")") + 2:].split()
+        child = int(stat_file.parent.name)
+        children.setdefault(int(fields[1]), []).append(child)
+        # rss in pages
+        rss[child] = int(fields[21]) * pagesize
+
+    out = {}
+    stack = [pid]
+    while stack:
+        proc = stack.pop()
+        if proc in rss:
+            out[proc] = rss[proc]
+        stack.extend(children.get(proc, []))
+    return out
+
+
+class _Sampler(threading.Thread):
+    """Sample the process tree to get the child processes and the peak
+    RSS of the whole tree"""
+
+    def __init__(self, pid: int, interval: float):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.pids: Set[int] = set()
+        self.max_concurrent = 0
+        self.peak_tree_rss = 0
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            tree = _descendants(self.pid)
+            tree.pop(self.pid, None)
+            self.pids.update(tree)
+            self.max_concurrent = max(self.max_concurrent, len(tree))
+            self.peak_tree_rss = max(self.peak_tree_rss, sum(tree.values()))
+            self.stopped.wait(self.interval)
+
+
+def run(
+    cmd: List[str],
+    outfile: Union[str, Path] = None,
+    interval: float = 1.0,
+) -> int:
+    """Run the command and record the resource usage
+
+    Args:
+        cmd: The command, with the script file as the last element
+        outfile: The file to save the records. Defaults to
+            `job.resources.json` in the directory of the script file
+        interval: The interval (seconds) to sample the process tree
+
+    Returns:
+        The return code of the command
+    """
+    if outfile is None:
+        outfile = Path(cmd[-1]).parent / RESOURCES_FILE
+
+    import resource
+
+    io_before = _read_proc_io()
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.time()
+
+    proc = subprocess.Popen(cmd)
+    # pass the signals (i.e. job killed) to the command
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, _: proc.send_signal(signum))
+
+    sampler = None
+    if PROC_FS.joinpath(str(proc.pid)).is_dir():
+        sampler = _Sampler(proc.pid, interval)
+        sampler.start()
+
+    returncode = proc.wait()
+    end = time.time()
+    if sampler is not None:
+        sampler.stopped.set()
+        sampler.join()
+
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    io_after = _read_proc_io()
+    io = {
+        key: io_after[key] - io_before.get(key, 0)
+        for key in ("rchar", "wchar", "read_bytes", "write_bytes")
+        if key in io_after
+    }
+    # ru_maxrss is in bytes on macOS but KB on Linux
+    maxrss = usage.ru_maxrss
+    if sys.platform == "darwin":  # pragma: no cover
+        maxrss //= 1024
+
+    records = {
+        "cmd": cmd,
+        "returncode": returncode,
+        "start": start,
+        "wall_time": end - start,
+        "user_time": usage.ru_utime - usage_before.ru_utime,
+        "sys_time": usage.ru_stime - usage_before.ru_stime,
+        # the largest process of the tree
+        "max_rss_kb": maxrss,
+        # all processes of the tree at the same time, sampled
+        "peak_tree_rss_kb": (
+            max(sampler.peak_tree_rss, maxrss) if sampler else None
+        ),
+        "read_bytes": io.get("read_bytes"),
+        "write_bytes": io.get("write_bytes"),
+        # including reads/writes from/to cache, pipes, etc
+        "read_chars": io.get("rchar"),
+        "write_chars": io.get("wchar"),
+        "block_reads": usage.ru_inblock - usage_before.ru_inblock,
+        "block_writes": usage.ru_oublock - usage_before.ru_oublock,
+        "n_children": len(sampler.pids) if sampler else None,
+        "max_concurrent_children": sampler.max_concurrent if sampler else None,
+    }
+    with open(outfile, "w") as fout:
+        json.dump(records, fout, indent=2)
+
+    return returncode
+
+
+def summarize(workdir: Union[str, Path]) -> Mapping[str, Mapping[str, Any]]:
+    """Roll up the resource usage of the jobs per process
+
+    Args:
+        workdir: The workdir of the pipeline (`<pipeline.workdir>/<name>`),
+            where the process workdirs are
+
+    Returns:
+        A dict with process names as keys and the summaries as values
+    """
+    summary = {}
+    for resfile in sorted(Path(workdir).glob(f"*/*/{RESOURCES_FILE}")):
+        procname = resfile.parent.parent.name
+        try:
+            with resfile.open() as fres:
+                records = json.load(fres)
+        except (OSError, ValueError):
+            continue
+
+        proc = summary.setdefault(
+            procname,
+            {
+                "njobs": 0,
+                "nfailed": 0,
+                "wall_time_total": 0.0,
+                "wall_time_max": 0.0,
+                "cpu_time_total": 0.0,
+                "cpu_time_max": 0.0,
+                "max_rss_kb": 0,
+                "peak_tree_rss_kb": 0,
+                "read_bytes_total": 0,
+                "write_bytes_total": 0,
+                "n_children_total": 0,
+            },
+        )
+        cpu_time = records["user_time"] + records["sys_time"]
+        proc["njobs"] += 1
+        proc["nfailed"] += int(records["returncode"] != 0)
+        proc["wall_time_total"] += records["wall_time"]
+        proc["wall_time_max"] = max(proc["wall_time_max"], records["wall_time"])
+        proc["cpu_time_total"] += cpu_time
+        proc["cpu_time_max"] = max(proc["cpu_time_max"], cpu_time)
+        proc["max_rss_kb"] = max(proc["max_rss_kb"], records["max_rss_kb"])
+        proc["peak_tree_rss_kb"] = max(
+            proc["peak_tree_rss_kb"], records["peak_tree_rss_kb"] or 0
+        )
+        proc["read_bytes_total"] += records["read_bytes"] or 0
+        proc["write_bytes_total"] += records["write_bytes"] or 0
+        proc["n_children_total"] += records["n_children"] or 0
+
+    for proc in summary.values():
+        proc["wall_time_mean"] = proc["wall_time_total"] / proc["njobs"]
+        proc["cpu_time_mean"] = proc["cpu_time_total"] / proc["njobs"]
+        # average number of cores used
+        proc["cpu_efficiency"] = (
+            proc["cpu_time_total"] / proc["wall_time_total"]
+            if proc["wall_time_total"] > 0
+            else None
+        )
+    return summary
+
+
+def main(argv: List[str] = None) -> int:
+    """The command line entry"""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run and record a job")
+    run_parser.add_argument(
+        "--outfile",
+        help=f"The file to save the records. Default: <scriptdir>/"
+        f"{RESOURCES_FILE}",
+    )
+    run_parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="The interval (seconds) to sample the process tree",
+    )
+    run_parser.add_argument("cmd", nargs="+", help="The command to run")
+
+    summary_parser = subparsers.add_parser(
+        "summary",
+        help="Summarize the records per process",
+    )
+    summary_parser.add_argument("workdir", help="The pipeline workdir")
+    summary_parser.add_argument(
+        "--outfile",
+        help="Save the summary to the JSON file instead of printing it",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return run(args.cmd, args.outfile, args.interval)
+
+    summary = summarize(args.workdir)
+    if args.outfile:
+        with open(args.outfile, "w") as fout:
+            json.dump(summary, fout, indent=2)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,756 @@
+"""Lift the coordinates over between genome builds by a chain file, without
+UCSC `liftOver` or `gatk LiftoverVcf`
+
+The chain file is parsed once into the aligned blocks, sorted by their
+positions on the source contigs, as NumPy arrays (`ChainMap`). They are
+saved in a persistent cache (`config.path.liftover_cache`, defaults to
+`<BIOPIPEN_CACHE_DIR>/liftover`), keyed by the content of the chain file,
+and memory-mapped when used again:
+
+    >>> chain = load_chain("hg19ToHg38.over.chain.gz")
+    >>> chain.lift(["chr1", "chr1"], [10000, 20000], [10100, 20001])
+
+The intervals (0-based, half-open) are looked up for a batch at once by
+binary searches. The ones within a single block are lifted by array
+operations, and the rest (i.e. spanning the gaps of a chain, or in
+multiple chains) one by one, by the rules of `liftOver`:
+
+- `Deleted in new`: not aligned
+- `Partially deleted in new`: fewer aligned bases than `min_match` of the
+  interval in all the chains
+- `Duplicated in new`: enough aligned bases in multiple chains
+
+`liftover_bed()` and `liftover_vcf()` write the lifted records, and the
+rejected ones the same way as `liftOver` and `gatk LiftoverVcf` do.
+"""
+import gzip
+import json
+import os
+import re
+import shutil
+import tempfile
+from hashlib import sha256
+from itertools import islice
+from pathlib import Path
+from typing import (
+    Any,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy
+
+from ..core.config import config
+from ..core.defaults import CACHE_DIR
+from .bgzf import BgzfWriter
+from .caching import file_digest, file_lock, remove_stale
+
+LIFTOVER_CACHE_DIR = CACHE_DIR / "liftover"
+LIFTOVER_TMPDIR_PREFIX = "biopipen_liftover_"
+
+# The rows of the blocks: the start and end on the source contig, the max
+# end of the blocks up to this one (for the binary search of the blocks
+# overlapping an interval), the start on the target contig (on the strand
+# of the chain) and the chain
+TSTART, TEND, MAXEND, QSTART, CHAIN = range(5)
+# The rows of the chains: the target contig, its size and the strand
+QCONTIG, QSIZE, NEGATIVE = range(3)
+
+# The results of the lifting
+LIFTED, DELETED, PARTIAL, DUPLICATED = range(4)
+REASONS = {
+    DELETED: "Deleted in new",
+    PARTIAL: "Partially deleted in new",
+    DUPLICATED: "Duplicated in new",
+}
+
+# The FILTERs of the rejected VCF records, the same as `gatk LiftoverVcf`
+VCF_FILTERS = {
+    "NoTarget": "Variant could not be lifted between genome builds.",
+    "MismatchedRefAllele": (
+        "Reference allele does not match reference genome sequence after "
+        "liftover."
+    ),
+    "IndelStraddlesMultipleIntevals": (
+        "Indel is straddling multiple intervals in the chain, and so the "
+        "results are not well defined."
+    ),
+    "ReverseComplementedIndel": (
+        "Indel falls into a reverse complemented region in the target "
+        "genome."
+    ),
+}
+COMPLEMENT = str.maketrans("ACGTNacgtn", "TGCAntgcan")
+
+
+class LiftResult(NamedTuple):
+    """The lifted intervals
+
+    Attributes:
+        contig: The indexes of the target contigs (`ChainMap.qcontigs`),
+            -1 for the ones not lifted
+        start: The starts on the target contigs (0-based)
+        end: The ends on the target contigs (exclusive)
+        negative: Whether lifted to the negative strands
+        reason: `LIFTED`, or why not lifted (`DELETED`, `PARTIAL` or
+            `DUPLICATED`)
+    """
+
+    contig: numpy.ndarray
+    start: numpy.ndarray
+    end: numpy.ndarray
+    negative: numpy.ndarray
+    reason: numpy.ndarray
+
+
+def _open(path: Union[str, Path], mode: str = "rt") -> Any:
+    """Open a text file, could be gzipped (bgzipped for writing)"""
+    if not str(path).endswith(".gz"):
+        return open(path, mode)
+    if "r" in mode:
+        return gzip.open(path, mode)
+    return BgzfWriter(path)
+
+
+class ChainMap:
+    """The aligned blocks of a chain file, indexed by the source contigs
+
+    Args:
+        blocks: The blocks, rows by `TSTART`, `TEND`, `MAXEND`, `QSTART`
+            and `CHAIN`, sorted by the source contigs and the starts
+        chains: The chains, rows by `QCONTIG`, `QSIZE` and `NEGATIVE`
+        contigs: The source contigs
+        offsets: The offsets of the blocks of the source contigs, with the
+            number of the blocks at the end
+        qcontigs: The target contigs
+    """
+
+    def __init__(
+        self,
+        blocks: numpy.ndarray,
+        chains: numpy.ndarray,
+        contigs: Sequence[str],
+        offsets: Sequence[int],
+        qcontigs: Sequence[str],
+    ):
+        self.blocks = blocks
+        self.chains = chains
+        self.contigs = list(contigs)
+        self.offsets = list(offsets)
+        self.qcontigs = list(qcontigs)
+        self._contig_indexes = {
+            contig: i for i, contig in enumerate(self.contigs)
+        }
+
+    @classmethod
+    def from_chain(cls, chainfile: Union[str, Path]) -> "ChainMap":
+        """Parse a chain file, could be gzipped"""
+        tcodes = {}
+        qcodes = {}
+        chains = []
+        blocks = []
+        with _open(chainfile) as fin:
+            for line in fin:
+                fields = line.split()
+                if not fields or fields[0].startswith("#"):
+                    continue
+                if fields[0] == "chain":
+                    # chain score tName tSize tStrand tStart tEnd
+                    #   qName qSize qStrand qStart qEnd id
+                    if fields[4] != "+":
+                        raise ValueError(
+                            f"Source strand not supported: {line.strip()}"
+                        )
+                    tcode = tcodes.setdefault(fields[2], len(tcodes))
+                    qcode = qcodes.setdefault(fields[7], len(qcodes))
+                    chain = len(chains)
+                    chains.append((qcode, int(fields[8]), fields[9] == "-"))
+                    tpos = int(fields[5])
+                    qpos = int(fields[10])
+                    continue
+                # size [dt dq]
+                size = int(fields[0])
+                blocks.append((tcode, tpos, tpos + size, qpos, chain))
+                if len(fields) > 1:
+                    tpos += size + int(fields[1])
+                    qpos += size + int(fields[2])
+
+        blocks = numpy.array(blocks, dtype=numpy.int64).reshape(-1, 5)
+        blocks = blocks[numpy.lexsort((blocks[:, 1], blocks[:, 0]))]
+        counts = numpy.bincount(blocks[:, 0], minlength=len(tcodes))
+        offsets = numpy.concatenate(([0], numpy.cumsum(counts)))
+        # the codes of the contigs replaced by the max ends
+        blocks = numpy.ascontiguousarray(blocks[:, [1, 2, 0, 3, 4]].T)
+        for first, last in zip(offsets[:-1], offsets[1:]):
+            blocks[MAXEND, first:last] = numpy.maximum.accumulate(
+                blocks[TEND, first:last]
+            )
+        return cls(
+            blocks,
+            numpy.array(chains, dtype=numpy.int64).reshape(-1, 3).T.copy(),
+            list(tcodes),
+            offsets.tolist(),
+            list(qcodes),
+        )
+
+    def save(self, outdir: Union[str, Path]) -> None:
+        """Save the blocks to a directory, to be loaded by `load()`"""
+        outdir = Path(outdir)
+        outdir.mkdir(parents=True, exist_ok=True)
+        numpy.save(outdir / "blocks.npy", self.blocks)
+        numpy.save(outdir / "chains.npy", self.chains)
+        outdir.joinpath("contigs.json").write_text(
+            json.dumps(
+                {
+                    "contigs": self.contigs,
+                    "offsets": self.offsets,
+                    "qcontigs": self.qcontigs,
+                }
+            )
+        )
+
+    @classmethod
+    def load(cls, indir: Union[str, Path]) -> "ChainMap":
+        """Load the blocks saved by `save()`, memory-mapped"""
+        indir = Path(indir)
+        contigs = json.loads(indir.joinpath("contigs.json").read_text())
+        return cls(
+            numpy.load(indir / "blocks.npy", mmap_mode="r"),
+            numpy.load(indir / "chains.npy"),
+            contigs["contigs"],
+            contigs["offsets"],
+            contigs["qcontigs"],
+        )
+
+    def qsizes(self) -> Mapping[str, int]:
+        """The sizes of the target contigs"""
+        return dict(
+            zip(
+                (self.qcontigs[code] for code in self.chains[QCONTIG]),
+                self.chains[QSIZE].tolist(),
+            )
+        )
+
+    def lift(
+        self,
+        contigs: Sequence[str],
+        starts: Sequence[int],
+        ends: Sequence[int],
+        min_match: float = 0.95,
+    ) -> LiftResult:
+        """Lift the intervals over
+
+        Args:
+            contigs: The contigs of the intervals
+            starts: The starts of the intervals, 0-based
+            ends: The ends of the intervals, exclusive. The empty intervals
+                (i.e. the insertion points) are lifted by the bases after
+                them.
+            min_match: The min fraction of the bases of an interval aligned
+                in a chain to be lifted by it
+
+        Returns:
+            The lifted intervals
+        """
+        starts = numpy.asarray(starts, dtype=numpy.int64)
+        ends = numpy.asarray(ends, dtype=numpy.int64)
+        codes = numpy.fromiter(
+            (self._contig_indexes.get(contig, -1) for contig in contigs),
+            dtype=numpy.int64,
+            count=len(starts),
+        )
+        out = LiftResult(
+            numpy.full(len(starts), -1, dtype=numpy.int64),
+            numpy.zeros(len(starts), dtype=numpy.int64),
+            numpy.zeros(len(starts), dtype=numpy.int64),
+            numpy.zeros(len(starts), dtype=bool),
+            numpy.full(len(starts), DELETED, dtype=numpy.int8),
+        )
+        for code in numpy.unique(codes[codes >= 0]).tolist():
+            self._lift_contig(
+                numpy.flatnonzero(codes == code),
+                self.blocks[:, self.offsets[code]:self.offsets[code + 1]],
+                starts,
+                ends,
+                min_match,
+                out,
+            )
+        return out
+
+    def _lift_contig(
+        self,
+        indexes: numpy.ndarray,
+        blocks: numpy.ndarray,
+        starts: numpy.ndarray,
+        ends: numpy.ndarray,
+        min_match: float,
+        out: LiftResult,
+    ) -> None:
+        """Lift the intervals on a source contig, saved to `out`"""
+        tstart = blocks[TSTART]
+        tend = blocks[TEND]
+        starts = starts[indexes]
+        lengths = ends[indexes] - starts
+        ends = starts + numpy.maximum(lengths, 1)
+        # the blocks from `first` up to `last` may overlap the intervals
+        first = numpy.searchsorted(blocks[MAXEND], starts, side="right")
+        last = numpy.searchsorted(tstart, ends, side="left")
+        block = numpy.minimum(first, len(tstart) - 1)
+        single = (
+            (last - first == 1)
+            & (tstart[block] <= starts)
+            & (tend[block] >= ends)
+        )
+
+        block = block[single]
+        chain = blocks[CHAIN, block]
+        qstart = blocks[QSTART, block] + starts[single] - tstart[block]
+        qend = qstart + lengths[single]
+        qsize = self.chains[QSIZE, chain]
+        negative = self.chains[NEGATIVE, chain].astype(bool)
+        lifted = indexes[single]
+        out.contig[lifted] = self.chains[QCONTIG, chain]
+        out.start[lifted] = numpy.where(negative, qsize - qend, qstart)
+        out.end[lifted] = numpy.where(negative, qsize - qstart, qend)
+        out.negative[lifted] = negative
+        out.reason[lifted] = LIFTED
+
+        for i in numpy.flatnonzero(~single & (last > first)).tolist():
+            self._lift_one(
+                indexes[i],
+                blocks[:, first[i]:last[i]],
+                int(starts[i]),
+                int(ends[i]),
+                int(lengths[i]),
+                min_match,
+                out,
+            )
+
+    def _lift_one(
+        self,
+        index: int,
+        blocks: numpy.ndarray,
+        start: int,
+        end: int,
+        length: int,
+        min_match: float,
+        out: LiftResult,
+    ) -> None:
+        """Lift an interval by the blocks that may overlap it"""
+        # the aligned bases and the span on the target by the chains
+        aligned = {}
+        for tstart, tend, _, qstart, chain in blocks.T.tolist():
+            if tend <= start or tstart >= end:
+                continue
+            ostart = max(tstart, start)
+            oend = min(tend, end)
+            qpos = qstart + ostart - tstart
+            if chain in aligned:
+                bases, qfirst, qlast = aligned[chain]
+                aligned[chain] = (
+                    bases + oend - ostart,
+                    min(qfirst, qpos),
+                    max(qlast, qpos + oend - ostart),
+                )
+            else:
+                aligned[chain] = (oend - ostart, qpos, qpos + oend - ostart)
+
+        if not aligned:
+            return
+        matched = [
+            (chain, qfirst, qlast)
+            for chain, (bases, qfirst, qlast) in aligned.items()
+            if bases >= min_match * (end - start)
+        ]
+        if len(matched) != 1:
+            out.reason[index] = DUPLICATED if matched else PARTIAL
+            return
+
+        chain, qstart, qend = matched[0]
+        if length == 0:
+            qend = qstart
+        qsize = int(self.chains[QSIZE, chain])
+        negative = bool(self.chains[NEGATIVE, chain])
+        out.contig[index] = self.chains[QCONTIG, chain]
+        out.start[index] = qsize - qend if negative else qstart
+        out.end[index] = qsize - qstart if negative else qend
+        out.negative[index] = negative
+        out.reason[index] = LIFTED
+
+
+def load_chain(chainfile: Union[str, Path]) -> ChainMap:
+    """Load a chain file from the persistent cache, parsed and saved there
+    for the first time
+
+    The blocks are parsed only once, even by the jobs running at the same
+    time, and memory-mapped by the later calls.
+
+    Args:
+        chainfile: The chain file, could be gzipped
+
+    Returns:
+        The blocks of the chain file
+    """
+    cache_dir = Path(
+        config.path.liftover_cache or LIFTOVER_CACHE_DIR
+    ).expanduser()
+    key = sha256(
+        file_digest(chainfile, cache_dir / "digests").encode()
+    ).hexdigest()
+    entry_dir = cache_dir / "entries" / key[:2] / key
+    if entry_dir.joinpath("contigs.json").is_file():
+        return ChainMap.load(entry_dir)
+
+    with file_lock(cache_dir / "locks" / f"{key}.lock"):
+        # parsed by another job while waiting for the lock
+        if entry_dir.joinpath("contigs.json").is_file():
+            return ChainMap.load(entry_dir)
+
+        remove_stale(f"{LIFTOVER_TMPDIR_PREFIX}*", cache_dir / "tmp")
+        cache_dir.joinpath("tmp").mkdir(parents=True, exist_ok=True)
+        builddir = Path(
+            tempfile.mkdtemp(
+                prefix=LIFTOVER_TMPDIR_PREFIX,
+                dir=cache_dir / "tmp",
+            )
+        )
+        try:
+            ChainMap.from_chain(chainfile).save(builddir)
+            entry_dir.parent.mkdir(parents=True, exist_ok=True)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(builddir, entry_dir)
+        finally:
+            shutil.rmtree(builddir, ignore_errors=True)
+
+    return ChainMap.load(entry_dir)
+
+
+def _chain_map(chain: Union[str, Path, ChainMap]) -> ChainMap:
+    """The chain map of a chain file, or itself"""
+    return chain if isinstance(chain, ChainMap) else load_chain(chain)
+
+
+def _batches(lines: Iterable[str], size: int) -> Iterable[List[str]]:
+    """The lines by batches"""
+    lines = iter(lines)
+    while True:
+        batch = list(islice(lines, size))
+        if not batch:
+            return
+        yield batch
+
+
+def liftover_bed(
+    inbed: Union[str, Path],
+    outbed: Union[str, Path],
+    rejfile: Union[str, Path],
+    chain: Union[str, Path, ChainMap],
+    min_match: float = 0.95,
+    batch: int = 100_000,
+) -> Tuple[int, int]:
+    """Lift a BED file over, like `liftOver`
+
+    The strands (the 6th column) are flipped for the intervals lifted to
+    the negative strands. The other columns are kept as they are (the
+    blocks of BED12 files are not lifted).
+
+    Args:
+        inbed: The input BED file, could be gzipped
+        outbed: The output BED file, bgzipped if ending with `.gz`
+        rejfile: The file to save the records not lifted, each after a
+            line of the reason (i.e. `#Deleted in new`)
+        chain: The chain file, or the chain map loaded
+        min_match: The min fraction of the bases of an interval aligned
+            in a chain to be lifted by it
+        batch: The number of the records lifted at once
+
+    Returns:
+        The numbers of the lifted and the rejected records
+    """
+    chain = _chain_map(chain)
+    nlifted = nrejected = 0
+    with _open(inbed) as fin, _open(outbed, "w") as fout, _open(
+        rejfile, "w"
+    ) as frej:
+        for lines in _batches(fin, batch):
+            records = [
+                line.rstrip("\r\n").split("\t")
+                for line in lines
+                if line.strip()
+                and not line.startswith(("#", "track", "browser"))
+            ]
+            lifted = chain.lift(
+                [fields[0] for fields in records],
+                [int(fields[1]) for fields in records],
+                [int(fields[2]) for fields in records],
+                min_match,
+            )
+            results = zip(records, *(arr.tolist() for arr in lifted))
+            for line in lines:
+                if not line.strip() or line.startswith(
+                    ("#", "track", "browser")
+                ):
+                    fout.write(line)
+                    continue
+                fields, contig, start, end, negative, reason = next(results)
+                if reason != LIFTED:
+                    frej.write(f"#{REASONS[reason]}\n")
+                    frej.write(line if line.endswith("\n") else f"{line}\n")
+                    nrejected += 1
+                    continue
+                fields[:3] = chain.qcontigs[contig], str(start), str(end)
+                if negative and len(fields) > 5 and fields[5] in ("+", "-"):
+                    fields[5] = "-" if fields[5] == "+" else "+"
+                fout.write("\t".join(fields) + "\n")
+                nlifted += 1
+    return nlifted, nrejected
+
+
+class FastaFile:
+    """Fetch the sequences from a FASTA file (not compressed) by its `.fai`
+    index, built in memory if the file does not exist
+
+    Args:
+        path: The FASTA file
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        faidx = self.path.with_name(self.path.name + ".fai")
+        if faidx.is_file():
+            self.index = {}
+            with faidx.open() as fin:
+                for line in fin:
+                    fields = line.split("\t")
+                    self.index[fields[0]] = tuple(map(int, fields[1:5]))
+        else:
+            self.index = self._build_index()
+        self._fh = self.path.open("rb")
+
+    def _build_index(self) -> Mapping[str, Tuple[int, int, int, int]]:
+        """Build the index: the length, the offset of the sequence, the
+        bases and the bytes of each line, by the sequence names"""
+        index = {}
+        name = None
+        offset = 0
+        with self.path.open("rb") as fin:
+            for line in fin:
+                offset += len(line)
+                if line.startswith(b">"):
+                    name = line[1:].split()[0].decode()
+                    index[name] = [0, offset, 0, 0]
+                elif name is not None and index[name][2] == 0:
+                    index[name][2] = len(line.rstrip(b"\r\n"))
+                    index[name][3] = len(line)
+                if name is not None and not line.startswith(b">"):
+                    index[name][0] += len(line.rstrip(b"\r\n"))
+        return {name: tuple(value) for name, value in index.items()}
+
+    def fetch(self, contig: str, start: int, end: int) -> str:
+        """Fetch the sequence of a region (0-based, half-open)"""
+        length, offset, linebases, linebytes = self.index[contig]
+        end = min(end, length)
+        if start >= end:
+            return ""
+        first = offset + start // linebases * linebytes + start % linebases
+        last = (
+            offset
+            + (end - 1) // linebases * linebytes
+            + (end - 1) % linebases
+            + 1
+        )
+        self._fh.seek(first)
+        return (
+            self._fh.read(last - first)
+            .replace(b"\n", b"")
+            .replace(b"\r", b"")
+            .decode()
+        )
+
+    def close(self) -> None:
+        """Close the file"""
+        self._fh.close()
+
+    def __enter__(self) -> "FastaFile":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def _natural_key(name: str) -> List[Any]:
+    """The key to sort the contigs naturally, i.e. chr2 before chr10"""
+    return [
+        (0, int(part)) if part.isdigit() else (1, part)
+        for part in re.split(r"(\d+)", name)
+    ]
+
+
+def _reverse_complement(alleles: Sequence[str]) -> List[str]:
+    """Reverse complement the alleles of an SNP or MNP, None if not
+    possible (i.e. indels, symbolic alleles)"""
+    length = len(alleles[0])
+    if any(
+        (len(allele) != length and allele not in ("*", "."))
+        or not re.fullmatch(r"[ACGTNacgtn*.]+", allele)
+        for allele in alleles
+    ):
+        return None
+    return [allele.translate(COMPLEMENT)[::-1] for allele in alleles]
+
+
+def _vcf_record(
+    line: str,
+    contig: str,
+    start: int,
+    end: int,
+    negative: bool,
+    fasta: FastaFile = None,
+) -> Tuple[str, str]:
+    """Lift a VCF record to a lifted interval
+
+    Returns:
+        The lifted record, or the filter rejecting it
+    """
+    fields = line.split("\t", 5)
+    ref = fields[3]
+    alts = fields[4].split(",")
+    if negative:
+        alleles = _reverse_complement([ref, *alts])
+        if alleles is None:
+            return None, "ReverseComplementedIndel"
+        ref, *alts = alleles
+    if end - start != len(ref):
+        return None, "IndelStraddlesMultipleIntevals"
+    if fasta is not None:
+        try:
+            seq = fasta.fetch(contig, start, end)
+        except KeyError:
+            seq = ""
+        if seq.upper() != ref.upper():
+            return None, "MismatchedRefAllele"
+
+    fields[:5] = contig, str(start + 1), fields[2], ref, ",".join(alts)
+    line = "\t".join(fields)
+    return line if line.endswith("\n") else f"{line}\n", None
+
+
+def _rejected_record(line: str, reason: str) -> str:
+    """The rejected VCF record with the filter"""
+    fields = line.rstrip("\r\n").split("\t", 7)
+    if fields[6] in (".", "PASS", ""):
+        fields[6] = reason
+    else:
+        fields[6] = f"{fields[6]};{reason}"
+    return "\t".join(fields) + "\n"
+
+
+def liftover_vcf(
+    invcf: Union[str, Path],
+    outvcf: Union[str, Path],
+    rejfile: Union[str, Path],
+    chain: Union[str, Path, ChainMap],
+    reffa: Union[str, Path] = None,
+    batch: int = 100_000,
+) -> Tuple[int, int]:
+    """Lift a VCF file over, like `gatk LiftoverVcf`
+
+    The REF alleles are lifted with all their bases aligned in one chain.
+    The alleles are reverse complemented for the variants lifted to the
+    negative strands, except the indels, which are rejected. The lifted
+    records are sorted, held in memory.
+
+    Args:
+        invcf: The input VCF file, could be gzipped
+        outvcf: The output VCF file, bgzipped if ending with `.gz`
+        rejfile: The VCF file to save the records not lifted, with the
+            reason in the FILTER column, bgzipped if ending with `.gz`
+        chain: The chain file, or the chain map loaded
+        reffa: The reference genome (FASTA) of the target build. If given,
+            the records with the REF alleles not matching it are rejected,
+            and the `##contig` lines of the output are from its index.
+        batch: The number of the records lifted at once
+
+    Returns:
+        The numbers of the lifted and the rejected records
+    """
+    chain = _chain_map(chain)
+    fasta = FastaFile(reffa) if reffa else None
+    if fasta is not None:
+        qsizes = {contig: value[0] for contig, value in fasta.index.items()}
+    else:
+        qsizes = chain.qsizes()
+        qsizes = {
+            contig: qsizes[contig]
+            for contig in sorted(qsizes, key=_natural_key)
+        }
+    ranks = {contig: rank for rank, contig in enumerate(qsizes)}
+
+    header = []
+    lifted = []
+    nrejected = 0
+    with _open(invcf) as fin, _open(rejfile, "w") as frej:
+        for line in fin:
+            header.append(line)
+            if not line.startswith("##"):
+                break
+        frej.write(
+            "".join(
+                header[:-1]
+                + [
+                    f'##FILTER=<ID={key},Description="{desc}">\n'
+                    for key, desc in VCF_FILTERS.items()
+                ]
+                + header[-1:]
+            )
+        )
+
+        for lines in _batches(fin, batch):
+            records = [line.split("\t", 4)[:4] for line in lines]
+            result = chain.lift(
+                [fields[0] for fields in records],
+                [int(fields[1]) - 1 for fields in records],
+                [int(fields[1]) - 1 + len(fields[3]) for fields in records],
+                min_match=1.0,
+            )
+            for line, contig, start, end, negative in zip(
+                lines,
+                result.contig.tolist(),
+                result.start.tolist(),
+                result.end.tolist(),
+                result.negative.tolist(),
+            ):
+                if contig < 0:
+                    record, reason = None, "NoTarget"
+                else:
+                    contig = chain.qcontigs[contig]
+                    record, reason = _vcf_record(
+                        line, contig, start, end, negative, fasta
+                    )
+                if record is None:
+                    frej.write(_rejected_record(line, reason))
+                    nrejected += 1
+                else:
+                    lifted.append(
+                        (ranks.get(contig, len(ranks)), start, record)
+                    )
+
+    if fasta is not None:
+        fasta.close()
+
+    lifted.sort(key=lambda item: item[:2])
+    contig_lines = [
+        f"##contig=<ID={contig},length={length}>\n"
+        for contig, length in qsizes.items()
+    ]
+    others = [line for line in header if not line.startswith("##contig=")]
+    with _open(outvcf, "w") as fout:
+        fout.write("".join(others[:-1] + contig_lines + others[-1:]))
+        for _, _, record in lifted:
+            fout.write(record)
+    return len(lifted), nrejected
@@ -1,21 +1,88 @@
+import gzip
+import os
+import re
+import shutil
+import struct
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
 from pathlib import Path
 
 import cmdy
 from ..core.config import config
+from ..core.defaults import CACHE_DIR
+from .bgzf import BLOCK_SIZE, BgzfReader, BgzfWriter
+from .caching import file_digest, file_lock, remove_stale
+
+TABIX_CACHE_DIR = CACHE_DIR / "tabix"
+# The temporary directories used to be created for each call and left behind
+TABIX_TMPDIR_PREFIX = "biopipen_tabix_index_"
+# The max length of contigs that tbi indexes support
+TBI_MAX_LENGTH = 2 ** 29
+
 
 def gztype(gzfile):
-    import binascii
+    """Detect if a file is bgzipped, gzipped or flat (not compressed)"""
     with open(gzfile, 'rb') as f:
-        flag = binascii.hexlify(f.read(4))
+        head = f.read(14)
 
-    if flag == b'1f8b0804':
+    if head[:2] != b'\x1f\x8b':
+        return 'flat'
+    # bgzip sets FEXTRA and puts a BC subfield in the extra field
+    if head[3] & 4 and head[12:14] == b'BC':
         return 'bgzip'
-    if flag == b'1f8b0808':
-        return 'gzip'
-    return 'flat'
+    return 'gzip'
+
+
+def _indexed(bgzfile):
+    """Check if the bgzipped file has an index (tbi or csi) that is not
+    older than the file itself"""
+    bgzfile = Path(bgzfile)
+    if not bgzfile.exists():
+        return False
+    for ext in (".tbi", ".csi"):
+        idxfile = bgzfile.with_suffix(bgzfile.suffix + ext)
+        if (
+            idxfile.is_file()
+            and idxfile.stat().st_mtime >= bgzfile.stat().st_mtime
+        ):
+            return True
+    return False
+
+
+def _bgzip_and_index(
+    infile, gt, preset, outfile, tabix, ncores=1, csi=False
+):
+    """Bgzip the infile to outfile if needed and index it (CSI if `csi`)"""
+    outfile = Path(outfile)
+    for path in (outfile, *outfile.parent.glob(outfile.name + ".[tc][bs]i")):
+        if path.is_symlink() or path.exists():
+            path.unlink()
+
+    if gt == "bgzip":
+        # directory of infile may not have write permission
+        try:
+            os.link(infile, outfile)
+        except OSError:
+            outfile.symlink_to(Path(infile).resolve())
+    else:
+        # re-bgzip gzip files, streaming without the decompressed file
+        opener = gzip.open if gt == "gzip" else open
+        with opener(infile, "rb") as fin, BgzfWriter(outfile, ncores) as fout:
+            for chunk in iter(lambda: fin.read(BLOCK_SIZE * 16), b""):
+                fout.write(chunk)
 
-def tabix_index(infile, preset, tmpdir=None, tabix=config.exe.tabix):
+    cmdy.tabix(p=preset, C=csi, _=outfile, _exe=tabix)
+    return outfile
+
+
+def tabix_index(
+    infile,
+    preset,
+    tmpdir=None,
+    tabix=config.exe.tabix,
+    ncores=1,
+):
     """Index input file using tabix
 
     1. Try to check if there is an index file in the same directory where infile
@@ -25,37 +92,734 @@ def tabix_index(infile, preset, tmpdir=None, tabix=config.exe.tabix):
        it in tmpdir
     4. Index the bgzipped file and return the bgzipped file
 
+    Without `tmpdir`, the bgzipped and indexed files are saved in a persistent
+    cache (`config.path.tabix_cache`, defaults to `<BIOPIPEN_CACHE_DIR>/tabix`),
+    keyed by the content of infile and the preset. The files are prepared
+    only once, even by the jobs running at the same time, and reused by the
+    later calls.
+
+    Args:
+        infile: The input file
+        preset: The preset for tabix (`-p`), i.e. vcf, bed, gff
+        tmpdir: The directory to save the bgzipped file and the index.
+            If not given, use the persistent cache
+        tabix: The path to tabix
+        ncores: The number of threads to bgzip the file
+
     Returns:
         The infile itself or re-bgzipped infile. This file comes with the
         index file in the same directory
     """
-    if tmpdir is None:
-        tmpdir = Path(tempfile.mkdtemp(prefix="biopipen_tabix_index_"))
-    else:
-        tmpdir = Path(tmpdir)
-
     infile = Path(infile)
-    gt = gztype(infile)
-
-    if gt == "bgzip" and infile.with_suffix(infile.suffix + ".tbi").is_file():
+    if _indexed(infile):
         # only bgzipped file is possible to have index file
         return infile
+    gt = gztype(infile)
 
     # /path/to/some.vcf -> some.vcf
     # /path/to/some.vcf.gz -> some.vcf
     basename = infile.stem if infile.name.endswith(".gz") else infile.name
 
-    # try bgzip infile
-    new_infile = tmpdir / (basename + ".gz")
-    if gt == "gzip":
-        # re-bgzip
-        cmdy.gunzip(infile, c=True).r() > new_infile.with_suffix("")
-        cmdy.bgzip(new_infile.with_suffix(""))
-    elif gt == "plain":
-        cmdy.bgzip(infile, c=True).r() > new_infile
-    else:
-        # directory of infile may not have write permission
-        new_infile.symlink_to(infile)
+    if tmpdir is not None:
+        new_infile = Path(tmpdir) / (basename + ".gz")
+        return _bgzip_and_index(
+            infile, gt, preset, new_infile, tabix, ncores
+        )
+
+    cache_dir = Path(config.path.tabix_cache or TABIX_CACHE_DIR).expanduser()
+    key = sha256(
+        f"{file_digest(infile, cache_dir / 'digests')}:{preset}".encode()
+    ).hexdigest()
+    entry_dir = cache_dir / "entries" / key[:2] / key
+    new_infile = entry_dir / (basename + ".gz")
+    if _indexed(new_infile):
+        return new_infile
+
+    with file_lock(cache_dir / "locks" / f"{key}.lock"):
+        # prepared by another job while waiting for the lock
+        if _indexed(new_infile):
+            return new_infile
+
+        remove_stale(f"{TABIX_TMPDIR_PREFIX}*", tempfile.gettempdir())
+        remove_stale("*", cache_dir / "tmp")
+        cache_dir.joinpath("tmp").mkdir(parents=True, exist_ok=True)
+        builddir = Path(
+            tempfile.mkdtemp(prefix=TABIX_TMPDIR_PREFIX, dir=cache_dir / "tmp")
+        )
+        try:
+            _bgzip_and_index(
+                infile, gt, preset, builddir / new_infile.name, tabix, ncores
+            )
+            entry_dir.parent.mkdir(parents=True, exist_ok=True)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(builddir, entry_dir)
+        finally:
+            shutil.rmtree(builddir, ignore_errors=True)
 
-    cmdy.tabix(p=preset, _=new_infile, _exe=tabix)
     return new_infile
+
+
+def _needs_csi(infile):
+    """Check if any `##contig` of the header of a VCF file is too long for
+    a tbi index"""
+    opener = open if gztype(infile) == "flat" else gzip.open
+    header = []
+    with opener(infile, "rt") as fin:
+        for line in fin:
+            if not line.startswith("#"):
+                break
+            header.append(line)
+    return any(
+        length > TBI_MAX_LENGTH
+        for length in contig_lengths(header).values()
+    )
+
+
+def _index_one(infile, outfile, preset, tabix, csi):
+    """Index a file to outfile for `index_files`, unless it is up to date"""
+    infile = Path(infile)
+    outfile = Path(outfile)
+    # indexing the bgzipped files in their directory
+    inplace = (
+        outfile.parent.resolve() / outfile.name
+        == infile.parent.resolve() / infile.name
+    )
+    if _indexed(infile):
+        if inplace:
+            return "indexed already"
+        idxfiles = outfile.parent.glob(outfile.name + ".[tc][bs]i")
+        for path in (outfile, *idxfiles):
+            if path.is_symlink() or path.exists():
+                path.unlink()
+        outfile.symlink_to(infile.resolve())
+        for idxfile in infile.parent.glob(infile.name + ".[tc][bs]i"):
+            outfile.with_name(outfile.name + idxfile.suffix).symlink_to(
+                idxfile.resolve()
+            )
+        return "indexed already"
+
+    if _indexed(outfile) and (
+        outfile.stat().st_mtime >= infile.stat().st_mtime
+    ):
+        return "up to date"
+
+    if csi == "auto":
+        csi = preset == "vcf" and _needs_csi(infile)
+    gt = gztype(infile)
+    if not inplace:
+        _bgzip_and_index(infile, gt, preset, outfile, tabix, csi=csi)
+    elif gt == "bgzip":
+        for idxfile in infile.parent.glob(infile.name + ".[tc][bs]i"):
+            idxfile.unlink()
+        cmdy.tabix(p=preset, C=csi, _=infile, _exe=tabix)
+    else:
+        raise ValueError(f"Cannot index in place, not bgzipped: {infile}")
+    return "indexed (csi)" if csi else "indexed (tbi)"
+
+
+def index_files(
+    infiles,
+    outdir,
+    preset="vcf",
+    tabix=config.exe.tabix,
+    ncores=1,
+    csi="auto",
+):
+    """Bgzip and index multiple files to a directory, in parallel
+
+    The files indexed already (with an index not older than the file) are
+    linked to the directory, and the ones with an index in the directory
+    newer than the file (i.e. by a previous run) are skipped. If the
+    directory is where the bgzipped files are, they are indexed in place.
+
+    Args:
+        infiles: The input files, could be flat, gzipped or bgzipped
+        outdir: The directory to save the bgzipped files (with `.gz`
+            appended if not) and the indexes
+        preset: The preset for tabix (`-p`), i.e. vcf, bed, gff
+        tabix: The path to tabix
+        ncores: The number of files to index at the same time
+        csi: Whether to generate CSI indexes instead of tbi ones.
+            `"auto"` to generate them only for the VCF files with contigs
+            longer than 2^29 in the header, which tbi does not support.
+
+    Returns:
+        The bgzipped files and what was done for them
+    """
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    outfiles = []
+    for infile in infiles:
+        name = Path(infile).name
+        if not name.endswith(".gz"):
+            name += ".gz"
+        outfiles.append(outdir / name)
+    if len(set(outfiles)) < len(outfiles):
+        raise ValueError("Input files with the same names.")
+
+    def index(item):
+        return _index_one(*item, preset, tabix, csi)
+
+    with ThreadPoolExecutor(max(ncores, 1)) as pool:
+        statuses = list(pool.map(index, zip(infiles, outfiles)))
+    return list(zip(outfiles, statuses))
+
+
+def _reg2bins(beg, end, min_shift, depth):
+    """The bins that may overlap with the region [beg, end)"""
+    end -= 1
+    bins = []
+    offset = 0
+    shift = min_shift + depth * 3
+    for level in range(depth + 1):
+        bins.extend(range(offset + (beg >> shift), offset + (end >> shift) + 1))
+        shift -= 3
+        offset += 1 << (level * 3)
+    return bins
+
+
+def parse_region(region):
+    """Parse a region string like `chr1:101-200` into a 0-based, half-open
+    tuple like `("chr1", 100, 200)`
+
+    `chr1` and `chr1:101-` are also supported, with the start and/or the
+    end as None, and `chr1:101` is the single position, like `-r` of
+    bcftools.
+    """
+    if ":" not in region:
+        return region, None, None
+    contig, _, coords = region.rpartition(":")
+    start, dash, end = coords.replace(",", "").partition("-")
+    if not dash:
+        return contig, int(start) - 1, int(start)
+    return (
+        contig,
+        int(start) - 1 if start else None,
+        int(end) if end else None,
+    )
+
+
+def split_regions(contigs, lengths=None, nregions=1):
+    """Split the contigs into regions of similar sizes, i.e. to process
+    them in parallel
+
+    Args:
+        contigs: The contigs, in order
+        lengths: The lengths of the contigs. The contigs without lengths
+            are not split
+        nregions: The number of regions to split the contigs into, roughly
+
+    Returns:
+        The 0-based, half-open regions like `("chr1", 0, 1000)` in the
+        order of the contigs, with the end as None to the end of the contig
+    """
+    lengths = lengths or {}
+    total = sum(lengths.get(contig, 0) for contig in contigs)
+    size = max(total // max(nregions, 1), 1)
+    out = []
+    for contig in contigs:
+        length = lengths.get(contig)
+        if not length:
+            out.append((contig, 0, None))
+            continue
+        for start in range(0, length, size):
+            out.append((contig, start, min(start + size, length)))
+        # records beyond the length in the header
+        out[-1] = (contig, out[-1][1], None)
+    return out
+
+
+def contig_lengths(header):
+    """Get the lengths of the contigs from the `##contig` lines of a VCF
+    header
+
+    Args:
+        header: The header, as a string or the lines
+
+    Returns:
+        The lengths by contigs, those without lengths are not included
+    """
+    if isinstance(header, str):
+        header = header.splitlines()
+    out = {}
+    for line in header:
+        if not line.startswith("##contig=<"):
+            continue
+        cid = re.search(r"[<,]ID=([^,>]+)", line)
+        length = re.search(r"[<,]length=(\d+)", line)
+        if cid and length:
+            out[cid.group(1)] = int(length.group(1))
+    return out
+
+
+def _scatter_tiles(infile, scatter):
+    """Split the contigs of an indexed VCF file for `scatter`"""
+    with TabixFile(infile) as tbx:
+        contigs = tbx.contigs
+        lengths = {} if scatter == "contig" else contig_lengths(tbx.header)
+
+    nregions = 1 if scatter == "contig" else int(scatter)
+    return split_regions(contigs, lengths, nregions)
+
+
+def scatter_regions(infile, scatter):
+    """Split an indexed VCF file into regions, i.e. to run bcftools on
+    them in parallel
+
+    Args:
+        infile: The bgzipped and indexed VCF file
+        scatter: `"contig"` for one region by contig, or the number of
+            regions of similar sizes (contigs are split by the lengths in
+            the `##contig` lines of the header)
+
+    Returns:
+        The regions in bcftools format (`chr1`, `chr1:1-1000` or
+        `chr1:1001-`), in the order of the file
+    """
+    out = []
+    for contig, start, end in _scatter_tiles(infile, scatter):
+        if start == 0 and end is None:
+            out.append(contig)
+        elif end is None:
+            out.append(f"{contig}:{start + 1}-")
+        else:
+            out.append(f"{contig}:{start + 1}-{end}")
+    return out
+
+
+def merge_regions(regions):
+    """Merge the overlapping (or adjacent) regions
+
+    Args:
+        regions: The 0-based, half-open regions like `("chr1", 0, 1000)`,
+            with the start/end as None from the start/to the end of the
+            contig
+
+    Returns:
+        The merged regions, sorted by the starts within the contigs, and
+        the contigs in the order they are first seen
+    """
+    by_contig = {}
+    for contig, start, end in regions:
+        by_contig.setdefault(contig, []).append((start or 0, end))
+
+    out = []
+    for contig, intervals in by_contig.items():
+        intervals.sort(key=lambda intv: intv[0])
+        merged = [list(intervals[0])]
+        for start, end in intervals[1:]:
+            last = merged[-1]
+            if last[1] is not None and start > last[1]:
+                merged.append([start, end])
+            elif last[1] is not None and (end is None or end > last[1]):
+                last[1] = end
+        out.extend((contig, start, end) for start, end in merged)
+    return out
+
+
+def parse_regions(regions=None, regions_file=None):
+    """Parse the regions to restrict the records to, like `-r/--regions`
+    and `-R/--regions-file` of bcftools, and merge the overlapping ones
+
+    Args:
+        regions: The regions, a list or a comma-separated string, like
+            `chr1`, `chr1:101-200`, `chr1:101-` (to the end) or `chr1:101`
+            (the single position), 1-based, inclusive
+        regions_file: A file of the regions, could be gzipped. A BED file
+            (`.bed` or `.bed.gz`, 0-based) or a tab-delimited file with
+            the contig, start and end (1-based, inclusive). The lines with
+            only the contig are the whole contigs.
+
+    Returns:
+        The merged 0-based, half-open regions (see `merge_regions()`), or
+        None if neither is given
+    """
+    if not regions and not regions_file:
+        return None
+
+    out = []
+    if isinstance(regions, str):
+        regions = regions.split(",")
+    for region in regions or ():
+        if region.strip():
+            out.append(parse_region(region.strip()))
+
+    if regions_file:
+        regions_file = str(regions_file)
+        name = regions_file[:-3] if regions_file.endswith(".gz") else (
+            regions_file
+        )
+        offset = 0 if name.endswith(".bed") else 1
+        opener = gzip.open if regions_file.endswith(".gz") else open
+        with opener(regions_file, "rt") as fin:
+            for line in fin:
+                if not line.strip() or line.startswith(
+                    ("#", "track", "browser")
+                ):
+                    continue
+                fields = line.rstrip("\r\n").split("\t")
+                if len(fields) == 1:
+                    out.append((fields[0], None, None))
+                    continue
+                start = int(fields[1]) - offset
+                end = int(fields[2]) if len(fields) > 2 else start + 1
+                out.append((fields[0], start, end))
+
+    return merge_regions(out)
+
+
+def order_regions(regions, contigs):
+    """Order the regions by the contigs (i.e. of the index), dropping the
+    ones on the other contigs
+
+    Args:
+        regions: The merged regions, see `merge_regions()`
+        contigs: The contigs, in order
+
+    Returns:
+        The ordered regions
+    """
+    ranks = {contig: rank for rank, contig in enumerate(contigs)}
+    return sorted(
+        (region for region in regions if region[0] in ranks),
+        # sorted is stable, the regions of a contig are sorted already
+        key=lambda region: ranks[region[0]],
+    )
+
+
+def intersect_regions(regions, tiles):
+    """Clip the regions by the tiles, i.e. to process the regions of each
+    tile (from `split_regions()`) in parallel
+
+    Args:
+        regions: The merged regions, see `merge_regions()`
+        tiles: The non-overlapping tiles
+
+    Returns:
+        The lists of the clipped regions of the tiles, without the empty
+        ones
+    """
+    by_contig = {}
+    for contig, start, end in regions:
+        by_contig.setdefault(contig, []).append((start, end))
+
+    out = []
+    for contig, tstart, tend in tiles:
+        tstart = tstart or 0
+        group = []
+        for start, end in by_contig.get(contig, ()):
+            start = max(start, tstart)
+            if end is None or (tend is not None and end > tend):
+                end = tend
+            if end is None or start < end:
+                group.append((contig, start, end))
+        if group:
+            out.append(group)
+    return out
+
+
+def fetch_regions(tbx, regions):
+    """Fetch the records starting in the regions, each only once
+
+    The records are only included if their positions are in the regions,
+    like `--regions-overlap 0` of bcftools, so that the ones spanning
+    multiple regions are not duplicated.
+
+    Args:
+        tbx: The `TabixFile` object
+        regions: The merged and ordered regions, see `order_regions()`
+
+    Yields:
+        The records (lines without line breaks)
+    """
+    col_beg = tbx.col_beg - 1
+    shift = 0 if tbx.zero_based else 1
+    for contig, start, end in regions:
+        for line in tbx.fetch(contig, start, end):
+            if int(line.split("\t", col_beg + 1)[col_beg]) - shift >= start:
+                yield line
+
+
+def scatter_targets(infile, scatter, regions):
+    """Split the target regions of an indexed VCF file, like
+    `scatter_regions()` but to run bcftools on the targets only
+
+    Args:
+        infile: The bgzipped and indexed VCF file
+        scatter: `"contig"` or the number of regions, see
+            `scatter_regions()`
+        regions: The merged target regions, see `parse_regions()`
+
+    Returns:
+        The lists of the target regions clipped by the scattered regions,
+        in the order of the file, without the empty ones
+    """
+    return intersect_regions(regions, _scatter_tiles(infile, scatter))
+
+
+def write_regions(regions, path):
+    """Write the regions for `-R/--regions-file` of bcftools
+
+    Args:
+        regions: The merged and ordered regions (bcftools keeps the order
+            of the file), see `order_regions()`
+        path: The path to the file (tab-delimited, 1-based, inclusive)
+
+    Returns:
+        The path
+    """
+    with open(path, "w") as fout:
+        for contig, start, end in regions:
+            end = (1 << 31) - 1 if end is None else end
+            fout.write(f"{contig}\t{start + 1}\t{end}\n")
+    return path
+
+
+class TabixFile:
+    """Query a bgzipped file by regions with its tabix (.tbi) or CSI (.csi)
+    index, without the tabix executable
+
+    >>> with TabixFile("in.vcf.gz") as tbx:
+    >>>     tbx.contigs  # tabix -l in.vcf.gz
+    >>>     for line in tbx.fetch("chr1", 100, 200):  # tabix chr1:101-200
+    >>>         ...
+
+    The decompressed blocks are cached (LRU), so that fetching many small
+    regions nearby decompresses each block only once.
+
+    Args:
+        infile: The bgzipped file
+        index: The index file, defaults to `<infile>.tbi` or `<infile>.csi`
+        cache_size: The max number of decompressed blocks to cache
+    """
+
+    def __init__(self, infile, index=None, cache_size=256):
+        infile = str(infile)
+        if index is None:
+            index = next(
+                (
+                    infile + ext
+                    for ext in (".tbi", ".csi")
+                    if Path(infile + ext).is_file()
+                ),
+                None,
+            )
+        if index is None:
+            raise FileNotFoundError(f"No index (.tbi/.csi) found for {infile}")
+
+        self.reader = BgzfReader(infile, cache_size)
+        self._parse_index(gzip.decompress(Path(index).read_bytes()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Close the file"""
+        self.reader.close()
+
+    def _parse_index(self, data):
+        """Parse the tbi or CSI index"""
+        magic = data[:4]
+        if magic == b"TBI\1":
+            self.min_shift, self.depth = 14, 5
+            pos = 4
+            (n_ref,) = struct.unpack_from("<i", data, pos)
+            pos += 4
+            pos = self._parse_conf(data, pos)
+        elif magic == b"CSI\1":
+            self.min_shift, self.depth, l_aux = struct.unpack_from(
+                "<3i", data, 4
+            )
+            if l_aux < 28:
+                raise ValueError(
+                    "CSI index without tabix configuration (i.e. for BCF) "
+                    "is not supported."
+                )
+            self._parse_conf(data, 16)
+            pos = 16 + l_aux
+            (n_ref,) = struct.unpack_from("<i", data, pos)
+            pos += 4
+        else:
+            raise ValueError("Not a tabix or CSI index.")
+
+        # the bins (bin => chunks), the loffsets of the bins (CSI) and
+        # the linear index (tbi) of the contigs
+        self._bins = []
+        self._loffsets = []
+        self._linear = []
+        csi = magic == b"CSI\1"
+        for _ in range(n_ref):
+            (n_bin,) = struct.unpack_from("<i", data, pos)
+            pos += 4
+            bins = {}
+            loffsets = {}
+            for _ in range(n_bin):
+                if csi:
+                    bin_, loffset, n_chunk = struct.unpack_from(
+                        "<IQi", data, pos
+                    )
+                    pos += 16
+                    loffsets[bin_] = loffset
+                else:
+                    bin_, n_chunk = struct.unpack_from("<Ii", data, pos)
+                    pos += 8
+                chunks = struct.unpack_from(f"<{n_chunk * 2}Q", data, pos)
+                pos += n_chunk * 16
+                bins[bin_] = list(zip(chunks[::2], chunks[1::2]))
+            self._bins.append(bins)
+            self._loffsets.append(loffsets)
+            if csi:
+                self._linear.append(())
+            else:
+                (n_intv,) = struct.unpack_from("<i", data, pos)
+                pos += 4
+                self._linear.append(
+                    struct.unpack_from(f"<{n_intv}Q", data, pos)
+                )
+                pos += n_intv * 8
+
+    def _parse_conf(self, data, pos):
+        """Parse the tabix configuration and the contig names"""
+        (
+            fmt,
+            self.col_seq,
+            self.col_beg,
+            self.col_end,
+            meta,
+            self.skip,
+            l_nm,
+        ) = struct.unpack_from("<7i", data, pos)
+        pos += 28
+        # 0: generic, 1: SAM, 2: VCF
+        self.format = fmt & 0xFFFF
+        # 0-based, half-open coordinates, i.e. BED
+        self.zero_based = bool(fmt & 0x10000)
+        self.meta = chr(meta)
+        self.contigs = [
+            name.decode()
+            for name in data[pos:pos + l_nm].split(b"\0")
+            if name
+        ]
+        self._tids = {name: tid for tid, name in enumerate(self.contigs)}
+        return pos + l_nm
+
+    @property
+    def nrecords(self):
+        """The number of the records from the pseudo-bins of the index
+        (written by htslib), or None if not available"""
+        pseudo_bin = ((1 << (3 * self.depth + 3)) - 1) // 7 + 1
+        total = 0
+        for bins in self._bins:
+            if not bins:
+                continue
+            # (ref_beg, ref_end), (n_mapped, n_unmapped)
+            chunks = bins.get(pseudo_bin)
+            if not chunks or len(chunks) < 2:
+                return None
+            total += chunks[1][0]
+        return total
+
+    @property
+    def header(self):
+        """The header lines (starting with the meta char or skipped)"""
+        out = []
+        for i, (_, line) in enumerate(self.reader.iter_lines(0)):
+            line = line.decode()
+            if i >= self.skip and not line.startswith(self.meta):
+                break
+            out.append(line)
+        return out
+
+    def _interval(self, fields):
+        """The 0-based, half-open interval of a record"""
+        beg = int(fields[self.col_beg - 1])
+        if not self.zero_based:
+            beg -= 1
+        if self.format == 2:
+            # VCF: END in INFO or the length of REF
+            end = beg + len(fields[3])
+            if len(fields) > 7:
+                for info in fields[7].split(";"):
+                    if info.startswith("END="):
+                        end = int(info[4:])
+                        break
+        elif self.col_end:
+            end = int(fields[self.col_end - 1])
+        else:
+            end = beg + 1
+        return beg, end
+
+    def _chunks(self, tid, start, end):
+        """The merged chunks (virtual offsets) to read for the region"""
+        bins = self._bins[tid]
+        # the records before this offset end before the start
+        min_offset = 0
+        linear = self._linear[tid]
+        if linear:
+            min_offset = linear[min(start >> 14, len(linear) - 1)]
+        else:
+            # the loffset of the smallest bin containing the start
+            loffsets = self._loffsets[tid]
+            for level in range(self.depth, -1, -1):
+                shift = self.min_shift + (self.depth - level) * 3
+                bin_ = ((1 << (level * 3)) - 1) // 7 + (start >> shift)
+                if bin_ in loffsets:
+                    min_offset = loffsets[bin_]
+                    break
+
+        chunks = sorted(
+            chunk
+            for bin_ in _reg2bins(start, end, self.min_shift, self.depth)
+            for chunk in bins.get(bin_, ())
+            if chunk[1] > min_offset
+        )
+        merged = []
+        for beg, chunk_end in chunks:
+            beg = max(beg, min_offset)
+            if merged and beg <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], chunk_end)
+            else:
+                merged.append([beg, chunk_end])
+        return merged
+
+    def fetch(self, contig, start=None, end=None):
+        """Fetch the records overlapping the region
+
+        Args:
+            contig: The contig, or a region string like `chr1:101-200`
+                when start and end are not given
+            start: The 0-based start of the region
+            end: The 0-based, exclusive end of the region
+
+        Yields:
+            The records (lines without line breaks)
+        """
+        if start is None and end is None:
+            contig, start, end = parse_region(contig)
+        tid = self._tids.get(contig)
+        if tid is None:
+            return
+        start = max(start or 0, 0)
+        end = (1 << 31) - 1 if end is None else end
+        if start >= end:
+            return
+
+        for chunk_beg, chunk_end in self._chunks(tid, start, end):
+            for voffset, line in self.reader.iter_lines(chunk_beg):
+                if voffset >= chunk_end:
+                    break
+                line = line.decode()
+                if not line or line.startswith(self.meta):
+                    continue
+                fields = line.split("\t")
+                if fields[self.col_seq - 1] != contig:
+                    break
+                beg, rec_end = self._interval(fields)
+                if beg >= end:
+                    # records are sorted
+                    return
+                if rec_end > start:
+                    yield line
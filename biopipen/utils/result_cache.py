@@ -0,0 +1,404 @@
+"""Content-addressed cache of the results of deterministic processes
+
+The jobs of the processes with `result_cache = True` (see
+`biopipen.core.proc.Proc`) are wrapped, when `config.result_cache.enabled`,
+by:
+
+    python -m biopipen.utils.result_cache run -- <lang> <script>
+
+The process writes a manifest (`job.result_cache.json`) next to the script,
+with the input values, the envs, the rendered script and the outputs of the
+job. The key of the job is computed from the manifest, with the contents of
+the input files and the files in the envs (i.e. the reference genome, instead
+of their paths), the paths in the job's directories stripped from the script
+and the version of biopipen, so that the same job in a different workdir has
+the same key, and a job is run again once the files in the envs change or
+biopipen is upgraded.
+
+If an entry with the key is in the cache, the outputs are copied from it and
+the job is not run. Otherwise, the job runs and the outputs are copied to the
+cache, read-only, once it succeeds. The files are never shared (hard linked)
+between the cache and the jobs, so that modifying the outputs in place does
+not corrupt the cache. A job holds
+a lock of the key while running, so that the same jobs running at the same
+time are computed only once. The least recently used entries are removed once
+the cache exceeds the max size.
+
+The cache can be inspected or cleaned up by:
+
+    python -m biopipen.utils.result_cache info <cache_dir>
+    python -m biopipen.utils.result_cache evict <cache_dir> --max-size 10G
+"""
+import hashlib
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Any, List, Mapping, Tuple, Union
+
+from .. import __version__
+from .caching import (
+    file_digest,
+    file_lock,
+    iter_files,
+    parse_size,
+    remove_stale,
+)
+
+MANIFEST_FILE = "job.result_cache.json"
+ENTRY_FILE = "entry.json"
+
+def _size(path: Path) -> int:
+    """The size of a file or all the files in a directory"""
+    if path.is_dir():
+        return sum(fpath.stat().st_size for fpath in iter_files(path))
+    return path.stat().st_size
+
+
+def _copy(src: Path, dst: Path, readonly: bool = False) -> None:
+    """Copy a file or a directory, with the empty directories in it
+
+    Args:
+        src: The file or the directory to copy
+        dst: The destination
+        readonly: Whether to make the copied files read-only. Otherwise,
+            they are writable by the user
+    """
+    if src.is_dir():
+        dst.mkdir(parents=True, exist_ok=True)
+        for root, dirs, files in os.walk(src):
+            reldir = Path(root).relative_to(src)
+            for dname in dirs:
+                dst.joinpath(reldir, dname).mkdir(exist_ok=True)
+            for fname in files:
+                _copy(Path(root) / fname, dst / reldir / fname, readonly)
+        return
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.is_symlink() or dst.is_file():
+        dst.unlink()
+    shutil.copy2(src, dst)
+    mode = dst.stat().st_mode
+    if readonly:
+        os.chmod(dst, mode & ~0o222)
+    else:
+        os.chmod(dst, mode | 0o200)
+
+
+class ResultCache:
+    """The content-addressed cache of the job results
+
+    The layout of the cache directory:
+
+        <cache_dir>/entries/<key[:2]>/<key>/entry.json
+        <cache_dir>/entries/<key[:2]>/<key>/outputs/<output files>
+        <cache_dir>/digests/<...>: The digests of the input files
+        <cache_dir>/locks/<...>: The lock files
+        <cache_dir>/tmp/<...>: The entries being saved or removed
+
+    The mtime of `entry.json` is the last time the entry is used.
+
+    Args:
+        cache_dir: The directory of the cache
+        max_size: The max size of the cache, in bytes or with units
+    """
+
+    def __init__(
+        self,
+        cache_dir: Union[str, Path],
+        max_size: Union[int, str] = "50G",
+    ):
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.max_size = parse_size(max_size)
+        for subdir in ("entries", "digests", "locks", "tmp"):
+            self.cache_dir.joinpath(subdir).mkdir(parents=True, exist_ok=True)
+
+    def entry_dir(self, key: str) -> Path:
+        """The directory of the entry"""
+        return self.cache_dir / "entries" / key[:2] / key
+
+    def lock(self, key: str = "cache", blocking: bool = True):
+        """Lock the key, or the whole cache by default"""
+        return file_lock(self.cache_dir / "locks" / f"{key}.lock", blocking)
+
+    def file_digest(self, path: Union[str, Path]) -> str:
+        """The digest of the content of a file or a directory
+
+        The digests of the files are saved in the cache, keyed by the path,
+        the size and the mtime of the files, so that they are not computed
+        again until the files change.
+        """
+        return file_digest(path, self.cache_dir / "digests")
+
+    def _digest_envs(self, value: Any) -> Any:
+        """Replace the paths of the existing files in the envs with the
+        digests of their contents"""
+        if isinstance(value, dict):
+            return {key: self._digest_envs(val) for key, val in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._digest_envs(val) for val in value]
+        if isinstance(value, str) and value and os.path.isfile(value):
+            return ["file", self.file_digest(value)]
+        return value
+
+    def compute_key(self, manifest: Mapping[str, Any]) -> str:
+        """Compute the key of a job from its manifest
+
+        Args:
+            manifest: The manifest of the job, with `proc`, `script`, `envs`,
+                `input` (name => [type, value]) and `output`
+                (name => [type, relative path or value])
+
+        Returns:
+            The key
+        """
+        inputs = {}
+        for name, (intype, value) in manifest["input"].items():
+            if value is None or intype == "var":
+                inputs[name] = [intype, value]
+            elif intype in ("files", "dirs"):
+                inputs[name] = [intype, [self.file_digest(f) for f in value]]
+            else:
+                inputs[name] = [intype, self.file_digest(value)]
+
+        return hashlib.sha256(
+            json.dumps(
+                {
+                    "proc": manifest["proc"],
+                    "script": manifest["script"],
+                    "envs": self._digest_envs(manifest["envs"]),
+                    "input": inputs,
+                    "output": manifest["output"],
+                    "version": __version__,
+                },
+                sort_keys=True,
+                default=str,
+            ).encode()
+        ).hexdigest()
+
+    def restore(
+        self,
+        key: str,
+        outputs: Mapping[str, Tuple[str, str]],
+        outdir: Union[str, Path],
+    ) -> bool:
+        """Copy the outputs from the cache
+
+        Args:
+            key: The key of the job
+            outputs: The outputs of the job (name => [type, relative path])
+            outdir: The output directory of the job
+
+        Returns:
+            True if the entry exists and the outputs are copied
+        """
+        entry_dir = self.entry_dir(key)
+        entry_file = entry_dir / ENTRY_FILE
+        if not entry_file.is_file():
+            return False
+
+        for outtype, relpath in outputs.values():
+            if outtype == "var":
+                continue
+            cached = entry_dir / "outputs" / relpath
+            if not cached.exists():
+                return False
+            _copy(cached, Path(outdir) / relpath)
+
+        # mark it as recently used
+        os.utime(entry_file)
+        return True
+
+    def store(
+        self,
+        key: str,
+        outputs: Mapping[str, Tuple[str, str]],
+        outdir: Union[str, Path],
+        proc: str = None,
+    ) -> None:
+        """Save the outputs of a job to the cache, as read-only copies
+
+        Args:
+            key: The key of the job
+            outputs: The outputs of the job (name => [type, relative path])
+            outdir: The output directory of the job
+            proc: The name of the process, for inspection
+        """
+        entry_dir = self.entry_dir(key)
+        if entry_dir.joinpath(ENTRY_FILE).is_file():
+            return
+
+        tmpdir = self.cache_dir / "tmp" / f"{key}.{os.getpid()}"
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        size = 0
+        for outtype, relpath in outputs.values():
+            if outtype == "var":
+                continue
+            output = Path(outdir) / relpath
+            _copy(output, tmpdir / "outputs" / relpath, readonly=True)
+            size += _size(output)
+
+        tmpdir.mkdir(parents=True, exist_ok=True)
+        tmpdir.joinpath(ENTRY_FILE).write_text(
+            json.dumps(
+                {
+                    "key": key,
+                    "proc": proc,
+                    "size": size,
+                    "created": time.time(),
+                },
+                indent=2,
+            )
+        )
+        entry_dir.parent.mkdir(parents=True, exist_ok=True)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmpdir, entry_dir)
+
+    def entries(self) -> List[Mapping[str, Any]]:
+        """The entries in the cache, the least recently used first"""
+        out = []
+        for entry_file in self.cache_dir.glob(f"entries/*/*/{ENTRY_FILE}"):
+            try:
+                entry = json.loads(entry_file.read_text())
+                entry["last_used"] = entry_file.stat().st_mtime
+            except (OSError, ValueError):
+                continue
+            entry["path"] = str(entry_file.parent)
+            out.append(entry)
+        return sorted(out, key=lambda entry: entry["last_used"])
+
+    def evict(self, max_size: Union[int, str] = None) -> List[str]:
+        """Remove the least recently used entries until the cache fits
+        the max size
+
+        Args:
+            max_size: The max size, defaults to `self.max_size`
+
+        Returns:
+            The keys of the removed entries
+        """
+        max_size = self.max_size if max_size is None else parse_size(max_size)
+        removed = []
+        with self.lock():
+            # left by the jobs killed while saving the outputs
+            remove_stale("*", self.cache_dir / "tmp")
+            entries = self.entries()
+            total = sum(entry["size"] for entry in entries)
+            for entry in entries:
+                if total <= max_size:
+                    break
+                with self.lock(entry["key"], blocking=False) as acquired:
+                    # skip the entries being used
+                    if not acquired:
+                        continue
+                    trash = self.cache_dir / "tmp" / (
+                        f"{entry['key']}.{os.getpid()}.evicted"
+                    )
+                    try:
+                        os.replace(entry["path"], trash)
+                    except OSError:
+                        continue
+                shutil.rmtree(trash, ignore_errors=True)
+                total -= entry["size"]
+                removed.append(entry["key"])
+        return removed
+
+
+def run(cmd: List[str], manifest: Union[str, Path] = None) -> int:
+    """Run the job with its results cached
+
+    Args:
+        cmd: The command, with the script file as the last element
+        manifest: The manifest of the job. Defaults to `job.result_cache.json`
+            in the directory of the script file
+
+    Returns:
+        The return code of the command, 0 if the results are from the cache
+    """
+    if manifest is None:
+        manifest = Path(cmd[-1]).parent / MANIFEST_FILE
+    manifest = json.loads(Path(manifest).read_text())
+
+    cache = ResultCache(manifest["cache_dir"], manifest["max_size"])
+    key = cache.compute_key(manifest)
+    outputs = manifest["output"]
+    outdir = manifest["outdir"]
+
+    with cache.lock(key):
+        if cache.restore(key, outputs, outdir):
+            print(f"[biopipen] Outputs restored from result cache: {key}")
+            return 0
+
+        proc = subprocess.Popen(cmd)
+        # pass the signals (i.e. job killed) to the command
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda signum, _: proc.send_signal(signum))
+        returncode = proc.wait()
+        if returncode != 0:
+            return returncode
+
+        cache.store(key, outputs, outdir, manifest["proc"])
+
+    cache.evict()
+    return returncode
+
+
+def main(argv: List[str] = None) -> int:
+    """The command line entry"""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run a job with cache")
+    run_parser.add_argument(
+        "--manifest",
+        help=f"The manifest of the job. Default: <scriptdir>/{MANIFEST_FILE}",
+    )
+    run_parser.add_argument("cmd", nargs="+", help="The command to run")
+
+    info_parser = subparsers.add_parser(
+        "info",
+        help="Show the size and the entries of the cache",
+    )
+    info_parser.add_argument("cache_dir", help="The cache directory")
+
+    evict_parser = subparsers.add_parser(
+        "evict",
+        help="Remove the least recently used entries",
+    )
+    evict_parser.add_argument("cache_dir", help="The cache directory")
+    evict_parser.add_argument(
+        "--max-size",
+        default="0",
+        help="The size to shrink the cache to. Default: 0 (clear the cache)",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return run(args.cmd, args.manifest)
+
+    cache = ResultCache(args.cache_dir)
+    if args.command == "evict":
+        removed = cache.evict(args.max_size)
+        print(f"Removed {len(removed)} entries.")
+        return 0
+
+    entries = cache.entries()
+    for entry in entries:
+        print(
+            f"{entry['key'][:16]}  {entry['proc']}  {entry['size']}  "
+            f"{time.ctime(entry['last_used'])}"
+        )
+    print(
+        f"{len(entries)} entries, "
+        f"{sum(entry['size'] for entry in entries)} bytes."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,422 @@
+"""Annotate multiple VCF files by one annotation VCF file at once
+
+The annotation file (i.e. dbSNP or gnomAD) is read only once. It is joined
+with all the input files by a sorted merge, like:
+
+    >>> annotate_vcfs(
+    >>>     ["s1.vcf.gz", "s2.vcf.gz"],
+    >>>     "dbsnp.vcf.gz",
+    >>>     ["out/s1.vcf.gz", "out/s2.vcf.gz"],
+    >>>     columns=["ID", "INFO/CAF"],
+    >>> )
+
+The inputs waiting for the annotation records are kept in a heap by their
+next positions, so that the records of the annotation file with no input
+at their positions are skipped by looking only at the top of the heap.
+All the files should be sorted in the same order of contigs. The contigs are
+ordered by the `##contig` lines of the headers. The ones without are ordered
+as the annotation file reaches them: an input waits at such a contig until
+the annotation file reaches it, so without the `##contig` lines, the records
+of an input from a contig missing in the annotation file are not annotated.
+
+The records are matched by CHROM, POS, REF and ALT.
+"""
+import gzip
+import heapq
+from itertools import chain
+from pathlib import Path
+from typing import Any, Iterator, List, Mapping, Sequence, Tuple, Union
+
+from .bgzf import BgzfWriter
+
+# The kinds of columns, and where they are in the records
+SITE_COLUMNS = {"ID": 2, "QUAL": 5, "FILTER": 6}
+COL_INFO = 7
+
+
+def parse_columns(cols: Union[str, Sequence[str]]) -> List[Tuple[str, bool]]:
+    """Parse the columns to transfer, like `-c/--columns` of
+    `bcftools annotate`
+
+    Args:
+        cols: The columns, a list or a comma-separated string.
+            `ID`, `QUAL`, `FILTER`, `INFO/<TAG>` (or `<TAG>`) are supported,
+            prefixed by `+` to only fill the missing values
+
+    Returns:
+        The columns (`ID`, `QUAL`, `FILTER` or the INFO tags as
+        `INFO/<TAG>`) and whether to only fill the missing values
+    """
+    if isinstance(cols, str):
+        cols = cols.split(",")
+
+    out = []
+    for col in cols:
+        col = col.strip()
+        fill = col.startswith("+")
+        col = col.lstrip("+")
+        if col in SITE_COLUMNS or col.startswith("INFO/"):
+            out.append((col, fill))
+        elif col in ("INFO", "FORMAT") or col.startswith(("FORMAT/", "FMT/")):
+            raise ValueError(f"Column not supported: {col}")
+        else:
+            out.append((f"INFO/{col}", fill))
+    return out
+
+
+def _open(path: str, mode: str = "rt") -> Any:
+    """Open a VCF file, could be gzipped (bgzipped for writing)"""
+    if not str(path).endswith(".gz"):
+        return open(path, mode)
+    if "r" in mode:
+        return gzip.open(path, mode)
+    return BgzfWriter(path)
+
+
+def _read_header(fin: Any) -> Tuple[List[str], str]:
+    """Read the header lines, and the first record (or '')"""
+    header = []
+    for line in fin:
+        if not line.startswith("#"):
+            return header, line
+        header.append(line)
+    return header, ""
+
+
+def _header_id(line: str) -> str:
+    """The `##INFO=<ID=DP,...>` => `##INFO=<ID=DP`"""
+    return line.split(",", 1)[0].rstrip(">\n")
+
+
+class _ContigOrder(dict):
+    """The ranks of the contigs from the `##contig` lines"""
+
+    def add_header(self, header: Sequence[str]) -> None:
+        """Add the contigs of the `##contig` lines"""
+        for line in header:
+            if line.startswith("##contig=<ID="):
+                self.setdefault(_header_id(line)[13:], len(self))
+
+    def before(self, contig: str, other: str) -> bool:
+        """Whether the contig is known to be before the other one"""
+        return (
+            contig in self and other in self and self[contig] < self[other]
+        )
+
+
+class _SortedCheck:
+    """Check that the records of a file are sorted, with the positions
+    compared within the contigs, and the contigs compared only when their
+    ranks are known"""
+
+    def __init__(self, path: str, order: _ContigOrder):
+        self.path = path
+        self.order = order
+        self.chrom = None
+        self.pos = 0
+        self.seen = set()
+
+    def __call__(self, chrom: str, pos: int) -> None:
+        if chrom == self.chrom:
+            ok = pos >= self.pos
+        else:
+            ok = chrom not in self.seen and (
+                self.chrom is None or not self.order.before(chrom, self.chrom)
+            )
+            self.seen.add(chrom)
+            self.chrom = chrom
+        if not ok:
+            raise ValueError(
+                f"Records not sorted in {self.path}: {chrom}:{pos}"
+            )
+        self.pos = pos
+
+
+class _Input:
+    """An input file and its output file, with the next record"""
+
+    def __init__(self, infile: str, outfile: str):
+        self.infile = infile
+        self.outfile = outfile
+        self.fin = _open(infile)
+        self.header, self.line = _read_header(self.fin)
+        self.fout = None
+        self.chrom = None
+        self.pos = None
+        self.nannotated = 0
+
+    def start(self, order: _ContigOrder, header: Sequence[str]) -> None:
+        """Write the header, with the lines added before `#CHROM`"""
+        self.check = _SortedCheck(self.infile, order)
+        existing = {_header_id(line) for line in self.header}
+        added = [line for line in header if _header_id(line) not in existing]
+        self.fout = _open(self.outfile, "w")
+        self.fout.write("".join(self.header[:-1] + added + self.header[-1:]))
+        self._set_position()
+
+    def _set_position(self) -> None:
+        """Set the contig and the position of the next record"""
+        if not self.line:
+            self.chrom = self.pos = None
+            return
+        chrom, pos, _ = self.line.split("\t", 2)
+        self.chrom = chrom
+        self.pos = int(pos)
+        self.check(self.chrom, self.pos)
+
+    def next(self, annotated: str = None) -> None:
+        """Write the record (or the annotated one) and read the next one"""
+        if annotated is None:
+            self.fout.write(self.line)
+        else:
+            self.fout.write(annotated)
+            self.nannotated += 1
+        self.line = next(self.fin, "")
+        self._set_position()
+
+    def finish(self) -> None:
+        """Write the rest records and close the files"""
+        if self.line:
+            self.fout.write(self.line)
+            for line in self.fin:
+                self.fout.write(line)
+        self.close()
+
+    def close(self, remove: bool = False) -> None:
+        """Close the files, and remove the output file if asked"""
+        self.fin.close()
+        if self.fout is not None:
+            self.fout.close()
+        if remove and Path(self.outfile).exists():
+            Path(self.outfile).unlink()
+
+
+def _parse_info(info: str) -> Mapping[str, Any]:
+    """Parse the INFO field, True for the flags"""
+    out = {}
+    if info == ".":
+        return out
+    for item in info.split(";"):
+        key, eq, value = item.partition("=")
+        out[key] = value if eq else True
+    return out
+
+
+def annotate_record(
+    line: str,
+    annotation: Mapping[str, Any],
+    columns: Sequence[Tuple[str, bool]],
+) -> str:
+    """Annotate a record
+
+    Args:
+        line: The record, with the line break
+        annotation: The values of the columns of the matched annotation
+            record, without the missing ones
+        columns: The columns parsed by `parse_columns()`
+
+    Returns:
+        The annotated record
+    """
+    fields = line.split("\t", COL_INFO + 1)
+    # (the line break is kept with the last field)
+    end = "" if len(fields) > COL_INFO + 1 else "\n"
+    if end:
+        fields[COL_INFO] = fields[COL_INFO].rstrip("\r\n")
+    info = None
+    for col, fill in columns:
+        if col not in annotation:
+            continue
+        value = annotation[col]
+        if col in SITE_COLUMNS:
+            idx = SITE_COLUMNS[col]
+            if not fill or fields[idx] == ".":
+                fields[idx] = value
+            continue
+
+        if info is None:
+            info = _parse_info(fields[COL_INFO])
+        tag = col[5:]
+        if not fill or tag not in info:
+            info[tag] = value
+
+    if info is not None:
+        fields[COL_INFO] = (
+            ";".join(
+                key if value is True else f"{key}={value}"
+                for key, value in info.items()
+            )
+            or "."
+        )
+    return "\t".join(fields) + end
+
+
+def _annotation_values(
+    fields: Sequence[str],
+    columns: Sequence[Tuple[str, bool]],
+) -> Mapping[str, Any]:
+    """The values of the columns of an annotation record"""
+    info = None
+    out = {}
+    for col, _ in columns:
+        if col in SITE_COLUMNS:
+            value = fields[SITE_COLUMNS[col]]
+            if value != ".":
+                out[col] = value
+            continue
+
+        if info is None:
+            info = _parse_info(
+                fields[COL_INFO].rstrip("\r\n") if len(fields) > COL_INFO
+                else "."
+            )
+        if col[5:] in info and info[col[5:]] != ".":
+            out[col] = info[col[5:]]
+    return out
+
+
+def _iter_annotation(fin: Any, first: str) -> Iterator[Tuple[str, str, str]]:
+    """Iterate over the records of the annotation file
+
+    Yields:
+        The CHROM, POS and the record
+    """
+    if not first:
+        return
+    for line in chain([first], fin):
+        chrom, pos, _ = line.split("\t", 2)
+        yield chrom, pos, line
+
+
+def annotate_vcfs(
+    infiles: Sequence[str],
+    annfile: str,
+    outfiles: Sequence[str],
+    columns: Union[str, Sequence[str]],
+    header: Sequence[str] = (),
+) -> List[int]:
+    """Annotate the VCF files by one annotation VCF file, read once
+
+    Args:
+        infiles: The input VCF files, could be gzipped
+        annfile: The annotation VCF file, could be gzipped
+        outfiles: The output files, bgzipped if ending with `.gz`
+        columns: The columns to transfer, see `parse_columns()`
+        header: The extra header lines to add. The `##INFO`/`##FILTER`
+            lines of the transferred columns are added from the header of
+            the annotation file.
+
+    Returns:
+        The numbers of the annotated records of the files
+    """
+    columns = parse_columns(columns)
+    header = [line if line.endswith("\n") else f"{line}\n" for line in header]
+
+    fann = _open(annfile)
+    ann_header, first = _read_header(fann)
+    tags = {
+        f"##INFO=<ID={col[5:]}" for col, _ in columns if col[:5] == "INFO/"
+    }
+    if any(col == "FILTER" for col, _ in columns):
+        tags.update(
+            _header_id(line)
+            for line in ann_header
+            if line.startswith("##FILTER=")
+        )
+    header = [line for line in ann_header if _header_id(line) in tags] + header
+
+    order = _ContigOrder()
+    order.add_header(ann_header)
+    inputs = []
+    # the contigs the annotation file has passed
+    passed = set()
+    # the current contig of the annotation file
+    contig = None
+    # the inputs at the contig by the positions of their next records
+    heap = []
+
+    def catch_up():
+        """Write the records of the inputs on the contigs before the current
+        one of the annotation file, and put the inputs at it in the heap
+
+        Returns:
+            Whether any input has records left
+        """
+        heap.clear()
+        for i, inp in enumerate(inputs):
+            while inp.line and (
+                inp.chrom in passed or order.before(inp.chrom, contig)
+            ):
+                inp.next()
+            if inp.chrom == contig:
+                heap.append((inp.pos, i))
+        heapq.heapify(heap)
+        return any(inp.line for inp in inputs)
+
+    def apply(pos, group):
+        """Write the records of the inputs at the contig up to the position,
+        with the ones at the position annotated by the group of annotation
+        records"""
+        values = {}
+        while heap and heap[0][0] <= pos:
+            _, i = heap[0]
+            inp = inputs[i]
+            annotated = None
+            if inp.pos == pos and group:
+                _, _, _, ref, alt, _ = inp.line.split("\t", 5)
+                if (ref, alt) not in values and (ref, alt) in group:
+                    values[(ref, alt)] = _annotation_values(
+                        group[(ref, alt)],
+                        columns,
+                    )
+                if values.get((ref, alt)):
+                    annotated = annotate_record(
+                        inp.line, values[(ref, alt)], columns
+                    )
+            inp.next(annotated)
+            if inp.chrom == contig:
+                heapq.heapreplace(heap, (inp.pos, i))
+            else:
+                heapq.heappop(heap)
+
+    group_pos = None
+    group = {}
+    check = _SortedCheck(annfile, order)
+    try:
+        for infile, outfile in zip(infiles, outfiles):
+            inputs.append(_Input(infile, outfile))
+            order.add_header(inputs[-1].header)
+        for inp in inputs:
+            inp.start(order, header)
+
+        for chrom, pos, line in _iter_annotation(fann, first):
+            pos = int(pos)
+            check(chrom, pos)
+            if chrom != contig or pos != group_pos:
+                if group:
+                    apply(group_pos, group)
+                    group = {}
+                group_pos = pos
+            if chrom != contig:
+                if contig is not None:
+                    passed.add(contig)
+                contig = chrom
+                if not catch_up():
+                    # all the inputs are done
+                    break
+            # only the records at the positions the inputs could reach
+            if heap and heap[0][0] <= pos:
+                fields = line.split("\t", COL_INFO + 1)
+                group[(fields[3], fields[4])] = fields
+        if group:
+            apply(group_pos, group)
+
+        for inp in inputs:
+            inp.finish()
+    except BaseException:
+        for inp in inputs:
+            inp.close(remove=True)
+        raise
+    finally:
+        fann.close()
+    return [inp.nannotated for inp in inputs]
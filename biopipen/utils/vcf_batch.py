@@ -0,0 +1,595 @@
+"""Evaluate the filters of VCF records by blocks, with NumPy arrays
+
+Instead of calling the filters for each variant with a cyvcf2 `Variant`,
+the records are read as text by blocks and the filters are called once
+for each block with a `VariantBlock`, whose fields are NumPy arrays,
+parsed on demand:
+
+    lambda block: block.QUAL >= 30
+    lambda block: block.INFO.get("DP", 0) > 10
+    lambda block: (block.format("DP") >= 10).all(axis=1)
+    lambda block: (block.gt_types == HOM_ALT).any(axis=1)
+
+The filters return boolean arrays, with `False` for the variants to be
+filtered out. Only the FILTER column of the records failing the filters is
+rewritten, the other records are written as they are.
+"""
+import gzip
+from itertools import islice
+from os import PathLike
+from typing import (
+    Any,
+    AnyStr,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Sequence,
+    Union,
+)
+
+import numpy
+
+try:
+    from functools import cached_property
+except ImportError:  # pragma: no cover, python < 3.8
+
+    def cached_property(func):
+        """Compute the property once and save it to the instance"""
+        name = f"_cached_{func.__name__}"
+
+        def getter(self):
+            if name not in self.__dict__:
+                self.__dict__[name] = func(self)
+            return self.__dict__[name]
+
+        getter.__doc__ = func.__doc__
+        return property(getter)
+
+
+# The genotype types, the same as cyvcf2 (`gts012=False`)
+HOM_REF = 0
+HET = 1
+UNKNOWN = 2
+HOM_ALT = 3
+
+# The columns of the records
+(
+    COL_CHROM,
+    COL_POS,
+    COL_ID,
+    COL_REF,
+    COL_ALT,
+    COL_QUAL,
+    COL_FILTER,
+    COL_INFO,
+    COL_FORMAT,
+    COL_SAMPLES,
+) = range(10)
+
+
+# Split the records of a block at once if they have no more columns than
+# this, otherwise split the fixed columns of each record
+FLAT_SPLIT_MAX_COLUMNS = 16
+
+
+def _float32(values: numpy.ndarray) -> numpy.ndarray:
+    """Round the non-integer values to the precision of float32, as
+    htslib/cyvcf2 store them, so that i.e. `AF=0.1` is greater than 0.1
+    in both ways"""
+    return numpy.where(
+        values == numpy.floor(values),
+        values,
+        values.astype(numpy.float32),
+    )
+
+
+def _to_array(
+    values: List[Any],
+    default: Any,
+    multiple: bool = False,
+) -> numpy.ndarray:
+    """Convert the values to a numeric array if possible
+
+    The missing values (None or '.') are replaced by the default, and the
+    multiple values (i.e. `AF=0.1,0.2`) are taken by the first one, unless
+    `multiple` is True, with which they are all kept in a 2D array, padded
+    with `nan` (the strings are kept as they are).
+    """
+    if None not in values:
+        try:
+            return _float32(numpy.array(values, dtype=float))
+        except (TypeError, ValueError):
+            pass
+
+    if multiple and any(val is not None and "," in val for val in values):
+        rows = [
+            [default] if val is None else
+            [numpy.nan if item == "." else item for item in val.split(",")]
+            for val in values
+        ]
+        width = max(len(row) for row in rows)
+        try:
+            return _float32(
+                numpy.array(
+                    [row + [numpy.nan] * (width - len(row)) for row in rows],
+                    dtype=float,
+                )
+            )
+        except (TypeError, ValueError):
+            pass
+
+    values = [
+        default if val is None or val == "."
+        else val if multiple
+        else val.partition(",")[0]
+        for val in values
+    ]
+    try:
+        return _float32(numpy.array(values, dtype=float))
+    except (TypeError, ValueError):
+        return numpy.array(values, dtype=object)
+
+
+def _gt_type(gt: str) -> int:
+    """The type of a genotype"""
+    alleles = set((gt or ".").replace("|", "/").split("/"))
+    if "." in alleles:
+        return UNKNOWN
+    if len(alleles) > 1:
+        return HET
+    if alleles == {"0"}:
+        return HOM_REF
+    return HOM_ALT
+
+
+class _BlockInfo:
+    """The INFO fields of a block, as arrays"""
+
+    def __init__(self, block: "VariantBlock"):
+        self._block = block
+        self._arrays = {}
+
+    def _flags(self, key: str) -> numpy.ndarray:
+        """Whether the variants have the field"""
+        key = f";{key};"
+        return numpy.array(
+            [
+                key in f";{info};" or f"{key[:-1]}=" in f";{info}"
+                for info in self._block.column(COL_INFO)
+            ]
+        )
+
+    def get(
+        self,
+        key: str,
+        default: Any = numpy.nan,
+        multiple: bool = False,
+    ) -> numpy.ndarray:
+        """Get the values of an INFO field of the variants
+
+        Args:
+            key: The name of the field
+            default: The value for the variants without the field
+            multiple: Keep all the values of the multi-value fields (i.e.
+                `AF=0.1,0.2`) in a 2D array, padded with `nan`, instead of
+                the first ones
+
+        Returns:
+            The values, numeric if possible. Flags are returned as booleans.
+        """
+        cache_key = (key, default, multiple)
+        if cache_key in self._arrays:
+            return self._arrays[cache_key]
+
+        prefix = f"{key}="
+        inner = f";{prefix}"
+        values = []
+        for info in self._block.column(COL_INFO):
+            if info.startswith(prefix):
+                start = len(prefix)
+            else:
+                start = info.find(inner)
+                if start == -1:
+                    values.append(None)
+                    continue
+                start += len(inner)
+            end = info.find(";", start)
+            values.append(info[start:] if end == -1 else info[start:end])
+
+        if all(value is None for value in values):
+            flags = self._flags(key)
+            out = (
+                flags if flags.any()
+                else _to_array(values, default, multiple)
+            )
+        else:
+            out = _to_array(values, default, multiple)
+        self._arrays[cache_key] = out
+        return out
+
+    def __getitem__(self, key: str) -> numpy.ndarray:
+        return self.get(key)
+
+    def has(self, key: str) -> numpy.ndarray:
+        """Whether the variants have the field, as a boolean array"""
+        return self._flags(key)
+
+
+class VariantBlock:
+    """A block of VCF records, with the fields as arrays parsed on demand
+
+    Args:
+        lines: The records, without the line breaks
+        samples: The samples in the VCF file
+    """
+
+    def __init__(self, lines: List[str], samples: List[str] = ()):
+        self.lines = lines
+        self.samples = list(samples)
+        self.ncols = COL_SAMPLES + len(self.samples) if samples else COL_FORMAT
+        self.INFO = _BlockInfo(self)
+        self._formats = {}
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    @cached_property
+    def _columns(self) -> List[List[str]]:
+        """The columns of the records. The samples are in the last column,
+        not split, for the records with many columns."""
+        ncols = self.ncols
+        if ncols <= FLAT_SPLIT_MAX_COLUMNS:
+            fields = "\t".join(self.lines).split("\t")
+            if len(fields) == len(self.lines) * ncols:
+                return [fields[i::ncols] for i in range(ncols)]
+
+        rows = [line.split("\t", COL_SAMPLES) for line in self.lines]
+        return [
+            [row[i] if i < len(row) else "" for row in rows]
+            for i in range(min(ncols, COL_SAMPLES + 1))
+        ]
+
+    @cached_property
+    def _sample_columns(self) -> List[List[str]]:
+        """The values of the samples, a list for each sample"""
+        if not self.samples:
+            return []
+        if len(self._columns) == self.ncols:
+            return self._columns[COL_SAMPLES:]
+        rows = [calls.split("\t") for calls in self._columns[COL_SAMPLES]]
+        return [
+            [row[i] if i < len(row) else "." for row in rows]
+            for i in range(len(self.samples))
+        ]
+
+    def column(self, index: int) -> List[str]:
+        """The values of a fixed column (CHROM to FORMAT) of the records"""
+        return self._columns[index]
+
+    @cached_property
+    def CHROM(self) -> numpy.ndarray:
+        return numpy.array(self.column(COL_CHROM), dtype=object)
+
+    @cached_property
+    def POS(self) -> numpy.ndarray:
+        return numpy.array(self.column(COL_POS), dtype=numpy.int64)
+
+    @cached_property
+    def ID(self) -> numpy.ndarray:
+        return numpy.array(self.column(COL_ID), dtype=object)
+
+    @cached_property
+    def REF(self) -> numpy.ndarray:
+        return numpy.array(self.column(COL_REF), dtype=object)
+
+    @cached_property
+    def ALT(self) -> List[List[str]]:
+        """The alternative alleles of the variants, `[]` for `.`"""
+        return [
+            [] if alt == "." else alt.split(",")
+            for alt in self.column(COL_ALT)
+        ]
+
+    @cached_property
+    def QUAL(self) -> numpy.ndarray:
+        """The QUAL of the variants, `nan` for `.`"""
+        return _to_array(self.column(COL_QUAL), numpy.nan)
+
+    @cached_property
+    def FILTER(self) -> numpy.ndarray:
+        """The FILTER of the variants, None for `PASS` or `.`, like cyvcf2"""
+        return numpy.array(
+            [
+                None if filt == "." or filt == "PASS" else filt
+                for filt in self.column(COL_FILTER)
+            ],
+            dtype=object,
+        )
+
+    @cached_property
+    def is_snp(self) -> numpy.ndarray:
+        """Whether the variants are SNPs (all alleles are single bases)"""
+        return numpy.array(
+            [
+                # all single-base alleles separated by commas
+                len(ref) == 1 and len(alt) == 2 * alt.count(",") + 1
+                for ref, alt in zip(
+                    self.column(COL_REF), self.column(COL_ALT)
+                )
+            ]
+        )
+
+    def format(
+        self,
+        key: str,
+        default: Any = numpy.nan,
+        multiple: bool = False,
+    ) -> numpy.ndarray:
+        """Get the values of a FORMAT field of the samples
+
+        Args:
+            key: The name of the field
+            default: The value for the samples without the field
+            multiple: Keep all the values of the multi-value fields (i.e.
+                `AD=3,5`), with shape (variants, samples * values), padded
+                with `nan`, instead of the first ones
+
+        Returns:
+            The values with shape (variants, samples), numeric if possible.
+        """
+        cache_key = (key, default, multiple)
+        if cache_key in self._formats:
+            return self._formats[cache_key]
+
+        formats = self.column(COL_FORMAT) if self.samples else []
+        indexes = {}
+        for fmt in set(formats):
+            keys = fmt.split(":")
+            indexes[fmt] = keys.index(key) if key in keys else -1
+        indexes = [indexes[fmt] for fmt in formats]
+
+        values = []
+        for calls in self._sample_columns:
+            for idx, call in zip(indexes, calls):
+                if idx == -1:
+                    values.append(None)
+                    continue
+                parts = call.split(":", idx + 1)
+                values.append(parts[idx] if idx < len(parts) else None)
+
+        out = _to_array(values, default, multiple)
+        if out.ndim == 2:
+            # (samples * variants, values) => (variants, samples * values)
+            out = (
+                out.reshape(len(self.samples), len(self), -1)
+                .transpose(1, 0, 2)
+                .reshape(len(self), -1)
+            )
+        else:
+            out = out.reshape(len(self.samples), len(self)).T
+        self._formats[cache_key] = out
+        return out
+
+    @cached_property
+    def gt_types(self) -> numpy.ndarray:
+        """The genotype types of the samples, with shape (variants, samples)
+
+        HOM_REF (0), HET (1), UNKNOWN (2) and HOM_ALT (3), like cyvcf2
+        """
+        gts = self.format("GT", None)
+        types = {gt: _gt_type(gt) for gt in set(gts.ravel().tolist())}
+        return numpy.array(
+            [types[gt] for gt in gts.ravel().tolist()],
+            dtype=numpy.int8,
+        ).reshape(gts.shape)
+
+
+def SNPONLY(block: VariantBlock, nonrev: bool = True) -> numpy.ndarray:
+    """Keep or remove SNPs only"""
+    return block.is_snp if nonrev else ~block.is_snp
+
+
+def QUAL(block: VariantBlock, cutoff, nonrev: bool = True) -> numpy.ndarray:
+    """Filter variants with QUAL above or below cutoff"""
+    ret = block.QUAL >= cutoff
+    return ret if nonrev else ~ret
+
+
+BUILTIN_FILTERS = {"SNPONLY": SNPONLY, "QUAL": QUAL}
+
+
+def iter_records(infile: Union[str, PathLike]) -> Iterator[str]:
+    """Iterate over the records of a VCF file, could be (b)gzipped
+
+    Yields:
+        The records without the line breaks
+    """
+    opener = gzip.open if str(infile).endswith(".gz") else open
+    with opener(infile, "rt") as fin:
+        for line in fin:
+            if not line.startswith("#"):
+                yield line.rstrip("\r\n")
+
+
+def sample_indexes(
+    samples: Sequence[str],
+    selection: Union[str, Sequence[str]],
+) -> List[int]:
+    """Get the indexes of the selected samples, like `-s/--samples` of
+    bcftools
+
+    Args:
+        samples: The samples in the VCF file
+        selection: The samples to keep, a list or a comma-separated string.
+            Prefixed by `^` (the string or the first one of the list) to
+            exclude them instead.
+
+    Returns:
+        The indexes of the samples to keep, in the order of the file
+
+    Raises:
+        ValueError: When any of the selected samples is not in the file
+    """
+    if isinstance(selection, str):
+        selection = selection.split(",")
+    selection = [sample.strip() for sample in selection if sample.strip()]
+    exclude = bool(selection) and selection[0].startswith("^")
+    if exclude:
+        selection[0] = selection[0][1:]
+        selection = [sample for sample in selection if sample]
+
+    missing = set(selection) - set(samples)
+    if missing:
+        raise ValueError(f"Samples not in the VCF file: {sorted(missing)}")
+    selection = set(selection)
+    return [
+        i
+        for i, sample in enumerate(samples)
+        if (sample in selection) != exclude
+    ]
+
+
+def _runs(indexes: Iterable[int]) -> List[List[int]]:
+    """The runs of the consecutive indexes, as [start, end)"""
+    runs = []
+    for i in indexes:
+        if runs and runs[-1][1] == i:
+            runs[-1][1] = i + 1
+        else:
+            runs.append([i, i + 1])
+    return runs
+
+
+def samples_subsetter(
+    indexes: Sequence[int],
+    nsamples: int,
+) -> Callable[[AnyStr], AnyStr]:
+    """Make a function to keep only the samples of the indexes in a record
+    or the `#CHROM` line, without the FORMAT column if none is kept (like
+    cyvcf2)
+
+    The longest run of the samples all kept or all dropped is not split,
+    but taken (or skipped) as a whole, so that keeping or dropping a few
+    samples of a large cohort is cheap.
+
+    Args:
+        indexes: The sorted indexes of the samples to keep, see
+            `sample_indexes()`
+        nsamples: The number of the samples in the VCF file
+
+    Returns:
+        The function taking a record (text or bytes, with or without the
+        line break) and returning the one with only the samples kept
+    """
+    if len(indexes) == nsamples:
+        return lambda line: line
+
+    kept = [False] * nsamples
+    for i in indexes:
+        kept[i] = True
+    mid_start, mid_end = 0, 0
+    start = 0
+    for i in range(1, nsamples + 1):
+        if i == nsamples or kept[i] != kept[start]:
+            if i - start > mid_end - mid_start:
+                mid_start, mid_end = start, i
+            start = i
+    mid_kept = kept[mid_start]
+    left_runs = _runs(i for i in indexes if i < mid_start)
+    right_runs = _runs(i - mid_end for i in indexes if i >= mid_end)
+
+    def subset(line: AnyStr) -> AnyStr:
+        if isinstance(line, str):
+            tab, crlf = "\t", "\r\n"
+        else:
+            tab, crlf = b"\t", b"\r\n"
+        body = line.rstrip(crlf)
+        ending = line[len(body):]
+        if not indexes:
+            return tab.join(body.split(tab, COL_FORMAT)[:COL_FORMAT]) + ending
+
+        # fixed columns, left samples, the middle run and right samples
+        fields = body.split(tab, COL_SAMPLES + mid_start)
+        right = fields.pop().rsplit(tab, nsamples - mid_end)
+        out = fields[:COL_SAMPLES]
+        for start, end in left_runs:
+            out.extend(fields[COL_SAMPLES + start:COL_SAMPLES + end])
+        if mid_kept:
+            out.append(right[0])
+        for start, end in right_runs:
+            out.extend(right[1 + start:1 + end])
+        return tab.join(out) + ending
+
+    return subset
+
+
+def filter_records(
+    records: Iterable[str],
+    filters: Union[
+        Mapping[str, Callable[[VariantBlock], Any]],
+        Callable[[VariantBlock], Mapping[str, Any]],
+    ],
+    write: Callable[[str], Any],
+    samples: List[str] = (),
+    keep: bool = True,
+    block_size: int = 10_000,
+) -> int:
+    """Filter the records by blocks and write them
+
+    Args:
+        records: The records without the line breaks
+        filters: The filters, returning arrays (or a scalar for all the
+            variants) with `False` for the variants to be filtered out.
+            Or a function evaluating all of them for a block (i.e. a
+            `biopipen.utils.vcf_expr.FilterSet`), returning the arrays
+            by the names of the filters.
+        write: The function to write the text of the records
+        samples: The samples in the VCF file
+        keep: Keep the variants not passing the filters, with their FILTER
+            set. Otherwise they are dropped.
+        block_size: The number of records in a block
+
+    Returns:
+        The number of records written
+    """
+    records = iter(records)
+    nwritten = 0
+    while True:
+        lines = list(islice(records, block_size))
+        if not lines:
+            break
+
+        block = VariantBlock(lines, samples)
+        if callable(filters):
+            passed = filters(block)
+        else:
+            passed = {name: filt(block) for name, filt in filters.items()}
+        failed = {
+            name: ~numpy.broadcast_to(
+                numpy.asarray(ret, dtype=bool), (len(block),)
+            )
+            for name, ret in passed.items()
+        }
+        anyfailed = numpy.zeros(len(block), dtype=bool)
+        for fails in failed.values():
+            anyfailed |= fails
+
+        if keep:
+            out = lines
+            for i in numpy.flatnonzero(anyfailed).tolist():
+                names = [name for name, fails in failed.items() if fails[i]]
+                if block.FILTER[i] is not None:
+                    names.insert(0, block.FILTER[i])
+                cols = lines[i].split("\t", COL_FILTER + 1)
+                cols[COL_FILTER] = ";".join(names)
+                out[i] = "\t".join(cols)
+        else:
+            passed = ~anyfailed & numpy.equal(block.FILTER, None)
+            out = [lines[i] for i in numpy.flatnonzero(passed).tolist()]
+
+        if out:
+            write("\n".join(out) + "\n")
+            nwritten += len(out)
+    return nwritten
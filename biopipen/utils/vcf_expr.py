@@ -0,0 +1,536 @@
+"""Compile the bcftools-like filter expressions of VCF records
+
+    QUAL>=30 && INFO/DP>10
+    TYPE=="snp" || (FMT/GQ>=20 && !INFO/DB)
+
+Supported are:
+- The fields: `CHROM`, `POS`, `ID`, `REF`, `ALT`, `QUAL`, `FILTER`, `TYPE`
+  (`ref`, `snp`, `mnp`, `indel` or `other`), `N_ALT`, `INFO/<key>` and
+  `FMT/<key>` (or `FORMAT/<key>`)
+- Numbers and strings (quoted by `"` or `'`)
+- The comparisons: `==` (or `=`), `!=`, `>`, `>=`, `<`, `<=`
+- The logical operators: `&&` (or `&`), `||` (or `|`), `!` and parentheses
+
+Like bcftools, a comparison with multiple values (i.e. `ALT`, `INFO/AF` with
+`Number=A` or `FMT/DP` of the samples) is true if any value satisfies it,
+and the comparisons with missing values are false (but `!=`). A bare
+`INFO/<key>` or `FMT/<key>` tells whether the field is present.
+
+All the filters (expressions, or functions for the others) are compiled into
+one generated function, evaluated for each variant (cyvcf2 `Variant`) or for
+each block of variants (`biopipen.utils.vcf_batch.VariantBlock`), with the
+fields loaded once for all the filters. The numbers of the variants passing
+and failing each filter, and the time spent on it are given by
+`FilterSet.summary()`, so that the filters can be ordered by their selectivity.
+"""
+import operator
+import re
+import time
+from typing import Any, Callable, List, Mapping, Optional, Tuple, Union
+
+import numpy
+
+# The missing and the end-of-vector integers of htslib
+MISSING_INTS = (-(2 ** 31), -(2 ** 31) + 1)
+
+OPERATORS = {
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+FIELDS = (
+    "CHROM",
+    "POS",
+    "ID",
+    "REF",
+    "ALT",
+    "QUAL",
+    "FILTER",
+    "TYPE",
+    "N_ALT",
+)
+_TOKEN = re.compile(
+    r"""\s*(?:
+    (?P<number>\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)
+    |(?P<string>"[^"]*"|'[^']*')
+    |(?P<op>==|!=|>=|<=|&&|\|\||[=<>!&|()])
+    |(?P<field>(?:INFO|FMT|FORMAT)/[A-Za-z0-9_.]+|[A-Za-z_][A-Za-z0-9_]*)
+    )""",
+    re.VERBOSE,
+)
+
+
+class FilterExpressionError(Exception):
+    """When a filter expression cannot be parsed"""
+
+
+def tokenize(expr: str) -> List[Tuple[str, str]]:
+    """Split the expression into tokens
+
+    Returns:
+        The kinds (number, string, op or field) and the values of the tokens
+    """
+    tokens = []
+    pos = 0
+    expr = expr.rstrip()
+    while pos < len(expr):
+        match = _TOKEN.match(expr, pos)
+        if not match:
+            raise FilterExpressionError(
+                f"Unexpected character at {pos}: {expr!r}"
+            )
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "field":
+            value = value.replace("FORMAT/", "FMT/")
+            if "/" not in value and value not in FIELDS:
+                raise FilterExpressionError(
+                    f"Unknown field {value!r}: {expr!r}"
+                )
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+def uses_samples(expr: str) -> bool:
+    """Whether the expression uses the FORMAT fields of the samples, so
+    that the genotypes have to be decoded to evaluate it"""
+    return any(
+        kind == "field" and value.startswith("FMT/")
+        for kind, value in tokenize(expr)
+    )
+
+
+def parse(expr: str) -> tuple:
+    """Parse the expression into a tree of tuples:
+
+    - `("or", left, right)`, `("and", left, right)`, `("not", operand)`
+    - `("cmp", op, left, right)`
+    - `("field", name)`, `("value", value)`
+    """
+    tokens = tokenize(expr)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else (None, None)
+
+    def take(value=None):
+        nonlocal pos
+        kind, val = peek()
+        if kind is None or (value is not None and val != value):
+            raise FilterExpressionError(
+                f"Expecting {value or 'more'!r} at token {pos}: {expr!r}"
+            )
+        pos += 1
+        return kind, val
+
+    def parse_or():
+        node = parse_and()
+        while peek()[1] in ("||", "|"):
+            take()
+            node = ("or", node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_not()
+        while peek()[1] in ("&&", "&"):
+            take()
+            node = ("and", node, parse_not())
+        return node
+
+    def parse_not():
+        if peek()[1] == "!":
+            take()
+            return ("not", parse_not())
+        return parse_cmp()
+
+    def parse_cmp():
+        node = parse_atom()
+        if peek()[1] in OPERATORS:
+            _, op = take()
+            node = ("cmp", op, node, parse_atom())
+        return node
+
+    def parse_atom():
+        kind, val = take()
+        if val == "(":
+            node = parse_or()
+            take(")")
+            return node
+        if kind == "number":
+            return ("value", float(val))
+        if kind == "string":
+            return ("value", val[1:-1])
+        if kind == "field":
+            return ("field", val)
+        raise FilterExpressionError(
+            f"Unexpected {val!r} at token {pos - 1}: {expr!r}"
+        )
+
+    tree = parse_or()
+    if pos != len(tokens):
+        raise FilterExpressionError(
+            f"Unexpected {tokens[pos][1]!r} at token {pos}: {expr!r}"
+        )
+    return tree
+
+
+def variant_type(ref: str, alts: List[str]) -> str:
+    """The type of a variant, like `TYPE` of bcftools"""
+    if not alts:
+        return "ref"
+    if any(alt.startswith("<") or alt == "*" for alt in alts):
+        return "other"
+    if any(len(alt) != len(ref) for alt in alts):
+        return "indel"
+    return "snp" if len(ref) == 1 else "mnp"
+
+
+def genotypes(variant: Any) -> Optional[List[str]]:
+    """The GT of the samples of a variant as in the records, i.e. `0/1`,
+    `1|0` or `./.`, the same as the ones of the blocks
+
+    `variant.format("GT")` of cyvcf2 gives the BCF-encoded bytes instead.
+    """
+    if "GT" not in variant.FORMAT:
+        return None
+    return [
+        ("|" if gt[-1] else "/").join(
+            "." if allele < 0 else str(allele) for allele in gt[:-1]
+        )
+        for gt in variant.genotypes
+    ]
+
+
+def compare(op: str, left: Any, right: Any) -> bool:
+    """Compare the values of a variant, true if any value satisfies it"""
+    if isinstance(left, numpy.ndarray):
+        left = left.ravel().tolist()
+    elif not isinstance(left, (list, tuple)):
+        # missing or nan
+        if left is None or left != left:
+            return op == "!="
+        return OPERATORS[op](left, right)
+
+    func = OPERATORS[op]
+    missing = True
+    for value in left:
+        # cyvcf2 uses the min int32 (and the next) for missing integers
+        if value is None or value != value or value in MISSING_INTS:
+            continue
+        if func(value, right):
+            return True
+        missing = False
+    return missing and op == "!="
+
+
+def compare_block(op: str, left: Any, right: Any) -> numpy.ndarray:
+    """Compare the values of a block of variants, the same way as
+    `compare()` for each variant
+
+    The values of the samples or the multiple values (2D) are true if any
+    of them satisfies it, and the lists of values (i.e. ALT) are true if
+    any value satisfies it. The missing (`nan`) values are skipped, and
+    the variants with all of them missing are false (but `!=`).
+    """
+    if isinstance(left, list):
+        return numpy.array([compare(op, vals, right) for vals in left])
+    out = numpy.asarray(OPERATORS[op](left, right), dtype=bool)
+    if out.ndim < 2:
+        return out
+    if left.dtype.kind != "f":
+        return out.any(axis=1)
+    present = ~numpy.isnan(left)
+    out = (out & present).any(axis=1)
+    if op == "!=":
+        out |= ~present.any(axis=1)
+    return out
+
+
+# The code to load the fields
+_VARIANT_FIELDS = {
+    "CHROM": "variant.CHROM",
+    "POS": "variant.POS",
+    "ID": "variant.ID",
+    "REF": "variant.REF",
+    "ALT": "variant.ALT",
+    "QUAL": "variant.QUAL",
+    "FILTER": "variant.FILTER or 'PASS'",
+    "TYPE": "variant_type(variant.REF, variant.ALT)",
+    "N_ALT": "len(variant.ALT)",
+}
+_BLOCK_FIELDS = {
+    "CHROM": "block.CHROM",
+    "POS": "block.POS",
+    "ID": "block.ID",
+    "REF": "block.REF",
+    "ALT": "block.ALT",
+    "QUAL": "block.QUAL",
+    "FILTER": "numpy.where(numpy.equal(block.FILTER, None), 'PASS', "
+    "block.FILTER)",
+    "TYPE": "numpy.array([variant_type(ref, alts) for ref, alts in "
+    "zip(block.REF, block.ALT)], dtype=object)",
+    "N_ALT": "numpy.array([len(alts) for alts in block.ALT])",
+}
+
+
+# The fields of a variant never missing, with a single value
+_SCALAR_FIELDS = ("CHROM", "POS", "REF", "TYPE", "N_ALT")
+# The types of the single values to be compared directly
+_SINGLE = (int, float, str)
+
+
+class _Compiler:
+    """Translate the expressions into python code"""
+
+    def __init__(self, block: bool):
+        self.block = block
+        # the code to load the fields => the local variables
+        self.fields = {}
+
+    def field(self, name: str, presence: bool = False) -> str:
+        """The local variable of a field"""
+        if name.startswith("INFO/"):
+            key = name[5:]
+            if presence:
+                code = (
+                    f"block.INFO.has({key!r})"
+                    if self.block
+                    else f"variant.INFO.get({key!r}) is not None"
+                )
+            else:
+                code = (
+                    f"block.INFO.get({key!r}, multiple=True)"
+                    if self.block
+                    else f"variant.INFO.get({key!r})"
+                )
+        elif name.startswith("FMT/"):
+            key = name[4:]
+            if presence:
+                code = (
+                    f"numpy.array([{key!r} in fmt.split(':') "
+                    "for fmt in block.column(8)], dtype=bool)"
+                    if self.block
+                    else f"{key!r} in variant.FORMAT"
+                )
+            elif self.block:
+                code = f"block.format({key!r}, multiple=True)"
+            elif key == "GT":
+                code = "genotypes(variant)"
+            else:
+                code = f"variant.format({key!r})"
+        else:
+            code = (_BLOCK_FIELDS if self.block else _VARIANT_FIELDS)[name]
+        if code not in self.fields:
+            self.fields[code] = f"_f{len(self.fields)}"
+        return self.fields[code]
+
+    def code(self, node: tuple) -> str:
+        """The python code of the node"""
+        kind = node[0]
+        if kind in ("or", "and"):
+            left, right = self.code(node[1]), self.code(node[2])
+            if self.block:
+                return f"({left} {'|' if kind == 'or' else '&'} {right})"
+            return f"({left} {kind} {right})"
+        if kind == "not":
+            operand = self.code(node[1])
+            if self.block:
+                return f"numpy.logical_not({operand})"
+            return f"(not {operand})"
+        if kind == "cmp":
+            _, op, left, right = node
+            if left[0] != "field" and right[0] == "field":
+                # 30 <= QUAL => QUAL >= 30
+                op = {">": "<", ">=": "<=", "<": ">", "<=": ">="}.get(op, op)
+                left, right = right, left
+            if left[0] != "field":
+                return repr(OPERATORS[op](left[1], right[1]))
+            var = self.field(left[1])
+            if self.block:
+                return f"compare_block({op!r}, {var}, {right[1]!r})"
+            pyop = "==" if op == "=" else op
+            if left[1] in _SCALAR_FIELDS:
+                return f"({var} {pyop} {right[1]!r})"
+            if left[1] in ("QUAL", "FILTER") or left[1].startswith("INFO/"):
+                # inline the comparison of the single values (QUAL or
+                # INFO/DP for example), which are the most of the cases
+                return (
+                    f"({var} {pyop} {right[1]!r} "
+                    f"if type({var}) in _SINGLE else "
+                    f"compare({op!r}, {var}, {right[1]!r}))"
+                )
+            return f"compare({op!r}, {var}, {right[1]!r})"
+        if kind == "field":
+            # bare INFO/FMT fields for presence
+            if node[1].startswith(("INFO/", "FMT/")):
+                return self.field(node[1], presence=True)
+            raise FilterExpressionError(
+                f"Field {node[1]!r} needs a comparison."
+            )
+        raise FilterExpressionError(f"A value is not a filter: {node[1]!r}")
+
+
+class FilterSet:
+    """The filters compiled into one function
+
+    Args:
+        filters: The filters by names, either the expressions or the
+            functions taking a variant (or a block of variants) and
+            returning False (or the arrays with False) for the variants
+            to be filtered out
+        block: Whether the filters are evaluated for the blocks of
+            variants (`VariantBlock`), instead of each variant
+        stop_on_fail: Stop evaluating the other filters for a variant once
+            it fails one (i.e. when the failed ones are not kept).
+            Only for the variants, not the blocks.
+    """
+
+    def __init__(
+        self,
+        filters: Mapping[str, Union[str, Callable]],
+        block: bool = False,
+        stop_on_fail: bool = False,
+    ):
+        self.names = list(filters)
+        self.block = block
+        self.descs = [
+            filt if isinstance(filt, str) else filt.__doc__ or filt.__name__
+            for filt in filters.values()
+        ]
+        # evaluated, passed and failed
+        self._counts = [[0, 0, 0] for _ in self.names]
+        self._seconds = [0.0] * len(self.names)
+        self.source = self._generate(filters, stop_on_fail)
+
+        namespace = {
+            "numpy": numpy,
+            "compare": compare,
+            "compare_block": compare_block,
+            "genotypes": genotypes,
+            "_SINGLE": _SINGLE,
+            "variant_type": variant_type,
+            "clock": time.perf_counter,
+            "counts": self._counts,
+            "seconds": self._seconds,
+        }
+        for i, filt in enumerate(filters.values()):
+            if not isinstance(filt, str):
+                namespace[f"_func{i}"] = filt
+        exec(compile(self.source, "<filters>", "exec"), namespace)
+        self._evaluate = namespace["evaluate"]
+
+    def _generate(
+        self,
+        filters: Mapping[str, Union[str, Callable]],
+        stop_on_fail: bool,
+    ) -> str:
+        """Generate the source code of the function"""
+        compiler = _Compiler(self.block)
+        arg = "block" if self.block else "variant"
+        lines = [
+            f"def evaluate({arg}):",
+            "    out = []",
+            "    start = clock()",
+        ]
+        for i, filt in enumerate(filters.values()):
+            loaded = len(compiler.fields)
+            if isinstance(filt, str):
+                check = compiler.code(parse(filt))
+            else:
+                check = f"_func{i}({arg})"
+            # load the fields first used by this filter, so that the time
+            # is counted for it, and they are not loaded if not needed
+            for code, var in list(compiler.fields.items())[loaded:]:
+                lines.append(f"    {var} = {code}")
+
+            if self.block:
+                lines.extend(
+                    [
+                        "    passed = numpy.broadcast_to(",
+                        f"        numpy.asarray({check}, dtype=bool),",
+                        "        (len(block),),",
+                        "    )",
+                        "    npassed = int(passed.sum())",
+                        f"    counts[{i}][0] += len(block)",
+                        f"    counts[{i}][1] += npassed",
+                        f"    counts[{i}][2] += len(block) - npassed",
+                        "    out.append(passed)",
+                    ]
+                )
+            else:
+                lines.extend(
+                    [
+                        f"    counts[{i}][0] += 1",
+                        f"    if {check}:",
+                        f"        counts[{i}][1] += 1",
+                        "    else:",
+                        f"        counts[{i}][2] += 1",
+                        f"        out.append({self.names[i]!r})",
+                    ]
+                )
+            lines.extend(
+                [
+                    "    end = clock()",
+                    f"    seconds[{i}] += end - start",
+                    "    start = end",
+                ]
+            )
+            if stop_on_fail and not self.block:
+                lines.extend(["    if out:", "        return out"])
+        lines.append("    return out")
+        return "\n".join(lines) + "\n"
+
+    def __call__(self, record: Any) -> Union[List[str], Mapping[str, Any]]:
+        """Evaluate the filters
+
+        Args:
+            record: The variant, or the block of variants
+
+        Returns:
+            The names of the filters the variant fails, or for a block,
+            the boolean arrays of the filters (True for passing)
+        """
+        out = self._evaluate(record)
+        if self.block:
+            return dict(zip(self.names, out))
+        return out
+
+    def reset(self) -> None:
+        """Reset the numbers and the time of the filters"""
+        for i in range(len(self.names)):
+            self._counts[i][:] = [0, 0, 0]
+            self._seconds[i] = 0.0
+
+    def summary(self) -> Mapping[str, Mapping[str, Any]]:
+        """The numbers of the variants evaluated, passing and failing, and
+        the time spent (seconds) of each filter"""
+        return {
+            name: {
+                "filter": self.descs[i],
+                "evaluated": self._counts[i][0],
+                "passed": self._counts[i][1],
+                "failed": self._counts[i][2],
+                "seconds": self._seconds[i],
+            }
+            for i, name in enumerate(self.names)
+        }
+
+
+def merge_summaries(
+    summaries: List[Mapping[str, Mapping[str, Any]]]
+) -> Mapping[str, Mapping[str, Any]]:
+    """Merge the summaries of the filter sets, i.e. from parallel workers"""
+    out = {}
+    for summary in summaries:
+        for name, stats in summary.items():
+            if name not in out:
+                out[name] = dict(stats)
+                continue
+            for key in ("evaluated", "passed", "failed", "seconds"):
+                out[name][key] += stats[key]
+    return out
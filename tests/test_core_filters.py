@@ -0,0 +1,53 @@
+import tempfile
+from pathlib import Path
+
+import cmdy
+from biopipen.core.filters import dict_to_cli_args, r
+
+CASES = [
+    {"a": 1, "ab": 2},
+    {"a": True, "ab": False, "abc": True},
+    {"a": [1, 2], "ab": ["x", "y"]},
+    {"a": [1, 2], "_dupkey": True},
+    {"ab": 1, "a": 2, "_sep": "auto"},
+    {"ab": 1, "_prefix": "-"},
+    {"in_file": "x.vcf", "_": ["pos1", "pos2"]},
+    {"": "sub", "RECOVER_SWAPPED_REF_ALT": True, "_prefix": "--"},
+    {},
+]
+
+
+def run(dic):
+    print(f">>> TESTING {dic}")
+    expect = cmdy.echo(dic).stdout.strip()
+    out = dict_to_cli_args(dic)
+    assert out == expect, f"{out!r} != {expect!r}"
+    # memoized
+    assert dict_to_cli_args(dic) == expect
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_r_sidecar():
+    print(">>> TESTING r with sidecar files")
+    sidecar = Path(tempfile.mkdtemp())
+    genes = [f"GENE{i}" for i in range(100)]
+    out1 = r({"genes": genes, "n": 1}, sidecar=sidecar, threshold=100)
+    out2 = r({"genes": genes, "n": 2}, sidecar=sidecar, threshold=100)
+    files = list(sidecar.glob("r_sidecar_*.txt"))
+    # identical payloads shared
+    assert len(files) == 1, files
+    assert files[0].read_text().splitlines() == genes
+    assert out1.startswith("list(`genes`=scan(") and out1.endswith(",`n`=1)")
+    assert out2.endswith(",`n`=2)")
+    # small or special vectors are kept inline
+    assert r([1, 2], sidecar=sidecar, threshold=100) == "c(1,2)"
+    assert r(["TRUE"] * 50, sidecar=sidecar, threshold=10).startswith("c(")
+    print(">>> PASSED")
+    print(">>> ")
+
+
+if __name__ == "__main__":
+    for case in CASES:
+        run(case)
+    run_r_sidecar()
@@ -0,0 +1,25 @@
+from biopipen.core.proc import Proc
+from biopipen.core.template import TemplateLiquidCached
+
+
+def run():
+    print(">>> TESTING compiled template cache")
+    TemplateLiquidCached.cache_clear()
+    opts = Proc.template_opts
+    tpl1 = TemplateLiquidCached("{{in.a | dict_to_cli_args}}", **opts)
+    # options copied by pipen for each process
+    tpl2 = TemplateLiquidCached(
+        "{{in.a | dict_to_cli_args}}",
+        **{**opts, "filters": opts["filters"].copy()},
+    )
+    tpl3 = TemplateLiquidCached("{{in.a}}", **opts)
+    assert tpl1.engine is tpl2.engine
+    assert tpl3.engine is not tpl1.engine
+    assert tpl2.render({"in": {"a": {"b": 1}}}) == "-b 1"
+    assert TemplateLiquidCached.cache_info() == (1, 2, 2)
+    print(">>> PASSED")
+    print(">>> ")
+
+
+if __name__ == "__main__":
+    run()
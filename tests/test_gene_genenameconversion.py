@@ -31,6 +31,19 @@ GeneNameConversion3 = Proc.from_proc(
     },
 )
 
+GeneNameConversion5 = Proc.from_proc(
+    GeneNameConversion,
+    requires=Str2File,
+    envs={
+        "infmt": "reporter",
+        "outfmt": "ensembl.gene,symbol",
+        "output": "replace",
+        "notfound": "skip",
+        "genecol": 1,
+        "chunksize": 2,
+    },
+)
+
 # SHould raise error
 # GeneNameConversion4 = Proc.from_proc(
 #     GeneNameConversion,
@@ -0,0 +1,82 @@
+import gzip
+import io
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from biopipen.utils.bgzf import BLOCK_SIZE, EOF_BLOCK, BgzfWriter, concat
+from biopipen.utils.reference import gztype
+
+
+def run():
+    print(">>> TESTING BgzfWriter")
+    data = b"".join(b"chr1\t%d\t.\tA\tG\n" % i for i in range(100_000))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for threads in (1, 4):
+            outfile = Path(tmpdir) / f"out{threads}.gz"
+            with BgzfWriter(outfile, threads) as fout:
+                for start in range(0, len(data), 1000):
+                    fout.write(data[start:start + 1000])
+            assert gztype(outfile) == "bgzip"
+            assert gzip.decompress(outfile.read_bytes()) == data
+            assert outfile.read_bytes().endswith(EOF_BLOCK)
+            assert outfile.stat().st_size < len(data) / 2
+
+        # same blocks regardless of the threads
+        assert (
+            Path(tmpdir, "out1.gz").read_bytes()
+            == Path(tmpdir, "out4.gz").read_bytes()
+        )
+
+    buffer = io.BytesIO()
+    with BgzfWriter(buffer, 2) as fout:
+        fout.write("text")
+    assert gzip.decompress(buffer.getvalue()) == b"text"
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_cli():
+    print(">>> TESTING python -m biopipen.utils.bgzf")
+    data = b"x" * (BLOCK_SIZE * 3 + 10)
+    out = subprocess.run(
+        [sys.executable, "-m", "biopipen.utils.bgzf", "-@", "2", "-c"],
+        input=data,
+        stdout=subprocess.PIPE,
+        check=True,
+    ).stdout
+    assert gzip.decompress(out) == data
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_concat():
+    print(">>> TESTING concat")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        parts = []
+        for i, eof in enumerate((False, True, False)):
+            part = Path(tmpdir) / f"part{i}.gz"
+            with BgzfWriter(part, eof=eof) as fout:
+                fout.write(f"part{i}\n" * 20_000)
+            assert part.read_bytes().endswith(EOF_BLOCK) == eof
+            parts.append(part)
+
+        outfile = Path(tmpdir) / "out.gz"
+        concat(outfile, parts, header="#header\n")
+        content = outfile.read_bytes()
+        assert gztype(outfile) == "bgzip"
+        # only one EOF block at the end
+        assert content.endswith(EOF_BLOCK)
+        assert content.count(EOF_BLOCK) == 1
+        assert gzip.decompress(content).decode() == "#header\n" + "".join(
+            f"part{i}\n" * 20_000 for i in range(3)
+        )
+    print(">>> PASSED")
+    print(">>> ")
+
+
+if __name__ == "__main__":
+    run()
+    run_cli()
+    run_concat()
@@ -0,0 +1,91 @@
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from biopipen.utils.command import command_args, run_pipeline, strcmd
+
+
+def run_args():
+    print(">>> TESTING command_args")
+    args = {
+        "_exe": "bcftools",
+        "_": "in.vcf",
+        "O": "u",
+        "threads": 2,
+        "force": True,
+        "no-version": False,
+        "pair_logic": "all",
+        "c": ["a", "b"],
+    }
+    cmd = command_args(args, "filter")
+    assert cmd == [
+        "bcftools",
+        "filter",
+        "-O",
+        "u",
+        "--threads",
+        "2",
+        "--force",
+        "--pair-logic",
+        "all",
+        "-c",
+        "a",
+        "b",
+        "in.vcf",
+    ]
+    # the same as cmdy
+    import cmdy
+    args = {key: val for key, val in args.items() if key != "_exe"}
+    assert strcmd(cmd) == cmdy.bcftools.filter(**args).h().strcmd
+    assert command_args({"_exe": "x", "c": ["a", "b"], "_dupkey": True}) == [
+        "x",
+        "-c",
+        "a",
+        "-c",
+        "b",
+    ]
+    assert command_args({"_exe": "ls", "_": ["a", "b"]}) == ["ls", "a", "b"]
+    assert strcmd(["bcftools", "-i", "QUAL>30"]) == "bcftools -i 'QUAL>30'"
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_pipe():
+    print(">>> TESTING run_pipeline")
+    upper = "import sys; sys.stdout.write(sys.stdin.read().upper())"
+    double = "import sys; sys.stdout.write(sys.stdin.read() * 2)"
+    with tempfile.TemporaryDirectory() as tmpdir:
+        outfile = Path(tmpdir) / "out.txt"
+        with open(outfile, "w") as fout:
+            run_pipeline(
+                [
+                    [sys.executable, "-c", "print('a' * 100000)"],
+                    [sys.executable, "-c", upper],
+                    [sys.executable, "-c", double],
+                ],
+                stdout=fout,
+            )
+        assert outfile.read_text() == ("A" * 100000 + "\n") * 2
+
+        # the failing one is reported, not the upstream ones killed by
+        # the broken pipe
+        try:
+            run_pipeline(
+                [
+                    ["yes"],
+                    [sys.executable, "-c", "import sys; sys.exit(3)"],
+                ],
+                stdout=subprocess.DEVNULL,
+            )
+        except subprocess.CalledProcessError as err:
+            assert err.returncode == 3
+        else:
+            raise AssertionError("Failure not raised")
+    print(">>> PASSED")
+    print(">>> ")
+
+
+if __name__ == "__main__":
+    run_args()
+    run_pipe()
@@ -0,0 +1,67 @@
+import random
+from collections import Counter
+
+from biopipen.utils.downsample import (
+    bernoulli_sample,
+    downsample,
+    reservoir_sample,
+    selection_sample,
+)
+
+
+def run_samplers():
+    print(">>> TESTING the samplers")
+    records = list(range(10_000))
+    rng = random.Random(8525)
+
+    sampled = list(selection_sample(iter(records), 100, len(records), rng))
+    assert len(sampled) == 100
+    assert sampled == sorted(set(sampled))
+    assert list(selection_sample(iter(records[:5]), 10, 5, rng)) == list(
+        range(5)
+    )
+
+    sampled = reservoir_sample(iter(records), 100, rng)
+    assert len(sampled) == 100
+    assert sampled == sorted(set(sampled))
+    assert reservoir_sample(iter(records[:5]), 10, rng) == list(range(5))
+    assert reservoir_sample(iter(records), 0, rng) == []
+
+    sampled = list(bernoulli_sample(iter(records), 0.1, rng))
+    assert 800 < len(sampled) < 1200
+    assert sampled == sorted(sampled)
+
+    # roughly uniform: each record sampled about 10% of the times
+    for sampler in (
+        lambda: selection_sample(iter(range(100)), 10, 100, rng),
+        lambda: reservoir_sample(iter(range(100)), 10, rng),
+    ):
+        counts = Counter()
+        for _ in range(2000):
+            counts.update(sampler())
+        assert len(counts) == 100
+        assert all(100 < count < 300 for count in counts.values()), counts
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_downsample():
+    print(">>> TESTING downsample")
+    records = [f"chr1\t{i}\n" for i in range(1, 1001)]
+    for total in (None, 1000):
+        sampled = list(downsample(iter(records), 50, total=total, seed=1))
+        assert len(sampled) == 50
+        assert sampled == [rec for rec in records if rec in set(sampled)]
+        # reproducible by the seed
+        assert sampled == list(
+            downsample(iter(records), 50, total=total, seed=1)
+        )
+    assert len(list(downsample(iter(records), 0.2, total=1000))) == 200
+    assert 100 < len(list(downsample(iter(records), 0.2))) < 300
+    print(">>> PASSED")
+    print(">>> ")
+
+
+if __name__ == "__main__":
+    run_samplers()
+    run_downsample()
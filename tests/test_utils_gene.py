@@ -1,4 +1,5 @@
-from biopipen.utils.gene import gene_name_conversion
+import pandas
+from biopipen.utils.gene import apply_gene_conversion, gene_name_conversion
 
 
 def run_except(genes, infmt, outfmt, notfound, expect, species):
@@ -24,7 +25,37 @@ def run(genes, infmt, outfmt, notfound, expect, species="human"):
     print(">>> PASSED")
     print(">>> ")
 
+def run_apply():
+    print(">>> TESTING apply_gene_conversion")
+    df = pandas.DataFrame(
+        {
+            "Meta": ["a", "b", "c", "d"],
+            "Id": ["1255_g_at", "1294_at", "nonexist", "1255_g_at"],
+            "symbol": [1, 2, 3, 4],
+        },
+        index=[10, 11, 12, 13],
+    )
+    converted = pandas.DataFrame(
+        {"symbol": ["GUCA1A", "MIR5193"]},
+        index=["1255_g_at", "1294_at"],
+    )
+    out = apply_gene_conversion(df, 1, converted, "keep")
+    assert out.columns.tolist() == ["Meta", "Id", "symbol", "symbol_converted"]
+    assert out.index.tolist() == [10, 11, 13]
+    assert out["symbol_converted"].tolist() == ["GUCA1A", "MIR5193", "GUCA1A"]
+    out = apply_gene_conversion(df, "Id", converted, "drop")
+    assert out.columns.tolist() == ["Meta", "symbol", "symbol_converted"]
+    out = apply_gene_conversion(df, 1, converted, "replace")
+    assert out.columns.tolist() == ["Meta", "symbol_converted", "symbol"]
+    out = apply_gene_conversion(df, 1, converted, "only")
+    assert out.columns.tolist() == ["Id", "symbol"]
+    assert out["symbol"].tolist() == ["GUCA1A", "MIR5193", "GUCA1A"]
+    print(">>> PASSED")
+    print(">>> ")
+
+
 if __name__ == "__main__":
+    run_apply()
     run(
         ['1255_g_at', '1294_at', '1316_at', '1320_at'],
         infmt="reporter",
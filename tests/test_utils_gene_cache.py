@@ -0,0 +1,99 @@
+import tempfile
+import threading
+import time
+
+from biopipen.utils.gene_cache import GeneQueryCache, cached_querymany
+
+
+class Client:
+    """Answers the queries like MyGeneInfo, and records them"""
+
+    def __init__(self):
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def querymany(self, genes, scopes, fields, species, **kwargs):
+        with self.lock:
+            self.queries.extend(genes)
+        out = []
+        for gene in genes:
+            if gene.startswith("NA"):
+                out.append({"query": gene, "notfound": True})
+            else:
+                out.append(
+                    {
+                        "query": gene,
+                        "_id": gene.lower(),
+                        "_score": 10.0,
+                        "symbol": gene.upper(),
+                    }
+                )
+        return out
+
+
+def run():
+    print(">>> TESTING cached_querymany")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = GeneQueryCache(tmpdir)
+        client = Client()
+        genes = [f"g{i % 50}" for i in range(1000)] + ["NA1"]
+        df = cached_querymany(
+            client,
+            genes,
+            "alias",
+            "symbol",
+            species="human",
+            cache=cache,
+            chunk_size=10,
+        )
+        # unique genes only, in chunks
+        assert sorted(client.queries) == sorted(set(genes))
+        assert df["query"].tolist() == list(dict.fromkeys(genes))
+        assert df["symbol"].tolist()[:2] == ["G0", "G1"]
+        assert df["notfound"].tolist()[-1] is True
+
+        # served from the cache, including the genes not found
+        client.queries = []
+        df2 = cached_querymany(
+            client, genes, "alias", "symbol", species="human", cache=cache
+        )
+        assert client.queries == []
+        assert df2.equals(df)
+        # but not by another species
+        cached_querymany(
+            client, ["g1"], "alias", "symbol", species="mouse", cache=cache
+        )
+        assert client.queries == ["g1"]
+
+        # expired
+        client.queries = []
+        cache.ttl = 0
+        cached_querymany(
+            client, ["g1"], "alias", "symbol", species="human", cache=cache
+        )
+        assert client.queries == ["g1"]
+
+        # the least recently used are evicted
+        cache = GeneQueryCache(tmpdir, max_size=2000)
+        cached_querymany(
+            client, genes, "alias", "symbol", species="human", cache=cache
+        )
+        time.sleep(0.01)
+        cached_querymany(
+            client, ["g1"], "alias", "symbol", species="human", cache=cache
+        )
+        assert cache.evict() == 0
+        nrows = cache.con.execute("SELECT COUNT(*) FROM hits").fetchone()[0]
+        assert 0 < nrows < 51
+        client.queries = []
+        cached_querymany(
+            client, ["g1", "g2"], "alias", "symbol", species="human",
+            cache=cache,
+        )
+        assert client.queries == ["g2"]
+    print(">>> PASSED")
+    print(">>> ")
+
+
+if __name__ == "__main__":
+    run()
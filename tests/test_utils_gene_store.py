@@ -0,0 +1,94 @@
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from biopipen.utils.gene_store import GeneStore, build
+
+GENE_INFO = """\
+#tax_id\tGeneID\tSymbol\tLocusTag\tSynonyms\tdbXrefs\tchromosome\tmap_location\tdescription\ttype_of_gene\tSymbol_from_nomenclature_authority
+9606\t1017\tCDK2\t-\tCDKN2|p33(CDK2)\tMIM:116953|HGNC:HGNC:1771|Ensembl:ENSG00000123374\t12\t12q13.2\tcyclin dependent kinase 2\tprotein-coding\tCDK2
+9606\t7849\tPAX8\t-\t-\tMIM:167415|Ensembl:ENSG00000125618\t2\t2q14.1\tpaired box 8\tprotein-coding\tPAX8
+9606\t695\tBTK\t-\tAGMX1|CDK2\tEnsembl:ENSG00000010671\tX\tXq22.1\tBruton tyrosine kinase\tprotein-coding\tBTK
+10090\t12566\tCdk2\t-\t-\tEnsembl:ENSMUSG00000025358\t10\t10 D3\tcyclin-dependent kinase 2\tprotein-coding\t-
+"""  # noqa: E501
+
+GTF = """\
+chr1\tHAVANA\tgene\t11869\t14409\t.\t+\t.\tgene_id "ENSG00000290825.1"; gene_type "lncRNA"; gene_name "DDX11L2";
+chr12\tHAVANA\tgene\t1\t10\t.\t+\t.\tgene_id "ENSG00000123374.11"; gene_type "protein_coding"; gene_name "CDK2";
+"""  # noqa: E501
+
+
+def run():
+    print(">>> TESTING GeneStore.querymany")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        tmpdir.joinpath("gene_info").write_text(GENE_INFO)
+        tmpdir.joinpath("genes.gtf").write_text(GTF)
+        tmpdir.joinpath("alias.txt").write_text("PAX8\tPAX-8\n")
+        dbfile = build(
+            tmpdir / "genes.db",
+            gene_info=[tmpdir / "gene_info"],
+            gtf=[tmpdir / "genes.gtf"],
+            alias=[tmpdir / "alias.txt"],
+            taxid="human",
+        )
+        store = GeneStore(dbfile)
+
+        out = store.querymany(
+            ["CDK2", "cdk2", "PAX-8", "ENSG00000290825", "NOSUCH", "CDK2"],
+            scopes="symbol,alias,ensembl.gene",
+            fields="symbol,entrezgene",
+            species="human",
+            as_dataframe=False,
+        )
+        # duplicated queries are queried once
+        assert [hit["query"] for hit in out] == [
+            "CDK2", "CDK2", "cdk2", "cdk2",
+            "PAX-8", "ENSG00000290825", "NOSUCH",
+        ], out
+        # the symbol match comes before the alias match of BTK
+        assert out[0]["symbol"] == "CDK2"
+        assert out[0]["entrezgene"] == "1017"
+        assert out[1]["symbol"] == "BTK"
+        assert out[0]["_score"] > out[1]["_score"]
+        # case-insensitive, but an exact-case match scores higher
+        assert out[2]["symbol"] == "CDK2"
+        assert out[2]["_score"] < out[0]["_score"]
+        # alias from the alias file
+        assert out[4]["symbol"] == "PAX8"
+        # genes only in the GTF file
+        assert out[5]["symbol"] == "DDX11L2"
+        assert out[5]["entrezgene"] is None
+        assert out[6] == {"query": "NOSUCH", "notfound": True}
+
+        # limited by species
+        out = store.querymany(
+            ["cdk2"],
+            scopes="symbol",
+            fields="ensembl.gene",
+            species="mouse",
+            df_index=True,
+        )
+        assert out.shape[0] == 1
+        assert out.loc["cdk2", "ensembl.gene"] == "ENSMUSG00000025358"
+        assert out.loc["cdk2", "_id"] == "12566"
+
+        # shared by threads
+        def query(species):
+            return store.querymany(
+                ["cdk2"] * 100,
+                scopes="symbol",
+                fields="ensembl.gene",
+                species=species,
+                as_dataframe=False,
+            )[0]["ensembl.gene"]
+
+        with ThreadPoolExecutor(4) as pool:
+            out = list(pool.map(query, ["human", "mouse"] * 20))
+        assert out == ["ENSG00000123374", "ENSMUSG00000025358"] * 20
+    print(">>> PASSED")
+    print(">>> ")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,68 @@
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from biopipen.utils.instrument import RESOURCES_FILE, summarize
+
+SCRIPT = """
+import subprocess
+import sys
+from pathlib import Path
+Path(__file__).with_name("out.txt").write_text("x" * 1000000)
+# a child process, alive for a few samples
+subprocess.run([sys.executable, "-c", "import time; time.sleep(0.5)"])
+sys.exit({returncode})
+"""
+
+
+def instrument(script, *args):
+    """Run the script by `python -m biopipen.utils.instrument run`"""
+    return subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "biopipen.utils.instrument",
+            "run",
+            *args,
+            "--",
+            sys.executable,
+            str(script),
+        ]
+    ).returncode
+
+
+def run_run():
+    print(">>> TESTING instrument run")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for returncode in (0, 3):
+            jobdir = Path(tmpdir) / "Proc" / str(returncode)
+            jobdir.mkdir(parents=True)
+            script = jobdir / "job.script"
+            script.write_text(SCRIPT.format(returncode=returncode))
+            assert instrument(script, "--interval", "0.1") == returncode
+
+            records = json.loads(jobdir.joinpath(RESOURCES_FILE).read_text())
+            assert records["cmd"] == [sys.executable, str(script)]
+            assert records["returncode"] == returncode
+            assert records["wall_time"] >= 0.5
+            assert records["user_time"] >= 0
+            assert records["sys_time"] >= 0
+            assert records["max_rss_kb"] > 0
+            if sys.platform.startswith("linux"):
+                assert records["peak_tree_rss_kb"] >= records["max_rss_kb"]
+                assert records["n_children"] >= 1
+                assert records["max_concurrent_children"] >= 1
+                assert records["write_chars"] >= 1000000
+
+        summary = summarize(tmpdir)
+        assert summary["Proc"]["njobs"] == 2
+        assert summary["Proc"]["nfailed"] == 1
+        assert summary["Proc"]["wall_time_max"] >= 0.5
+    print(">>> PASSED")
+    print(">>> ")
+
+
+if __name__ == "__main__":
+    run_run()
@@ -0,0 +1,202 @@
+import gzip
+import tempfile
+from pathlib import Path
+
+from biopipen.core.config import config
+from biopipen.utils.liftover import (
+    DELETED,
+    DUPLICATED,
+    LIFTED,
+    PARTIAL,
+    ChainMap,
+    FastaFile,
+    liftover_bed,
+    liftover_vcf,
+    load_chain,
+)
+
+# chr1:0-100 -> chrA:0-100, chr1:100-300 -> chrA:150-350,
+# chr1:310-1000 -> chrA:350-1040, chr1:900-1000 -> chrC:0-100 (duplicated),
+# chr2:0-500 -> chrB:0-500 (negative strand)
+CHAIN = """chain 1000 chr1 1000 + 0 1000 chrA 1100 + 0 1040 1
+100 0 50
+200 10 0
+690
+
+chain 500 chr2 500 + 0 500 chrB 600 - 100 600 2
+500
+
+chain 10 chr1 1000 + 900 1000 chrC 100 + 0 100 3
+100
+"""
+VCF_HEADER = (
+    "##fileformat=VCFv4.2\n"
+    "##contig=<ID=chr1,length=1000>\n"
+    "##contig=<ID=chr2,length=500>\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+)
+
+
+def run_lift():
+    print(">>> TESTING ChainMap.lift")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        chainfile = tmpdir / "test.chain.gz"
+        with gzip.open(chainfile, "wt") as fout:
+            fout.write(CHAIN)
+
+        config.path.liftover_cache = str(tmpdir / "cache")
+        load_chain(chainfile)
+        cached = load_chain(chainfile)
+        # memory-mapped from the cache
+        assert type(cached.blocks).__name__ == "memmap"
+        assert cached.contigs == ["chr1", "chr2"]
+        assert cached.qsizes() == {"chrA": 1100, "chrB": 600, "chrC": 100}
+
+        for chain in (ChainMap.from_chain(chainfile), cached):
+            result = chain.lift(
+                ["chr1", "chr1", "chr1", "chr1", "chr2", "chr3", "chr1"],
+                [10, 90, 295, 950, 10, 10, 300],
+                [20, 110, 315, 960, 20, 20, 310],
+            )
+            assert result.reason.tolist() == [
+                LIFTED,
+                LIFTED,
+                PARTIAL,
+                DUPLICATED,
+                LIFTED,
+                DELETED,
+                DELETED,
+            ]
+            assert [chain.qcontigs[i] for i in result.contig[[0, 1, 4]]] == [
+                "chrA",
+                "chrA",
+                "chrB",
+            ]
+            assert result.start[[0, 1, 4]].tolist() == [10, 90, 480]
+            assert result.end[[0, 1, 4]].tolist() == [20, 160, 490]
+            assert result.negative[[0, 1, 4]].tolist() == [False, False, True]
+
+            # half of the bases aligned
+            result = chain.lift(["chr1"], [295], [315], min_match=0.5)
+            assert result.reason.tolist() == [LIFTED]
+            assert result.start.tolist() == [345]
+            assert result.end.tolist() == [355]
+
+            # empty intervals
+            result = chain.lift(["chr1", "chr2"], [50, 10], [50, 10])
+            assert result.start.tolist() == [50, 490]
+            assert result.end.tolist() == [50, 490]
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_liftover_bed():
+    print(">>> TESTING liftover_bed")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        chainfile = tmpdir / "test.chain"
+        chainfile.write_text(CHAIN)
+        inbed = tmpdir / "in.bed"
+        inbed.write_text(
+            "track name=test\n"
+            "chr1\t10\t20\tr1\t0\t+\n"
+            "chr1\t295\t315\tr2\t0\t+\n"
+            "chr2\t10\t20\tr3\t0\t+\n"
+            "chr3\t10\t20\tr4\t0\t-\n"
+        )
+        outbed = tmpdir / "out.bed"
+        rejfile = tmpdir / "rejected.bed"
+        counts = liftover_bed(
+            inbed, outbed, rejfile, ChainMap.from_chain(chainfile), batch=2
+        )
+        assert counts == (2, 2)
+        assert outbed.read_text() == (
+            "track name=test\n"
+            "chrA\t10\t20\tr1\t0\t+\n"
+            "chrB\t480\t490\tr3\t0\t-\n"
+        )
+        assert rejfile.read_text() == (
+            "#Partially deleted in new\n"
+            "chr1\t295\t315\tr2\t0\t+\n"
+            "#Deleted in new\n"
+            "chr3\t10\t20\tr4\t0\t-\n"
+        )
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_liftover_vcf():
+    print(">>> TESTING liftover_vcf and FastaFile")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        chainfile = tmpdir / "test.chain"
+        chainfile.write_text(CHAIN)
+        chain = ChainMap.from_chain(chainfile)
+        # chrA: ACGT repeated; chrB: all C, but a G at 489 (0-based)
+        seqa = "ACGT" * 275
+        seqb = "C" * 489 + "G" + "C" * 110
+        reffa = tmpdir / "ref.fa"
+        reffa.write_text(
+            ">chrA desc\n"
+            + "\n".join(seqa[i:i + 60] for i in range(0, len(seqa), 60))
+            + "\n>chrB\n"
+            + "\n".join(seqb[i:i + 60] for i in range(0, len(seqb), 60))
+            + "\n"
+        )
+        with FastaFile(reffa) as fasta:
+            assert fasta.index["chrA"] == (1100, 11, 60, 61)
+            assert fasta.fetch("chrA", 58, 63) == seqa[58:63]
+            assert fasta.fetch("chrB", 485, 700) == seqb[485:]
+            assert fasta.index["chrB"] == (600, 1136, 60, 61)
+        reffa.with_name("ref.fa.fai").write_text(
+            "chrA\t1100\t11\t60\t61\nchrB\t600\t1136\t60\t61\n"
+        )
+        with FastaFile(reffa) as fasta:
+            assert fasta.fetch("chrB", 488, 491) == "CGC"
+
+        invcf = tmpdir / "in.vcf"
+        invcf.write_text(
+            VCF_HEADER
+            # lifted to chrB:490, reverse complemented
+            + "chr2\t11\t.\tC\tG,T\t30\tPASS\t.\n"
+            + "chr1\t11\t.\tG\tA\t30\tPASS\t.\n"
+            + "chr1\t12\t.\tA\tC\t30\tq10\t.\n"
+            + "chr1\t98\t.\tGTACG\tG\t30\tPASS\t.\n"
+            + "chr2\t20\t.\tCC\tC\t30\tPASS\t.\n"
+            + "chr3\t20\t.\tC\tA\t30\tPASS\t.\n"
+        )
+        outvcf = tmpdir / "out.vcf.gz"
+        rejfile = tmpdir / "rejected.vcf"
+        assert liftover_vcf(invcf, outvcf, rejfile, chain, reffa) == (2, 4)
+        with gzip.open(outvcf, "rt") as fout:
+            header, _, records = fout.read().partition("#CHROM")
+        assert header.splitlines()[1:] == [
+            "##contig=<ID=chrA,length=1100>",
+            "##contig=<ID=chrB,length=600>",
+        ]
+        assert records.splitlines()[1:] == [
+            "chrA\t11\t.\tG\tA\t30\tPASS\t.",
+            "chrB\t490\t.\tG\tC,A\t30\tPASS\t.",
+        ]
+        header, _, records = rejfile.read_text().partition("#CHROM")
+        assert '##FILTER=<ID=NoTarget,Description="' in header
+        assert records.splitlines()[1:] == [
+            "chr1\t12\t.\tA\tC\t30\tq10;MismatchedRefAllele\t.",
+            "chr1\t98\t.\tGTACG\tG\t30\tIndelStraddlesMultipleIntevals\t.",
+            "chr2\t20\t.\tCC\tC\t30\tReverseComplementedIndel\t.",
+            "chr3\t20\t.\tC\tA\t30\tNoTarget\t.",
+        ]
+
+        # without the reference, the contigs from the chain file
+        assert liftover_vcf(invcf, outvcf, rejfile, chain) == (3, 3)
+        with gzip.open(outvcf, "rt") as fout:
+            assert "##contig=<ID=chrC,length=100>" in fout.read()
+    print(">>> PASSED")
+    print(">>> ")
+
+
+if __name__ == "__main__":
+    run_lift()
+    run_liftover_bed()
+    run_liftover_vcf()
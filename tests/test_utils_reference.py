@@ -0,0 +1,307 @@
+import gzip
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from biopipen.core.config import config
+from biopipen.utils.reference import (
+    TabixFile,
+    contig_lengths,
+    fetch_regions,
+    gztype,
+    index_files,
+    intersect_regions,
+    merge_regions,
+    order_regions,
+    parse_regions,
+    scatter_regions,
+    scatter_targets,
+    split_regions,
+    tabix_index,
+    write_regions,
+)
+
+VCF = """##fileformat=VCFv4.2
+##contig=<ID=chr1,length=1000>
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO
+chr1\t10\t.\tA\tG\t30\tPASS\t.
+chr1\t20\t.\tC\tT\t30\tPASS\t.
+"""
+
+
+def run():
+    print(">>> TESTING tabix_index with the persistent cache")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        config.path.tabix_cache = str(tmpdir / "cache")
+
+        gzfile = tmpdir / "a.vcf.gz"
+        with gzip.open(gzfile, "wt") as fout:
+            fout.write(VCF)
+        flatfile = tmpdir / "b.vcf"
+        flatfile.write_text(VCF)
+        assert gztype(gzfile) == "gzip"
+        assert gztype(flatfile) == "flat"
+
+        # jobs indexing the same file at the same time
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(tabix_index(gzfile, "vcf"))
+            )
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(results)) == 1
+        indexed = results[0]
+        assert indexed.parent.parent.parent.parent == tmpdir / "cache"
+        assert gztype(indexed) == "bgzip"
+        assert indexed.with_suffix(".gz.tbi").is_file()
+        mtime = os.path.getmtime(indexed)
+
+        # reused
+        assert tabix_index(gzfile, "vcf") == indexed
+        assert os.path.getmtime(indexed) == mtime
+        # bgzipped and indexed
+        assert tabix_index(indexed, "vcf") == indexed
+        flat_indexed = tabix_index(flatfile, "vcf")
+        assert flat_indexed != indexed
+        assert gztype(flat_indexed) == "bgzip"
+        assert flat_indexed.with_suffix(".gz.tbi").is_file()
+
+        # no temporary directories left
+        assert list(tmpdir.joinpath("cache", "tmp").iterdir()) == []
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_tabixfile():
+    print(">>> TESTING TabixFile")
+    lines = [
+        f"chr{chrom}\t{pos}\t.\tA\tG\t30\tPASS\t."
+        for chrom in (1, 2)
+        for pos in range(100, 200_000, 37)
+    ]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        vcffile = Path(tmpdir) / "c.vcf"
+        vcffile.write_text(
+            "##fileformat=VCFv4.2\n"
+            "##contig=<ID=chr1,length=200000>\n"
+            "##contig=<ID=chr2,length=200000>\n"
+            "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+            + "\n".join(lines)
+            + "\n"
+        )
+        indexed = tabix_index(vcffile, "vcf", tmpdir)
+        with TabixFile(indexed) as tbx:
+            assert tbx.contigs == ["chr1", "chr2"]
+            assert tbx.header[-1].startswith("#CHROM")
+            for region, expected in (
+                (("chr1", 1000, 2000), range(1000, 2001)),
+                (("chr2:50001-50100",), range(50000, 50101)),
+                (("chr2", 199_000, None), range(199_000, 200_000)),
+            ):
+                fetched = [
+                    int(line.split("\t")[1]) - 1
+                    for line in tbx.fetch(*region)
+                ]
+                assert fetched == [
+                    pos - 1
+                    for pos in range(100, 200_000, 37)
+                    if pos - 1 in expected
+                ], region
+            assert list(tbx.fetch("chr3")) == []
+            assert contig_lengths(tbx.header) == {
+                "chr1": 200_000,
+                "chr2": 200_000,
+            }
+
+        assert scatter_regions(indexed, "contig") == ["chr1", "chr2"]
+        assert scatter_regions(indexed, 4) == [
+            "chr1:1-100000",
+            "chr1:100001-",
+            "chr2:1-100000",
+            "chr2:100001-",
+        ]
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_split_regions():
+    print(">>> TESTING split_regions")
+    regions = split_regions(
+        ["chr1", "chr2", "chrM"],
+        {"chr1": 1000, "chr2": 500},
+        nregions=3,
+    )
+    assert regions == [
+        ("chr1", 0, 500),
+        ("chr1", 500, None),
+        ("chr2", 0, None),
+        ("chrM", 0, None),
+    ]
+    assert split_regions(["chr1", "chr2"]) == [
+        ("chr1", 0, None),
+        ("chr2", 0, None),
+    ]
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_regions():
+    print(">>> TESTING the regions")
+    assert merge_regions(
+        [
+            ("chr2", 10, 20),
+            ("chr1", 50, 60),
+            ("chr1", 0, 10),
+            ("chr1", 10, 20),
+            ("chr1", 55, None),
+            ("chr1", 100, 200),
+            ("chr2", 5, 15),
+        ]
+    ) == [
+        ("chr2", 5, 20),
+        ("chr1", 0, 20),
+        ("chr1", 50, None),
+    ]
+    assert parse_regions() is None
+    assert parse_regions("chr1:101-200, chr1:150-300,chrM") == [
+        ("chr1", 100, 300),
+        ("chrM", 0, None),
+    ]
+    # the single position, and to the end
+    assert parse_regions("chr1:1001,chr2:101-") == [
+        ("chr1", 1000, 1001),
+        ("chr2", 100, None),
+    ]
+    assert order_regions(
+        [("chrM", 0, None), ("chr1", 100, 300), ("chrX", 0, 10)],
+        ["chr1", "chrM"],
+    ) == [("chr1", 100, 300), ("chrM", 0, None)]
+    assert intersect_regions(
+        [("chr1", 100, 300), ("chr1", 400, None), ("chr2", 0, 10)],
+        [("chr1", 0, 200), ("chr1", 200, 350), ("chr1", 350, None),
+         ("chr3", 0, None)],
+    ) == [
+        [("chr1", 100, 200)],
+        [("chr1", 200, 300)],
+        [("chr1", 400, None)],
+    ]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bedfile = Path(tmpdir) / "r.bed"
+        bedfile.write_text("track name=x\nchr1\t100\t200\nchr2\t0\t10\n")
+        tabfile = Path(tmpdir) / "r.txt"
+        tabfile.write_text("# comment\nchr1\t201\t250\nchr1\t260\nchr3\n")
+        assert parse_regions("chr2:5-20", bedfile) == [
+            ("chr2", 0, 20),
+            ("chr1", 100, 200),
+        ]
+        assert parse_regions(regions_file=tabfile) == [
+            ("chr1", 200, 250),
+            ("chr1", 259, 260),
+            ("chr3", 0, None),
+        ]
+        write_regions(
+            [("chr1", 100, 200), ("chr3", 0, None)],
+            tabfile,
+        )
+        assert tabfile.read_text() == (
+            "chr1\t101\t200\nchr3\t1\t2147483647\n"
+        )
+
+        # a deletion spanning the regions
+        vcffile = Path(tmpdir) / "d.vcf"
+        vcffile.write_text(
+            "##fileformat=VCFv4.2\n"
+            "##contig=<ID=chr1,length=100000>\n"
+            "##contig=<ID=chr2,length=100000>\n"
+            "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+            + "".join(
+                f"chr{chrom}\t{pos}\t.\tACGTACGTAC\tA\t30\tPASS\t.\n"
+                for chrom in (1, 2)
+                for pos in range(1, 100_000, 50)
+            )
+        )
+        indexed = tabix_index(vcffile, "vcf", tmpdir)
+        regions = parse_regions("chr2:1-120,chr1:1001-1100,chr1:1105-2000")
+        with TabixFile(indexed) as tbx:
+            regions = order_regions(regions, tbx.contigs)
+            fetched = [
+                line.split("\t", 2)[1] for line in fetch_regions(tbx, regions)
+            ]
+        # not the one at 1101, spanning to the second region
+        assert fetched == [
+            str(pos) for pos in range(1001, 2001, 50) if pos != 1101
+        ] + ["1", "51", "101"], fetched
+        assert scatter_targets(indexed, 2, regions) == [
+            [("chr1", 1000, 1100), ("chr1", 1104, 2000)],
+            [("chr2", 0, 120)],
+        ]
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_index_files():
+    print(">>> TESTING index_files")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        indir = tmpdir / "in"
+        indir.mkdir()
+        indir.joinpath("flat.vcf").write_text(VCF)
+        with gzip.open(indir / "gz.vcf.gz", "wt") as fout:
+            fout.write(VCF)
+        # too long for tbi indexes
+        indir.joinpath("long.vcf").write_text(
+            VCF.replace("length=1000", "length=600000000")
+        )
+        indexed = tabix_index(indir / "flat.vcf", "vcf", tmpdir)
+        infiles = [indexed, indir / "gz.vcf.gz", indir / "long.vcf"]
+
+        outdir = tmpdir / "out"
+        statuses = dict(index_files(infiles, outdir, ncores=2))
+        assert statuses == {
+            outdir / "flat.vcf.gz": "indexed already",
+            outdir / "gz.vcf.gz": "indexed (tbi)",
+            outdir / "long.vcf.gz": "indexed (csi)",
+        }, statuses
+        assert outdir.joinpath("flat.vcf.gz").is_symlink()
+        assert outdir.joinpath("flat.vcf.gz.tbi").is_symlink()
+        assert gztype(outdir / "gz.vcf.gz") == "bgzip"
+        assert outdir.joinpath("gz.vcf.gz.tbi").is_file()
+        assert outdir.joinpath("long.vcf.gz.csi").is_file()
+        assert not outdir.joinpath("long.vcf.gz.tbi").exists()
+
+        # only the changed file indexed again
+        os.utime(indir / "gz.vcf.gz", (0, 2 ** 31))
+        statuses = index_files(infiles[1:], outdir, csi=False)
+        assert [status for _, status in statuses] == [
+            "indexed (tbi)",
+            "up to date",
+        ]
+
+        # in place
+        statuses = index_files([outdir / "gz.vcf.gz"], outdir)
+        assert statuses == [(outdir / "gz.vcf.gz", "indexed already")]
+
+        try:
+            index_files([indexed, indir / "flat.vcf"], outdir)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("Files with the same names not detected")
+    print(">>> PASSED")
+    print(">>> ")
+
+
+if __name__ == "__main__":
+    run()
+    run_tabixfile()
+    run_split_regions()
+    run_regions()
+    run_index_files()
@@ -0,0 +1,162 @@
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+from biopipen.utils.result_cache import ResultCache, main
+
+SCRIPT = """
+from pathlib import Path
+Path({counter!r}).open("a").write("x")
+Path({outfile!r}).write_text(Path({infile!r}).read_text().upper())
+"""
+
+
+def prepare_job(tmpdir, workdir, infile, content="abc"):
+    """Prepare a job in the workdir as biopipen.core.proc.Proc does"""
+    metadir = Path(tmpdir) / workdir / "0"
+    outdir = metadir / "output"
+    outdir.mkdir(parents=True)
+    Path(infile).write_text(content)
+    script = metadir / "job.script"
+    script.write_text(
+        SCRIPT.format(
+            counter=str(Path(tmpdir) / "counter"),
+            infile=str(infile),
+            outfile=str(outdir / "out.txt"),
+        )
+    )
+    manifest = {
+        "proc": "Upper",
+        "script": script.read_text()
+        .replace(str(infile), "<in.infile>")
+        .replace(str(outdir), "<outdir>"),
+        "envs": {},
+        "input": {"infile": ["file", str(infile)]},
+        "output": {"outfile": ["file", "out.txt"]},
+        "outdir": str(outdir),
+        "cache_dir": str(Path(tmpdir) / "cache"),
+        "max_size": "1K",
+    }
+    metadir.joinpath("job.result_cache.json").write_text(json.dumps(manifest))
+    return [sys.executable, str(script)], outdir / "out.txt"
+
+
+def run():
+    print(">>> TESTING result cache across workdirs")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        counter = Path(tmpdir) / "counter"
+        cmd, outfile = prepare_job(tmpdir, "run1", Path(tmpdir) / "in1.txt")
+        assert main(["run", "--", *cmd]) == 0
+        assert outfile.read_text() == "ABC"
+        assert counter.read_text() == "x"
+
+        # same input content in another workdir, from the cache
+        cmd, outfile = prepare_job(tmpdir, "run2", Path(tmpdir) / "in2.txt")
+        assert main(["run", "--", *cmd]) == 0
+        assert outfile.read_text() == "ABC"
+        assert counter.read_text() == "x"
+
+        # different content, run again
+        cmd, outfile = prepare_job(
+            tmpdir, "run3", Path(tmpdir) / "in3.txt", "def"
+        )
+        assert main(["run", "--", *cmd]) == 0
+        assert outfile.read_text() == "DEF"
+        assert counter.read_text() == "xx"
+
+        cache = ResultCache(Path(tmpdir) / "cache")
+        assert len(cache.entries()) == 2
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_outputs():
+    print(">>> TESTING result cache outputs not shared with the jobs")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cmd, outfile = prepare_job(tmpdir, "run1", Path(tmpdir) / "in1.txt")
+        assert main(["run", "--", *cmd]) == 0
+        # modified in place, i.e. by a downstream job
+        with outfile.open("a") as fout:
+            fout.write("modified")
+
+        cmd, outfile = prepare_job(tmpdir, "run2", Path(tmpdir) / "in2.txt")
+        assert main(["run", "--", *cmd]) == 0
+        assert outfile.read_text() == "ABC"
+        assert Path(tmpdir).joinpath("counter").read_text() == "x"
+        # restored writable, the cached one read-only
+        with outfile.open("a") as fout:
+            fout.write("modified")
+        cached = next(Path(tmpdir).glob("cache/entries/*/*/outputs/out.txt"))
+        assert cached.read_text() == "ABC"
+        assert not cached.stat().st_mode & 0o222
+
+        # empty directories in the outputs
+        cache = ResultCache(Path(tmpdir) / "cache")
+        outdir = Path(tmpdir) / "outdir"
+        outdir.joinpath("outdir", "empty").mkdir(parents=True)
+        outdir.joinpath("emptydir").mkdir()
+        outdir.joinpath("outdir", "file.txt").write_text("x")
+        outputs = {"a": ["dir", "outdir"], "b": ["dir", "emptydir"]}
+        cache.store("key", outputs, outdir)
+        restored = Path(tmpdir) / "restored"
+        assert cache.restore("key", outputs, restored)
+        assert restored.joinpath("outdir", "empty").is_dir()
+        assert restored.joinpath("outdir", "file.txt").read_text() == "x"
+        assert restored.joinpath("emptydir").is_dir()
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_envs():
+    print(">>> TESTING result cache keyed by the files in envs")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = ResultCache(Path(tmpdir) / "cache")
+        reffa = Path(tmpdir) / "ref.fa"
+        reffa.write_text(">chr1\nACGT\n")
+        manifest = {
+            "proc": "Upper",
+            "script": "",
+            "envs": {"ref": str(reffa), "opts": {"tool": "native"}},
+            "input": {},
+            "output": {},
+        }
+        key = cache.compute_key(manifest)
+        # same path, different content
+        reffa.write_text(">chr1\nACGTT\n")
+        assert cache.compute_key(manifest) != key
+        # different path, same content
+        reffa2 = Path(tmpdir) / "ref2.fa"
+        reffa2.write_text(">chr1\nACGTT\n")
+        key = cache.compute_key(manifest)
+        manifest["envs"]["ref"] = str(reffa2)
+        assert cache.compute_key(manifest) == key
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_evict():
+    print(">>> TESTING result cache eviction")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for i in range(3):
+            cmd, _ = prepare_job(
+                tmpdir, f"run{i}", Path(tmpdir) / f"in{i}.txt", str(i) * 400
+            )
+            assert main(["run", "--", *cmd]) == 0
+
+        # 1K at most
+        cache = ResultCache(Path(tmpdir) / "cache")
+        entries = cache.entries()
+        assert len(entries) == 2
+        assert sum(entry["size"] for entry in entries) == 800
+        assert len(cache.evict(0)) == 2
+        assert cache.entries() == []
+    print(">>> PASSED")
+    print(">>> ")
+
+
+if __name__ == "__main__":
+    run()
+    run_outputs()
+    run_envs()
+    run_evict()
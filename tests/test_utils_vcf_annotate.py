@@ -0,0 +1,176 @@
+import gzip
+import tempfile
+from pathlib import Path
+
+from biopipen.utils.vcf_annotate import annotate_vcfs, parse_columns
+
+HEADER = (
+    "##fileformat=VCFv4.2\n"
+    "##contig=<ID=chr1>\n"
+    "##contig=<ID=chr2>\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+)
+ANNOTATION = (
+    "##fileformat=VCFv4.2\n"
+    '##INFO=<ID=AF,Number=A,Type=Float,Description="AF">\n'
+    '##INFO=<ID=DB,Number=0,Type=Flag,Description="dbSNP">\n'
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+    "chr1\t5\trs5\tA\tG\t.\t.\tAF=0.5\n"
+    "chr1\t10\trs10\tA\tG\t.\t.\tAF=0.1;DB\n"
+    "chr1\t10\trs11\tA\tT\t.\t.\tAF=0.2\n"
+    "chr1\t30\trs30\tC\tT\t.\t.\t.\n"
+    "chr2\t10\trs210\tG\tC\t.\t.\tAF=0.3;DB\n"
+    "chr2\t99\trs299\tG\tC\t.\t.\tAF=0.3\n"
+)
+
+
+def run_columns():
+    print(">>> TESTING parse_columns")
+    assert parse_columns("ID,+INFO/AF,DB") == [
+        ("ID", False),
+        ("INFO/AF", True),
+        ("INFO/DB", False),
+    ]
+    try:
+        parse_columns(["FORMAT/GT"])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("FORMAT columns not supported")
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_annotate():
+    print(">>> TESTING annotate_vcfs")
+    inputs = [
+        # multiallelic at 10, one not matched
+        "chr1\t10\t.\tA\tT\t30\tPASS\tDP=5\n"
+        "chr1\t10\t.\tA\tC\t30\tPASS\tDP=5\n"
+        "chr1\t20\t.\tA\tG\t30\tPASS\t.\n"
+        "chr2\t10\trsX\tG\tC\t30\tPASS\tAF=0.9\n",
+        # after the last annotation record
+        "chr1\t5\t.\tA\tG\t30\tPASS\tAF=0.4\n"
+        "chr2\t100\t.\tG\tC\t30\tPASS\t.\n"
+        "chr3\t1\t.\tG\tC\t30\tPASS\t.\n",
+        # no records
+        "",
+    ]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        annfile = tmpdir / "ann.vcf"
+        annfile.write_text(ANNOTATION)
+        infiles = []
+        outfiles = []
+        for i, records in enumerate(inputs):
+            infiles.append(tmpdir / f"in{i}.vcf.gz")
+            outfiles.append(tmpdir / f"out{i}.vcf")
+            with gzip.open(infiles[-1], "wt") as fin:
+                fin.write(HEADER + records)
+        outfiles[0] = tmpdir / "out0.vcf.gz"
+
+        counts = annotate_vcfs(
+            infiles,
+            annfile,
+            outfiles,
+            ["+ID", "+INFO/AF", "DB"],
+            header=["##source=test"],
+        )
+        assert counts == [2, 1, 0]
+
+        with gzip.open(outfiles[0], "rt") as fout:
+            out = fout.read()
+        header, _, records = out.partition("#CHROM")
+        assert header.splitlines()[-3:] == [
+            '##INFO=<ID=AF,Number=A,Type=Float,Description="AF">',
+            '##INFO=<ID=DB,Number=0,Type=Flag,Description="dbSNP">',
+            "##source=test",
+        ]
+        assert records.splitlines()[1:] == [
+            "chr1\t10\trs11\tA\tT\t30\tPASS\tDP=5;AF=0.2",
+            "chr1\t10\t.\tA\tC\t30\tPASS\tDP=5",
+            "chr1\t20\t.\tA\tG\t30\tPASS\t.",
+            # not overwritten, but the flag added
+            "chr2\t10\trsX\tG\tC\t30\tPASS\tAF=0.9;DB",
+        ]
+        records = outfiles[1].read_text().partition("#CHROM")[2]
+        assert records.splitlines()[1:] == [
+            "chr1\t5\trs5\tA\tG\t30\tPASS\tAF=0.4",
+            "chr2\t100\t.\tG\tC\t30\tPASS\t.",
+            "chr3\t1\t.\tG\tC\t30\tPASS\t.",
+        ]
+        assert outfiles[2].read_text().endswith("INFO\n")
+
+        # not sorted
+        with gzip.open(infiles[2], "wt") as fin:
+            fin.write(HEADER + "chr2\t1\t.\tA\tG\t.\t.\t.\n")
+            fin.write("chr1\t1\t.\tA\tG\t.\t.\t.\n")
+        try:
+            annotate_vcfs(infiles[2:], annfile, outfiles[2:], "ID")
+        except ValueError as err:
+            assert "not sorted" in str(err)
+        else:
+            raise AssertionError("Unsorted records not detected")
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_contigs():
+    print(">>> TESTING annotate_vcfs with the contigs not in the headers")
+    nocontig = HEADER.replace("##contig=<ID=chr1>\n", "").replace(
+        "##contig=<ID=chr2>\n", ""
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        annfile = tmpdir / "ann.vcf"
+        annfile.write_text(ANNOTATION)
+        infiles = [tmpdir / "in0.vcf", tmpdir / "in1.vcf"]
+        outfiles = [tmpdir / "out0.vcf", tmpdir / "out1.vcf.gz"]
+        # starting at the second contig of the annotation
+        infiles[0].write_text(
+            nocontig
+            + "chr2\t10\t.\tG\tC\t30\tPASS\t.\n"
+            + "chr3\t10\t.\tG\tC\t30\tPASS\t.\n"
+        )
+        # a contig before the ones in the annotation, by the header
+        infiles[1].write_text(
+            HEADER.replace("##contig=<ID=chr1>", "##contig=<ID=chrM>\n"
+                           "##contig=<ID=chr1>")
+            + "chrM\t10\t.\tG\tC\t30\tPASS\t.\n"
+            + "chr1\t5\t.\tA\tG\t30\tPASS\t.\n"
+        )
+        assert annotate_vcfs(infiles[:1], annfile, outfiles[:1], "ID") == [1]
+        assert annotate_vcfs(infiles[1:], annfile, outfiles[1:], "ID") == [1]
+        records = outfiles[0].read_text().partition("#CHROM")[2]
+        assert records.splitlines()[1:] == [
+            "chr2\t10\trs210\tG\tC\t30\tPASS\t.",
+            "chr3\t10\t.\tG\tC\t30\tPASS\t.",
+        ]
+        with gzip.open(outfiles[1], "rt") as fout:
+            records = fout.read().partition("#CHROM")[2]
+        assert records.splitlines()[1:] == [
+            "chrM\t10\t.\tG\tC\t30\tPASS\t.",
+            "chr1\t5\trs5\tA\tG\t30\tPASS\t.",
+        ]
+
+        # the outputs removed on errors
+        infiles[0].write_text(
+            nocontig
+            + "chr2\t20\t.\tG\tC\t30\tPASS\t.\n"
+            + "chr2\t10\t.\tG\tC\t30\tPASS\t.\n"
+        )
+        try:
+            annotate_vcfs(infiles, annfile, outfiles, "ID")
+        except ValueError as err:
+            assert "not sorted" in str(err)
+        else:
+            raise AssertionError("Unsorted records not detected")
+        assert not any(outfile.exists() for outfile in outfiles)
+    print(">>> PASSED")
+    print(">>> ")
+
+
+if __name__ == "__main__":
+    run_columns()
+    run_annotate()
+    run_contigs()
@@ -0,0 +1,133 @@
+import numpy
+
+from biopipen.utils.vcf_batch import (
+    HET,
+    HOM_ALT,
+    HOM_REF,
+    UNKNOWN,
+    QUAL,
+    SNPONLY,
+    VariantBlock,
+    filter_records,
+    sample_indexes,
+    samples_subsetter,
+)
+
+RECORDS = [
+    "chr1\t10\t.\tA\tG\t50\tPASS\tDP=20;AF=0.5\tGT:DP\t0/1:10\t1|1:5",
+    "chr1\t20\t.\tA\tG,T\t10\tq10\tDP=5;DB\tGT:DP\t0/0:3\t./.:.",
+    "chr1\t30\t.\tAT\tA\t.\t.\tAF=0.1,0.2\tGT\t1/1\t0/1",
+]
+
+
+def run_block():
+    print(">>> TESTING VariantBlock")
+    for samples in (["S1", "S2"], [f"S{i}" for i in range(20)]):
+        lines = RECORDS
+        if len(samples) > 2:
+            # wide records, not split at once
+            lines = [
+                line + "\t0/0:1" * (len(samples) - 2) for line in RECORDS
+            ]
+        block = VariantBlock(lines, samples)
+        assert block.POS.tolist() == [10, 20, 30]
+        assert numpy.isnan(block.QUAL[2]) and block.QUAL[0] == 50
+        assert block.FILTER.tolist() == [None, "q10", None]
+        assert block.is_snp.tolist() == [True, True, False]
+        assert block.ALT == [["G"], ["G", "T"], ["A"]]
+        assert block.INFO.get("DP", 0).tolist() == [20, 5, 0]
+        # the first value of multiple values, in float32 precision as cyvcf2
+        assert block.INFO["AF"][[0, 2]].tolist() == [
+            0.5,
+            float(numpy.float32(0.1)),
+        ]
+        assert numpy.isnan(block.INFO["AF"][1])
+        assert block.INFO["DB"].tolist() == [False, True, False]
+        assert block.INFO.has("AF").tolist() == [True, False, True]
+        depth = block.format("DP")
+        assert depth.shape == (3, len(samples))
+        assert depth[0, :2].tolist() == [10, 5]
+        assert numpy.isnan(depth[1, 1]) and numpy.isnan(depth[2, 0])
+        assert block.gt_types[:, :2].tolist() == [
+            [HET, HOM_ALT],
+            [HOM_REF, UNKNOWN],
+            [HOM_ALT, HET],
+        ]
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_filter():
+    print(">>> TESTING filter_records")
+    filters = {
+        "SNP": SNPONLY,
+        "Q20": lambda block: QUAL(block, 20),
+        "DP": lambda block: block.INFO.get("DP", 0) > 10,
+    }
+    out = []
+    nwritten = filter_records(
+        iter(RECORDS), filters, out.append, ["S1", "S2"], block_size=2
+    )
+    assert nwritten == 3
+    lines = "".join(out).splitlines()
+    assert lines[0] == RECORDS[0]
+    assert lines[1].split("\t")[6] == "q10;Q20;DP"
+    # QUAL `.` fails the cutoff
+    assert lines[2].split("\t")[6] == "SNP;Q20;DP"
+    assert lines[2].split("\t")[7:] == RECORDS[2].split("\t")[7:]
+
+    out = []
+    filter_records(
+        iter(RECORDS), {"SNP": SNPONLY}, out.append, keep=False,
+    )
+    # the variant with FILTER set is also dropped
+    assert out == [RECORDS[0] + "\n"]
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_samples():
+    print(">>> TESTING samples_subsetter")
+    samples = [f"S{i}" for i in range(8)]
+    assert sample_indexes(samples, "S6,S1") == [1, 6]
+    assert sample_indexes(samples, ["^S0", "S7"]) == list(range(1, 7))
+    assert sample_indexes(samples, "^") == list(range(8))
+    try:
+        sample_indexes(samples, "S1,S9")
+    except ValueError as err:
+        assert "S9" in str(err)
+    else:
+        raise AssertionError("Missing samples not detected")
+
+    fixed = "chr1\t10\t.\tA\tG\t50\tPASS\t.\tGT:DP"
+    calls = [f"{i}/1:{i}" for i in range(8)]
+    line = "\t".join([fixed, *calls])
+    for selection in (
+        "S0",
+        "S7",
+        "S1,S5",
+        "S0,S7",
+        "^S3",
+        "^S0,S7",
+        "S0,S2,S4,S6",
+        "S2,S3,S4,S5",
+    ):
+        indexes = sample_indexes(samples, selection)
+        subset = samples_subsetter(indexes, len(samples))
+        expected = "\t".join([fixed, *(calls[i] for i in indexes)])
+        assert subset(line) == expected, selection
+        assert subset(f"{line}\n".encode()) == f"{expected}\n".encode()
+
+    assert samples_subsetter(range(8), 8)(line) is line
+    # no samples, no FORMAT
+    assert samples_subsetter([], 8)(line + "\n") == (
+        "chr1\t10\t.\tA\tG\t50\tPASS\t.\n"
+    )
+    print(">>> PASSED")
+    print(">>> ")
+
+
+if __name__ == "__main__":
+    run_block()
+    run_filter()
+    run_samples()
@@ -0,0 +1,217 @@
+from biopipen.utils.vcf_batch import VariantBlock
+from biopipen.utils.vcf_expr import (
+    FilterExpressionError,
+    FilterSet,
+    merge_summaries,
+    parse,
+    uses_samples,
+    variant_type,
+)
+
+RECORDS = [
+    "chr1\t10\t.\tA\tG\t50\tPASS\tDP=20;AF=0.5\tGT:GQ\t0/1:10\t1|1:30",
+    "chr1\t20\trs1\tA\tG,T\t10\tq10\tDP=5;DB\tGT:GQ\t0/0:3\t./.:.",
+    "chr2\t30\t.\tAT\tA\t.\t.\tAF=0.1,0.2\tGT\t1/1\t0/1",
+]
+FILTERS = {
+    "Q30": "QUAL>=30",
+    "DP": "INFO/DP>10 && INFO/AF>0.1",
+    "SNP": 'TYPE=="snp"',
+    "GQ": "FMT/GQ>=20",
+    "DB": "!INFO/DB",
+    "ALT": 'ALT=="T" || 30 <= POS',
+}
+# the filters failed by each record
+FAILED = [
+    ["ALT"],
+    ["Q30", "DP", "GQ", "DB"],
+    ["Q30", "DP", "SNP", "GQ"],
+]
+
+
+def run_parse():
+    print(">>> TESTING parse")
+    assert parse("QUAL>=30 && INFO/DP>10") == (
+        "and",
+        ("cmp", ">=", ("field", "QUAL"), ("value", 30.0)),
+        ("cmp", ">", ("field", "INFO/DP"), ("value", 10.0)),
+    )
+    # && before ||
+    assert parse("!INFO/DB || FORMAT/GQ<20 & CHROM='chr1'")[0] == "or"
+    for expr in ("QUAL>=", "QUAL >= 30 )", "DEPTH>1", "QUAL ~ 1", "(QUAL"):
+        try:
+            parse(expr)
+        except FilterExpressionError:
+            pass
+        else:
+            raise AssertionError(f"Parsed: {expr}")
+
+    assert variant_type("A", ["G", "T"]) == "snp"
+    assert variant_type("AT", ["A"]) == "indel"
+    assert variant_type("AT", ["GC"]) == "mnp"
+    assert variant_type("A", ["<DEL>"]) == "other"
+    assert variant_type("A", []) == "ref"
+
+    assert not uses_samples("QUAL>=30 && INFO/DP>10")
+    assert uses_samples("QUAL>=30 || FORMAT/GQ>20")
+    assert [name for name, filt in FILTERS.items() if uses_samples(filt)] == [
+        "GQ"
+    ]
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_block():
+    print(">>> TESTING FilterSet with blocks")
+    filterset = FilterSet(
+        {**FILTERS, "func": lambda block: block.POS > 10}, block=True
+    )
+    block = VariantBlock(RECORDS, ["S1", "S2"])
+    out = filterset(block)
+    assert list(out) == list(FILTERS) + ["func"]
+    for i, failed in enumerate(FAILED):
+        assert [name for name in FILTERS if not out[name][i]] == failed
+    assert out["func"].tolist() == [False, True, True]
+
+    filterset(block)
+    summary = filterset.summary()
+    assert summary["Q30"]["filter"] == "QUAL>=30"
+    assert summary["Q30"]["evaluated"] == 6
+    assert summary["Q30"]["passed"] == 2
+    assert summary["Q30"]["failed"] == 4
+    assert summary["Q30"]["seconds"] > 0
+
+    merged = merge_summaries([summary, filterset.summary()])
+    assert merged["DP"]["evaluated"] == 12
+    assert merged["DP"]["failed"] == 8
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_variant():
+    print(">>> TESTING FilterSet with variants")
+    try:
+        from cyvcf2 import VCF
+    except ImportError:
+        print(">>> SKIPPED (cyvcf2 not installed)")
+        print(">>> ")
+        return
+
+    import tempfile
+    from pathlib import Path
+
+    header = [
+        "##fileformat=VCFv4.2",
+        "##contig=<ID=chr1>",
+        "##contig=<ID=chr2>",
+        '##FILTER=<ID=q10,Description="Low quality">',
+        '##INFO=<ID=DP,Number=1,Type=Integer,Description="Depth">',
+        '##INFO=<ID=AF,Number=A,Type=Float,Description="AF">',
+        '##INFO=<ID=DB,Number=0,Type=Flag,Description="dbSNP">',
+        '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
+        '##FORMAT=<ID=GQ,Number=1,Type=Integer,Description="GQ">',
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\tS2",
+    ]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        vcffile = Path(tmpdir) / "in.vcf"
+        vcffile.write_text("\n".join(header + RECORDS) + "\n")
+
+        filterset = FilterSet(FILTERS)
+        for variant, failed in zip(VCF(str(vcffile)), FAILED):
+            assert filterset(variant) == failed
+        summary = filterset.summary()
+        assert summary["SNP"]["evaluated"] == 3
+        assert summary["SNP"]["failed"] == 1
+
+        # the rest are not evaluated once a variant fails one
+        filterset = FilterSet(FILTERS, stop_on_fail=True)
+        for variant, failed in zip(VCF(str(vcffile)), FAILED):
+            assert filterset(variant) == failed[:1]
+        summary = filterset.summary()
+        assert summary["Q30"]["evaluated"] == 3
+        assert summary["DP"]["evaluated"] == 1
+        assert summary["ALT"]["evaluated"] == 1
+    print(">>> PASSED")
+    print(">>> ")
+
+
+def run_modes():
+    print(">>> TESTING FilterSet, the same results with variants and blocks")
+    try:
+        from cyvcf2 import VCF
+    except ImportError:
+        print(">>> SKIPPED (cyvcf2 not installed)")
+        print(">>> ")
+        return
+
+    import tempfile
+    from pathlib import Path
+
+    header = [
+        "##fileformat=VCFv4.2",
+        "##contig=<ID=chr1>",
+        '##INFO=<ID=DP,Number=1,Type=Integer,Description="Depth">',
+        '##INFO=<ID=AF,Number=A,Type=Float,Description="AF">',
+        '##INFO=<ID=DB,Number=0,Type=Flag,Description="dbSNP">',
+        '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
+        '##FORMAT=<ID=AD,Number=R,Type=Integer,Description="AD">',
+        '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Depth">',
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\tS2",
+    ]
+    records = [
+        "chr1\t1\t.\tA\tG,T\t50\tPASS\tDP=20;AF=0.1,0.6\tGT:AD:DP"
+        "\t0/1:3,5,0:8\t1/2:0,12,20:32",
+        "chr1\t2\t.\tA\tG\t10\tPASS\tAF=0.6;DB\tGT:AD:DP"
+        "\t0/1:4,4:8\t./.:.:.",
+        "chr1\t3\t.\tA\tC,T,G\t.\t.\tDP=5;AF=.,0.3,0.1\tGT:AD"
+        "\t0/0:11,0,0,0\t0/3:0,0,0,6",
+        "chr1\t4\t.\tAT\tA\t30\tPASS\tDP=12\tGT:DP\t0/1:2\t./.:.",
+        "chr1\t5\t.\tA\tG,C\t30\tPASS\tAF=0.1,0.1\tGT:AD"
+        "\t0/0:0,0,0\t./.:.",
+        "chr1\t6\t.\tA\tG\t30\tPASS\t.\tGT\t1|0\t0/0",
+        "chr1\t7\t.\tA\tG\t30\tPASS\t.\tDP\t3\t4",
+    ]
+    exprs = [
+        "INFO/AF>0.5",
+        "INFO/AF<0.2",
+        "INFO/AF!=0.1",
+        "INFO/AF==0.6",
+        "!INFO/AF>0.5",
+        "!(1==1)",
+        "!(1==2)",
+        "INFO/DP>=10 || !INFO/DB",
+        "N_ALT>1 && INFO/AF>=0.3",
+        "FMT/AD>10",
+        "FMT/AD!=0",
+        "FMT/DP<5",
+        "!FMT/AD",
+        "QUAL>=30 && !(FMT/DP>10)",
+        'FMT/GT=="0/1"',
+        'FMT/GT!="0/0"',
+        'FMT/GT=="./." || FMT/GT=="1|0"',
+    ]
+    filters = {f"f{i}": expr for i, expr in enumerate(exprs)}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        vcffile = Path(tmpdir) / "in.vcf"
+        vcffile.write_text("\n".join(header + records) + "\n")
+
+        variant_filters = FilterSet(filters)
+        failed = [variant_filters(variant) for variant in VCF(str(vcffile))]
+        block_filters = FilterSet(filters, block=True)
+        out = block_filters(VariantBlock(records, ["S1", "S2"]))
+        for name, expr in filters.items():
+            assert out[name].tolist() == [
+                name not in fails for fails in failed
+            ], expr
+        assert out["f0"].tolist() == [True, True] + [False] * 5
+        assert out["f5"].tolist() == [False] * 7
+        assert out["f14"].tolist() == [True, True, False, True] + [False] * 3
+    print(">>> PASSED")
+    print(">>> ")
+
+
+if __name__ == "__main__":
+    run_parse()
+    run_block()
+    run_variant()
+    run_modes()